@@ -0,0 +1,64 @@
+import json
+import os
+
+import numpy as np
+
+# Minimal single-file container for read-only NumPy arrays:
+#
+#   MAGIC | u64 header length | JSON header | padding | array data ...
+#
+# Each array is 64-byte aligned and opened with np.memmap, so loading is
+# O(1) regardless of size and worker processes share the same page cache.
+
+MAGIC = b"MCPARR1\n"
+ALIGN = 64
+
+def _align(offset: int) -> int:
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+def write_arrays(path: str, arrays: dict[str, np.ndarray], meta: dict | None = None):
+    """
+    Write 'arrays' (and JSON-serialisable 'meta') to 'path' atomically, so a
+    process that has the old file mapped keeps a consistent view.
+    """
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    layout = {}
+    # Offsets are relative to the data section, which starts after the header.
+    offset = 0
+    for name, array in arrays.items():
+        offset = _align(offset)
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += array.nbytes
+    header = json.dumps({"arrays": layout, "meta": meta or {}}).encode("utf-8")
+    data_start = _align(len(MAGIC) + 8 + len(header))
+
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, "little"))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name]["offset"])
+            f.write(array.tobytes())
+    os.replace(tmp_path, path)
+
+def open_arrays(path: str) -> tuple[dict[str, np.ndarray], dict]:
+    """
+    Memory-map every array in a file written by write_arrays().
+    Returns (arrays, meta).
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not an array store file")
+        header_length = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(header_length))
+    data_start = _align(len(MAGIC) + 8 + header_length)
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        shape = tuple(spec["shape"])
+        dtype = np.dtype(spec["dtype"])
+        if int(np.prod(shape)) == 0:
+            arrays[name] = np.empty(shape, dtype=dtype)
+        else:
+            arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=data_start + spec["offset"], shape=shape)
+    return arrays, header["meta"]
@@ -1,69 +1,252 @@
 import asyncio
-import json
-from websockets import serve
-
-class McpServer:
-    def __init__(self):
-        self.tools: dict[str, dict] = {}
-        self.pending_requests: dict = {}
-
-    def tool(self, name: str, description: str, input_schema: dict, callback):
-        self.tools[name] = {
-            "description": description,
-            "input_schema": input_schema,
-            "callback": callback,
-        }
-
-    async def handle_connection(self, websocket):
-        print(f"New connection from {websocket.remote_address}")
-        async for message in websocket:
+import calendar
+import logging
+import os
+from datetime import datetime, timedelta
+
+from calendar_store import CalendarStore, Event
+from mcp_core import McpServer
+from mcp_logging import setup_logging
+from mcp_metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Directory holding the append-only log and snapshots; without it the
+# calendar lives in memory only. The store is per process, so run this
+# module in a single worker when persistence matters.
+CALENDAR_DIR = os.environ.get("MCP_CALENDAR_DIR")
+SNAPSHOT_EVERY = int(os.environ.get("MCP_CALENDAR_SNAPSHOT_EVERY", "10000"))
+store = CalendarStore(CALENDAR_DIR, snapshot_every=SNAPSHOT_EVERY)
+metrics.add_collector("calendar", store.stats)
+
+DEFAULT_USER = "default"
+DEFAULT_DURATION = 30
+REPEAT_STEP = {"daily": 24 * 60, "weekly": 7 * 24 * 60}
+MAX_OCCURRENCES = 366
+# find-free-slot walks one day at a time on the event loop, so its search
+# window is capped.
+MAX_SEARCH_DAYS = 366
+TIME_FORMATS = ("%H:%M", "%I:%M %p", "%I %p", "%I%p", "%H%M")
+
+def parse_when(date: str | None, time: str | None, default: datetime | None = None) -> int | None:
+    """
+    Minutes since the epoch for a YYYY-MM-DD date and an HH:MM / 2 PM time.
+    Missing parts come from 'default' (now, if not given); a date without a
+    time means midnight unless 'default' is given.
+    """
+    base = default or datetime.now().replace(second=0, microsecond=0)
+    try:
+        day = datetime.strptime(date.strip(), "%Y-%m-%d") if date else base.replace(hour=0, minute=0)
+    except ValueError:
+        return None
+    clock = None
+    if time:
+        for fmt in TIME_FORMATS:
             try:
-                print(f"Received: {message}")
-                data = json.loads(message)
-                request_id = data.get("id")
-                method = data.get("method")
-                params = data.get("params", {})
-
-                if method in self.tools:
-                    result = await self.tools[method]["callback"](params)
-                    response = {
-                        "jsonrpc": "2.0",
-                        "id": request_id,
-                        "result": {"content": [{"text": result}]},
-                    }
-                else:
-                    response = {
-                        "jsonrpc": "2.0",
-                        "id": request_id,
-                        "error": {"code": -32601, "message": f"Method '{method}' not found"},
-                    }
-                print(f"Sending: {json.dumps(response)}")
-                await websocket.send(json.dumps(response))
-            except Exception as e:
-                print(f"Error handling request: {e}")
+                clock = datetime.strptime(time.strip().upper(), fmt)
+                break
+            except ValueError:
+                continue
+        if clock is None:
+            return None
+    elif not date or default:
+        clock = base
+    moment = day.replace(hour=clock.hour, minute=clock.minute) if clock else day
+    return calendar.timegm(moment.timetuple()) // 60
+
+def to_datetime(minutes: int) -> datetime:
+    return datetime(1970, 1, 1) + timedelta(minutes=minutes)
+
+def format_when(minutes: int) -> str:
+    return to_datetime(minutes).strftime("%Y-%m-%d %H:%M")
+
+def describe(event: Event) -> str:
+    return f"#{event.id} {event.title} {format_when(event.start)}–{format_when(event.end)[11:]}"
+
+def _duration(params) -> int:
+    return max(1, params.get("duration_minutes") or DEFAULT_DURATION)
 
 async def schedule_meeting(params):
+    user = params.get("user") or DEFAULT_USER
     event = params.get("event", "meeting")
-    date = params.get("date", "unspecified date")
-    time = params.get("time", "unspecified time")
-    return f"Scheduled {event} on {date} at {time}."
+    start = parse_when(params.get("date"), params.get("time"))
+    if start is None:
+        return f"Could not understand the date/time: {params.get('date')} {params.get('time')}"
+    date = params.get("date") or format_when(start)[:10]
+    time = params.get("time") or format_when(start)[11:]
+    duration = _duration(params)
+    repeat = (params.get("repeat") or "").lower()
+    count = max(1, min(MAX_OCCURRENCES, params.get("count") or 1)) if repeat in REPEAT_STEP else 1
+    starts = [start + i * REPEAT_STEP.get(repeat, 0) for i in range(count)]
 
-async def main():
-    server = McpServer()
+    cal = store.calendar(user)
+    with metrics.span("conflicts"):
+        conflicts = [c for s in starts for c in cal.conflicts(s, s + duration)]
+    if conflicts and not params.get("allow_conflict"):
+        suggestion = cal.next_free_slot(start, duration)
+        lines = [f"Conflicts with {describe(c)}" for c in conflicts[:5]]
+        if count == 1 and suggestion is not None:
+            lines.append(f"Next free slot: {format_when(suggestion)}")
+        return "\n".join(lines)
+
+    series = store.next_id if count > 1 else None
+    with metrics.span("store"):
+        events = [store.add(user, event, s, s + duration, series) for s in starts]
+    if count > 1:
+        return f"Scheduled {event} {repeat} x{count} from {format_when(start)} (ids #{events[0].id}–#{events[-1].id})."
+    return f"Scheduled {event} on {date} at {time} (#{events[0].id})."
+
+async def reschedule_meeting(params):
+    user = params.get("user") or DEFAULT_USER
+    event_id = params.get("id", 0)
+    current = store.calendar(user).events.get(event_id)
+    if current is None:
+        return f"No meeting #{event_id}"
+    start = parse_when(params.get("date"), params.get("time"), to_datetime(current.start))
+    if start is None:
+        return f"Could not understand the date/time: {params.get('date')} {params.get('time')}"
+    duration = _duration(params) if params.get("duration_minutes") else current.end - current.start
+    conflicts = [c for c in store.calendar(user).conflicts(start, start + duration) if c.id != event_id]
+    if conflicts and not params.get("allow_conflict"):
+        return "\n".join(f"Conflicts with {describe(c)}" for c in conflicts[:5])
+    moved = store.move(user, event_id, start, start + duration)
+    return f"Rescheduled {describe(moved)}"
+
+async def cancel_meeting(params):
+    user = params.get("user") or DEFAULT_USER
+    event_id = params.get("id", 0)
+    cal = store.calendar(user)
+    event = cal.events.get(event_id)
+    if event is None:
+        return f"No meeting #{event_id}"
+    if params.get("series") and event.series is not None:
+        ids = [e.id for e in cal.events.values() if e.series == event.series]
+        for i in ids:
+            store.remove(user, i)
+        return f"Cancelled {len(ids)} occurrences of {event.title}"
+    store.remove(user, event_id)
+    return f"Cancelled {describe(event)}"
+
+async def find_free_slot(params):
+    """
+    Earliest gap of 'duration_minutes' at or after date/time, searched one
+    working-hours window per day for up to 'within_days' days.
+    """
+    user = params.get("user") or DEFAULT_USER
+    duration = _duration(params)
+    after = parse_when(params.get("date"), params.get("time"))
+    day_start = parse_when("1970-01-01", params.get("day_start") or "09:00")
+    day_end = parse_when("1970-01-01", params.get("day_end") or "17:00")
+    if None in (after, day_start, day_end):
+        return "Could not understand the date/time"
+    cal = store.calendar(user)
+    day = after - after % (24 * 60)
+    for _ in range(max(1, min(MAX_SEARCH_DAYS, params.get("within_days") or 7))):
+        slot = cal.next_free_slot(max(after, day + day_start), duration, before=day + day_end)
+        if slot is not None:
+            return f"Free from {format_when(slot)} to {format_when(slot + duration)[11:]}"
+        day += 24 * 60
+    return "No free slot found"
+
+async def list_meetings(params):
+    user = params.get("user") or DEFAULT_USER
+    start = parse_when(params.get("date"), "00:00")
+    if start is None:
+        return f"Could not understand the date: {params.get('date')}"
+    days = max(1, params.get("days") or 1)
+    events = store.calendar(user).between(start, start + days * 24 * 60)
+    if not events:
+        return "No meetings"
+    return "\n".join(describe(e) for e in events)
+
+PORT = 8082
+
+def register(server: McpServer):
     server.tool(
         name="schedule-meeting",
-        description="Schedule or reschedule a meeting",
+        description="Schedule a meeting, rejecting conflicts unless allow_conflict is set",
         input_schema={
             "event": {"type": "string", "description": "Event title"},
-            "date": {"type": "string", "description": "Date of event"},
-            "time": {"type": "string", "description": "Time of event"},
+            "date": {"type": "string", "description": "Date of event (YYYY-MM-DD)"},
+            "time": {"type": "string", "description": "Time of event (HH:MM)"},
+            "duration_minutes": {"type": "integer", "description": "Length in minutes (default 30)"},
+            "user": {"type": "string", "description": "Calendar owner (optional)"},
+            "repeat": {"type": "string", "description": "daily or weekly (optional)"},
+            "count": {"type": "integer", "description": "Number of occurrences when repeating (1-366)"},
+            "allow_conflict": {"type": "boolean", "description": "Book even if it overlaps"},
         },
         callback=schedule_meeting,
     )
 
-    async with serve(server.handle_connection, "0.0.0.0", 8082):
-        print("Calendar MCP running on ws://0.0.0.0:8082")
-        await asyncio.Future()
+    server.tool(
+        name="reschedule-meeting",
+        description="Move a meeting to a new date/time",
+        input_schema={
+            "id": {"type": "integer", "description": "Meeting id"},
+            "date": {"type": "string", "description": "New date (YYYY-MM-DD)"},
+            "time": {"type": "string", "description": "New time (HH:MM)"},
+            "duration_minutes": {"type": "integer", "description": "New length (optional)"},
+            "user": {"type": "string", "description": "Calendar owner (optional)"},
+            "allow_conflict": {"type": "boolean", "description": "Move even if it overlaps"},
+        },
+        callback=reschedule_meeting,
+    )
+
+    server.tool(
+        name="cancel-meeting",
+        description="Cancel a meeting or a whole recurring series",
+        input_schema={
+            "id": {"type": "integer", "description": "Meeting id"},
+            "series": {"type": "boolean", "description": "Cancel every occurrence"},
+            "user": {"type": "string", "description": "Calendar owner (optional)"},
+        },
+        callback=cancel_meeting,
+    )
+
+    server.tool(
+        name="find-free-slot",
+        description="Find the next free slot of a given length within working hours",
+        input_schema={
+            "duration_minutes": {"type": "integer", "description": "Length in minutes (default 30)"},
+            "date": {"type": "string", "description": "Search from this date (default today)"},
+            "time": {"type": "string", "description": "Search from this time"},
+            "day_start": {"type": "string", "description": "Working day start (default 09:00)"},
+            "day_end": {"type": "string", "description": "Working day end (default 17:00)"},
+            "within_days": {"type": "integer", "description": "Days to search, 1-366 (default 7)"},
+            "user": {"type": "string", "description": "Calendar owner (optional)"},
+        },
+        callback=find_free_slot,
+    )
+
+    server.tool(
+        name="list-meetings",
+        description="List meetings for a day or range of days",
+        input_schema={
+            "date": {"type": "string", "description": "First day (YYYY-MM-DD, default today)"},
+            "days": {"type": "integer", "description": "Number of days (default 1)"},
+            "user": {"type": "string", "description": "Calendar owner (optional)"},
+        },
+        callback=list_meetings,
+    )
+
+async def shutdown():
+    """
+    Flush a final snapshot so the next start skips log replay.
+    """
+    store.snapshot()
+    store.close()
+
+async def main():
+    setup_logging()
+    server = McpServer()
+    register(server)
+
+    try:
+        async with server.serve("0.0.0.0", PORT):
+            logger.info("Calendar MCP running on ws://0.0.0.0:%d", PORT)
+            await asyncio.Future()
+    finally:
+        await shutdown()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,285 @@
+import json
+import logging
+import os
+from bisect import bisect_left, bisect_right, insort
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
+
+# Times are integer minutes since the Unix epoch (naive, caller's timezone).
+
+class Event(NamedTuple):
+    id: int
+    title: str
+    start: int
+    end: int
+    series: int | None = None
+
+class UserCalendar:
+    """
+    Sorted interval index for one user's events.
+
+    'index' holds (start, end, id) sorted by start. 'busy_starts'/'busy_ends'
+    hold the union of all events as disjoint sorted blocks, so "is this
+    range free?" and "where is the next gap?" are bisections rather than
+    scans. Inserts and removals touch only the affected block; the list
+    splices are memmoves, which stay cheap at tens of thousands of events.
+    """
+
+    __slots__ = ("events", "index", "busy_starts", "busy_ends")
+
+    def __init__(self):
+        self.events: dict[int, Event] = {}
+        self.index: list[tuple[int, int, int]] = []
+        self.busy_starts: list[int] = []
+        self.busy_ends: list[int] = []
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def is_free(self, start: int, end: int) -> bool:
+        i = bisect_right(self.busy_starts, start) - 1
+        if i >= 0 and self.busy_ends[i] > start:
+            return False
+        return i + 1 >= len(self.busy_starts) or self.busy_starts[i + 1] >= end
+
+    def conflicts(self, start: int, end: int) -> list[Event]:
+        """Events overlapping [start, end)."""
+        if self.is_free(start, end):
+            return []
+        # Only events starting inside the enclosing busy blocks can overlap.
+        block = max(0, bisect_right(self.busy_starts, start) - 1)
+        lo = bisect_left(self.index, (self.busy_starts[block],))
+        hi = bisect_left(self.index, (end,))
+        return [self.events[eid] for s, e, eid in self.index[lo:hi] if e > start and s < end]
+
+    def between(self, start: int, end: int) -> list[Event]:
+        """Events starting in [start, end), in start order."""
+        lo = bisect_left(self.index, (start,))
+        hi = bisect_left(self.index, (end,))
+        return [self.events[eid] for _, _, eid in self.index[lo:hi]]
+
+    def next_free_slot(self, after: int, duration: int, before: int | None = None) -> int | None:
+        """Earliest start >= 'after' with 'duration' free minutes (ending by 'before')."""
+        candidate = after
+        i = bisect_right(self.busy_starts, candidate) - 1
+        if i >= 0 and self.busy_ends[i] > candidate:
+            candidate = self.busy_ends[i]
+        i += 1
+        while i < len(self.busy_starts) and self.busy_starts[i] < candidate + duration:
+            candidate = max(candidate, self.busy_ends[i])
+            i += 1
+        if before is not None and candidate + duration > before:
+            return None
+        return candidate
+
+    def add(self, event: Event):
+        # An empty or inverted interval would unsort the busy blocks.
+        if event.end <= event.start:
+            raise ValueError(f"Event #{event.id} ends before it starts")
+        self.events[event.id] = event
+        insort(self.index, (event.start, event.end, event.id))
+        # Merge the new interval with every busy block it touches.
+        lo = bisect_left(self.busy_ends, event.start)
+        hi = bisect_right(self.busy_starts, event.end)
+        start, end = event.start, event.end
+        if lo < hi:
+            start = min(start, self.busy_starts[lo])
+            end = max(end, self.busy_ends[hi - 1])
+        self.busy_starts[lo:hi] = [start]
+        self.busy_ends[lo:hi] = [end]
+
+    def remove(self, event_id: int) -> Event | None:
+        event = self.events.pop(event_id, None)
+        if event is None:
+            return None
+        del self.index[bisect_left(self.index, (event.start, event.end, event.id))]
+        # Rebuild only the busy block that contained the event.
+        block = bisect_right(self.busy_starts, event.start) - 1
+        block_start, block_end = self.busy_starts[block], self.busy_ends[block]
+        lo = bisect_left(self.index, (block_start,))
+        hi = bisect_left(self.index, (block_end,))
+        starts, ends = [], []
+        for s, e, _ in self.index[lo:hi]:
+            if starts and s <= ends[-1]:
+                ends[-1] = max(ends[-1], e)
+            else:
+                starts.append(s)
+                ends.append(e)
+        self.busy_starts[block:block + 1] = starts
+        self.busy_ends[block:block + 1] = ends
+        return event
+
+class CalendarStore:
+    """
+    Per-user calendars made durable by an append-only JSON-lines log plus
+    periodic snapshots. Every mutation is appended before it is applied;
+    after 'snapshot_every' log entries the full state is written atomically
+    and the log is truncated, so restart cost stays bounded.
+    """
+
+    def __init__(self, directory: str | None = None, snapshot_every: int = 10_000, fsync: bool = False):
+        self.users: dict[str, UserCalendar] = {}
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self.seq = 0
+        self.next_id = 1
+        self._log = None
+        self._log_entries = 0
+        self.counters = {"added": 0, "removed": 0, "moved": 0, "snapshots": 0}
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._recover()
+            self._log = open(self._log_path, "a", encoding="utf-8")
+
+    @property
+    def _log_path(self) -> str:
+        return os.path.join(self.directory, "calendar.log")
+
+    @property
+    def _snapshot_path(self) -> str:
+        return os.path.join(self.directory, "calendar.snapshot.json")
+
+    def calendar(self, user: str) -> UserCalendar:
+        cal = self.users.get(user)
+        if cal is None:
+            cal = self.users[user] = UserCalendar()
+        return cal
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "users": len(self.users),
+            "events": sum(len(cal) for cal in self.users.values()),
+            "log_entries": self._log_entries,
+        }
+
+    # Mutations: log first, then apply.
+
+    def add(self, user: str, title: str, start: int, end: int, series: int | None = None) -> Event:
+        if end <= start:
+            raise ValueError("Event must end after it starts")
+        event = Event(self.next_id, title, start, end, series)
+        self._append({"op": "add", "user": user, "event": list(event)})
+        self._apply_add(user, event)
+        self.counters["added"] += 1
+        self._maybe_snapshot()
+        return event
+
+    def remove(self, user: str, event_id: int) -> Event | None:
+        if event_id not in self.calendar(user).events:
+            return None
+        self._append({"op": "remove", "user": user, "id": event_id})
+        event = self.calendar(user).remove(event_id)
+        self.counters["removed"] += 1
+        self._maybe_snapshot()
+        return event
+
+    def move(self, user: str, event_id: int, start: int, end: int) -> Event | None:
+        event = self.calendar(user).events.get(event_id)
+        if event is None:
+            return None
+        if end <= start:
+            raise ValueError("Event must end after it starts")
+        moved = event._replace(start=start, end=end)
+        self._append({"op": "move", "user": user, "id": event_id, "start": start, "end": end})
+        cal = self.calendar(user)
+        cal.remove(event_id)
+        cal.add(moved)
+        self.counters["moved"] += 1
+        self._maybe_snapshot()
+        return moved
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def _apply_add(self, user: str, event: Event):
+        self.calendar(user).add(event)
+        self.next_id = max(self.next_id, event.id + 1)
+
+    def _append(self, entry: dict):
+        self.seq += 1
+        if self._log is None:
+            return
+        entry["seq"] = self.seq
+        self._log.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self._log.flush()
+        if self.fsync:
+            os.fsync(self._log.fileno())
+        self._log_entries += 1
+
+    def _maybe_snapshot(self):
+        if self._log_entries >= self.snapshot_every:
+            self.snapshot()
+
+    def snapshot(self):
+        """Write the full state atomically, then start a fresh log."""
+        if not self.directory:
+            return
+        state = {
+            "seq": self.seq,
+            "next_id": self.next_id,
+            "users": {user: [list(e) for e in cal.events.values()] for user, cal in self.users.items()},
+        }
+        tmp_path = f"{self._snapshot_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._snapshot_path)
+        if self._log is not None:
+            self._log.close()
+        self._log = open(self._log_path, "w", encoding="utf-8")
+        self._log_entries = 0
+        self.counters["snapshots"] += 1
+
+    def _recover(self):
+        snapshot_seq = 0
+        if os.path.exists(self._snapshot_path):
+            with open(self._snapshot_path, encoding="utf-8") as f:
+                state = json.load(f)
+            snapshot_seq = self.seq = state["seq"]
+            self.next_id = state["next_id"]
+            for user, events in state["users"].items():
+                cal = self.calendar(user)
+                for fields in sorted(events, key=lambda e: e[2]):
+                    cal.add(Event(*fields))
+        if not os.path.exists(self._log_path):
+            return
+        # Byte offset just past the last complete entry. A crash mid-write
+        # leaves a partial final line; it is cut off below so later appends
+        # start on a fresh line instead of being glued onto it.
+        good = 0
+        with open(self._log_path, "rb") as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("no newline")
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # torn final write
+                good += len(line)
+                if entry["seq"] <= snapshot_seq:
+                    continue  # already in the snapshot
+                self.seq = entry["seq"]
+                self._log_entries += 1
+                cal = self.calendar(entry["user"])
+                if entry["op"] == "add":
+                    self._apply_add(entry["user"], Event(*entry["event"]))
+                elif entry["op"] == "remove":
+                    cal.remove(entry["id"])
+                elif entry["op"] == "move":
+                    event = cal.remove(entry["id"])
+                    if event is not None:
+                        cal.add(event._replace(start=entry["start"], end=entry["end"]))
+        size = os.path.getsize(self._log_path)
+        if good < size:
+            logger.warning(
+                "Dropping %d byte(s) of incomplete calendar log after offset %d in %s",
+                size - good, good, self._log_path,
+            )
+            with open(self._log_path, "r+b") as f:
+                f.truncate(good)
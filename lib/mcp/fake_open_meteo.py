@@ -0,0 +1,126 @@
+import argparse
+import asyncio
+import datetime
+import hashlib
+import random
+
+from aiohttp import web
+
+# Offline stand-in for the Open‑Meteo geocoding and forecast APIs, used by
+# mcp_bench.py. Responses are deterministic for a given name/coordinate;
+# only the simulated latency is random.
+
+def _seed(*parts) -> int:
+    return int(hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()[:8], 16)
+
+def geocode_result(name: str) -> dict:
+    rng = random.Random(_seed(name.lower()))
+    return {
+        "name": name,
+        "latitude": round(rng.uniform(-60, 70), 4),
+        "longitude": round(rng.uniform(-180, 180), 4),
+        "country_code": "ZZ",
+    }
+
+# Plausible value ranges per variable (default 0-30); rain is zero most of
+# the time so analytics see dry and wet spells.
+VARIABLE_RANGES = {
+    "temperature_2m_min": (-5, 15),
+    "temperature_2m_max": (10, 30),
+    "temperature_2m": (0, 28),
+    "precipitation_probability": (0, 100),
+    "wind_speed_10m": (0, 40),
+    "uv_index": (0, 9),
+}
+RAIN_VARIABLES = {"precipitation", "precipitation_sum", "rain", "showers"}
+
+def _series(rng: random.Random, variable: str, steps: int) -> list[float]:
+    if variable in RAIN_VARIABLES:
+        return [round(rng.uniform(0, 4), 1) if rng.random() < 0.2 else 0.0 for _ in range(steps)]
+    low, high = VARIABLE_RANGES.get(variable, (0, 30))
+    return [round(rng.uniform(low, high), 1) for _ in range(steps)]
+
+def forecast_result(latitude: float, longitude: float, query) -> dict:
+    rng = random.Random(_seed(round(latitude, 2), round(longitude, 2)))
+    today = datetime.date(2025, 1, 1)
+    days = int(query.get("forecast_days", "7"))
+    result = {"latitude": latitude, "longitude": longitude, "timezone": "GMT"}
+    if query.get("current_weather") == "true":
+        result["current_weather"] = {
+            "time": f"{today.isoformat()}T12:00",
+            "temperature": round(rng.uniform(-10, 35), 1),
+            "windspeed": round(rng.uniform(0, 20), 1),
+            "winddirection": rng.randrange(360),
+        }
+    for block, steps in (("daily", days), ("hourly", days * 24)):
+        variables = [v for v in query.get(block, "").split(",") if v]
+        if not variables:
+            continue
+        if block == "daily":
+            times = [(today + datetime.timedelta(days=i)).isoformat() for i in range(steps)]
+        else:
+            start = datetime.datetime(2025, 1, 1)
+            times = [(start + datetime.timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M") for i in range(steps)]
+        result[block] = {"time": times}
+        for variable in variables:
+            result[block][variable] = _series(rng, variable, steps)
+    return result
+
+class FakeOpenMeteo:
+    def __init__(self, latency_ms: float = 50.0, jitter_ms: float = 10.0, error_rate: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.requests = 0
+
+    async def _delay(self):
+        self.requests += 1
+        delay = max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms))
+        await asyncio.sleep(delay / 1000)
+        return random.random() < self.error_rate
+
+    async def search(self, request: web.Request) -> web.Response:
+        if await self._delay():
+            return web.json_response({"error": True, "reason": "simulated"}, status=503)
+        name = request.query.get("name", "")
+        return web.json_response({"results": [geocode_result(name)]} if name else {})
+
+    async def forecast(self, request: web.Request) -> web.Response:
+        if await self._delay():
+            return web.json_response({"error": True, "reason": "simulated"}, status=503)
+        lats = [float(v) for v in request.query.get("latitude", "0").split(",")]
+        lons = [float(v) for v in request.query.get("longitude", "0").split(",")]
+        results = [forecast_result(lat, lon, request.query) for lat, lon in zip(lats, lons)]
+        # Like Open‑Meteo: one coordinate -> object, several -> list.
+        return web.json_response(results[0] if len(results) == 1 else results)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/v1/search", self.search)
+        app.router.add_get("/v1/forecast", self.forecast)
+        return app
+
+async def start_fake(host: str = "127.0.0.1", port: int = 9100, **kwargs) -> web.AppRunner:
+    """Start the fake API in the running loop; call runner.cleanup() to stop."""
+    runner = web.AppRunner(FakeOpenMeteo(**kwargs).app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+async def main():
+    parser = argparse.ArgumentParser(description="Offline Open-Meteo stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    await start_fake(
+        args.host, args.port,
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+    )
+    print(f"Fake Open-Meteo running on http://{args.host}:{args.port}")
+    await asyncio.Future()
+
+if __name__ == "__main__":
+    asyncio.run(main())
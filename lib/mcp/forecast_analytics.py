@@ -0,0 +1,165 @@
+import numpy as np
+
+# Open‑Meteo variables each analysis needs; a query asks only for the
+# union of the sections it includes.
+SECTION_FIELDS = {
+    "trend": {"daily": ("temperature_2m_max", "temperature_2m_min")},
+    "rain": {
+        "hourly": ("precipitation", "precipitation_probability"),
+        "daily": ("precipitation_sum",),
+    },
+    "outdoor": {
+        "hourly": ("temperature_2m", "precipitation_probability", "wind_speed_10m", "uv_index"),
+    },
+}
+SECTIONS = tuple(SECTION_FIELDS)
+
+MAX_DAYS = 16
+TREND_WINDOW = 3             # days in the rolling mean of daily highs
+WET_MM = 0.1                 # an hour is wet at this much rain...
+WET_PROBABILITY = 50         # ...or at this chance of rain (%)
+MAX_RAIN_WINDOWS = 5
+COMFORT_C = 20.0             # ideal outdoor temperature
+DAYLIGHT_HOURS = (7, 21)     # outdoor windows must fit in [start, end)
+MAX_OUTDOOR_WINDOWS = 3
+
+def fields_for(sections) -> tuple[str, str]:
+    """Comma-separated hourly and daily variables for the given sections."""
+    hourly: set[str] = set()
+    daily: set[str] = set()
+    for section in sections:
+        hourly.update(SECTION_FIELDS[section].get("hourly", ()))
+        daily.update(SECTION_FIELDS[section].get("daily", ()))
+    return ",".join(sorted(hourly)), ",".join(sorted(daily))
+
+def to_columns(data: dict) -> dict:
+    """
+    Convert an Open‑Meteo response into NumPy columns once, so cached
+    entries are analysed without walking JSON lists again. Missing values
+    (null) become NaN.
+    """
+    columns = {"timezone": data.get("timezone")}
+    for block, unit in (("hourly", "m"), ("daily", "D")):
+        values = data.get(block)
+        if not values:
+            continue
+        columns[f"{block}_time"] = np.array(values["time"], dtype=f"datetime64[{unit}]")
+        columns[block] = {
+            name: np.array(series, dtype=np.float64)
+            for name, series in values.items()
+            if name != "time"
+        }
+    return columns
+
+def _runs(mask: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Start and end (exclusive) indices of each run of True in 'mask'."""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+def _window(start: np.datetime64, hours: int) -> str:
+    """'YYYY-MM-DD HH:MM–HH:MM', with the end date too if it differs."""
+    first = str(start).replace("T", " ")
+    last = str(start + np.timedelta64(hours, "h")).replace("T", " ")
+    return f"{first}–{last[11:]}" if last[:10] == first[:10] else f"{first}–{last}"
+
+def _rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    return np.convolve(values, np.ones(window) / window, mode="valid")
+
+def daily_trend(columns: dict) -> list[str]:
+    """Daily highs/lows with day-over-day deltas and a rolling mean of highs."""
+    dates = columns["daily_time"]
+    highs = columns["daily"]["temperature_2m_max"]
+    lows = columns["daily"]["temperature_2m_min"]
+    deltas = np.diff(highs, prepend=np.nan)
+
+    lines = ["Temperature trend:"]
+    for date, high, low, delta in zip(dates.astype(str), highs, lows, deltas):
+        change = "" if np.isnan(delta) else f" ({delta:+.1f})"
+        lines.append(f"  {date}  → High {high:.1f}°C{change}, Low {low:.1f}°C")
+    if len(highs) >= TREND_WINDOW:
+        rolling = _rolling_mean(highs, TREND_WINDOW)
+        lines.append(f"  {TREND_WINDOW}-day mean high: {rolling[0]:.1f}°C → {rolling[-1]:.1f}°C")
+    if len(highs) >= 2 and not np.all(np.isnan(deltas[1:])):
+        biggest = np.nanargmax(np.abs(deltas[1:])) + 1
+        lines.append(f"  Biggest change: {deltas[biggest]:+.1f}°C on {dates[biggest]}")
+    return lines
+
+def rain_windows(columns: dict) -> list[str]:
+    """Wettest day, dry days and the contiguous wet spells (hourly)."""
+    lines = ["Rain:"]
+    daily_sum = columns["daily"]["precipitation_sum"]
+    if len(daily_sum) and not np.all(np.isnan(daily_sum)):
+        wettest = np.nanargmax(daily_sum)
+        dry = int(np.count_nonzero(daily_sum < WET_MM))
+        lines.append(
+            f"  Wettest day: {columns['daily_time'][wettest]} ({daily_sum[wettest]:.1f} mm); {dry} dry day(s)"
+        )
+
+    times = columns["hourly_time"]
+    amount = np.nan_to_num(columns["hourly"]["precipitation"])
+    chance = np.nan_to_num(columns["hourly"]["precipitation_probability"])
+    starts, ends = _runs((amount >= WET_MM) | (chance >= WET_PROBABILITY))
+    if not len(starts):
+        lines.append("  No rain expected.")
+        return lines
+    totals = np.concatenate(([0.0], np.cumsum(amount)))
+    window_mm = totals[ends] - totals[starts]
+    # Peak chance per run: reduceat over [start, end) pairs, with a sentinel
+    # so an end index may equal the series length.
+    bounds = np.column_stack((starts, ends)).ravel()
+    peak = np.maximum.reduceat(np.append(chance, 0), bounds)[::2]
+    # Report the wettest spells, in time order.
+    chosen = np.sort(np.argsort(-window_mm, kind="stable")[:MAX_RAIN_WINDOWS])
+    for i in chosen:
+        window = _window(times[starts[i]], ends[i] - starts[i])
+        lines.append(f"  {window}: {window_mm[i]:.1f} mm, up to {peak[i]:.0f}%")
+    if len(starts) > MAX_RAIN_WINDOWS:
+        lines.append(f"  ({len(starts) - MAX_RAIN_WINDOWS} more wet spell(s))")
+    return lines
+
+def outdoor_windows(columns: dict, hours: int = 2) -> list[str]:
+    """
+    The best daylight windows of 'hours' consecutive hours for being
+    outside: mild temperature, low chance of rain, light wind, moderate UV.
+    """
+    times = columns["hourly_time"]
+    hourly = columns["hourly"]
+    temp = hourly["temperature_2m"]
+    chance = np.nan_to_num(hourly["precipitation_probability"])
+    wind = np.nan_to_num(hourly["wind_speed_10m"])
+    uv = np.nan_to_num(hourly["uv_index"])
+
+    score = (
+        -np.abs(temp - COMFORT_C)
+        - 0.1 * chance
+        - 0.2 * np.maximum(wind - 15.0, 0.0)
+        - np.maximum(uv - 6.0, 0.0)
+    )
+    hour_of_day = (times - times.astype("datetime64[D]")).astype("timedelta64[h]").astype(np.int64)
+    usable = (hour_of_day >= DAYLIGHT_HOURS[0]) & (hour_of_day < DAYLIGHT_HOURS[1]) & ~np.isnan(score)
+
+    title = f"Best hours outdoors ({hours} h):"
+    if len(score) < hours:
+        return [title, "  Not enough hourly data."]
+    window_score = _rolling_mean(np.where(usable, score, 0.0), hours)
+    # A window counts only if every hour in it is usable (daylight, no gaps).
+    valid = np.convolve(usable, np.ones(hours, dtype=np.int64), mode="valid") == hours
+    candidates = np.flatnonzero(valid)
+    if not len(candidates):
+        return [title, "  No suitable daylight hours."]
+    candidates = candidates[np.argsort(-window_score[candidates], kind="stable")]
+
+    lines = [title]
+    taken: list[int] = []
+    for start in candidates:
+        if any(abs(start - other) < hours for other in taken):
+            continue
+        taken.append(start)
+        span = slice(start, start + hours)
+        lines.append(
+            f"  {_window(times[start], hours)}: {np.nanmean(temp[span]):.0f}°C, "
+            f"{chance[span].max():.0f}% rain, wind {wind[span].max():.0f} km/h, UV {uv[span].max():.0f}"
+        )
+        if len(taken) == MAX_OUTDOOR_WINDOWS:
+            break
+    return lines
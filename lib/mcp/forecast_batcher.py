@@ -0,0 +1,119 @@
+import asyncio
+import contextvars
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ForecastBatcher:
+    """
+    Micro-batches point lookups. Calls arriving within 'window' seconds of
+    the first one are sent upstream together through
+    'await fetch_many([(lat, lon), ...])', which returns one result per
+    point (or None when the whole request failed). A batch is sent early
+    once it holds 'max_batch' distinct points; repeated points share one
+    slot. A point whose callers all give up is dropped before it is sent,
+    and a batch whose points were all abandoned is cancelled in flight.
+    Batches are sent in a fresh context, never under the deadline of
+    whichever caller happened to open or fill them.
+    """
+
+    def __init__(self, fetch_many, window: float = 0.005, max_batch: int = 50):
+        self.fetch_many = fetch_many
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: dict[tuple[float, float], asyncio.Future] = {}
+        self._timer: asyncio.TimerHandle | None = None
+        # Sent batches: task -> its futures, and each future -> its task.
+        self._batches: dict[asyncio.Task, list[asyncio.Future]] = {}
+        self._sent: dict[asyncio.Future, asyncio.Task] = {}
+        self._waiters: dict[asyncio.Future, int] = {}
+        self.counters = {
+            "requests": 0,
+            "coalesced": 0,
+            "batches": 0,
+            "points": 0,
+            "largest_batch": 0,
+            "errors": 0,
+            "abandoned": 0,
+        }
+
+    async def fetch(self, latitude: float, longitude: float) -> dict | None:
+        self.counters["requests"] += 1
+        key = (latitude, longitude)
+        future = self._pending.get(key)
+        if future is not None:
+            self.counters["coalesced"] += 1
+        else:
+            loop = asyncio.get_running_loop()
+            future = self._pending[key] = loop.create_future()
+            if len(self._pending) >= self.max_batch:
+                self.flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.window, self.flush, context=contextvars.Context())
+        self._waiters[future] = self._waiters.get(future, 0) + 1
+        try:
+            # Shield so one caller's cancellation does not fail the shared slot.
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if self._waiters[future] == 1:
+                self._abandon(key, future)
+            raise
+        finally:
+            self._waiters[future] -= 1
+            if not self._waiters[future]:
+                del self._waiters[future]
+
+    def _abandon(self, key: tuple[float, float], future: asyncio.Future):
+        if future.done():
+            return
+        future.cancel()
+        self.counters["abandoned"] += 1
+        if self._pending.get(key) is future:
+            del self._pending[key]
+            if not self._pending and self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            return
+        task = self._sent.get(future)
+        if task is not None and all(f.done() for f in self._batches[task]):
+            task.cancel()
+
+    def flush(self):
+        """Send everything queued so far as one upstream request."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        task = asyncio.create_task(self._send(batch), context=contextvars.Context())
+        self._batches[task] = list(batch.values())
+        for future in batch.values():
+            self._sent[future] = task
+        task.add_done_callback(self._sent_done)
+
+    def _sent_done(self, task: asyncio.Task):
+        for future in self._batches.pop(task):
+            self._sent.pop(future, None)
+
+    async def _send(self, batch: dict[tuple[float, float], asyncio.Future]):
+        points = list(batch)
+        self.counters["batches"] += 1
+        self.counters["points"] += len(points)
+        self.counters["largest_batch"] = max(self.counters["largest_batch"], len(points))
+        try:
+            results = await self.fetch_many(points)
+        except Exception:
+            logger.exception("Batched forecast request failed")
+            results = None
+        if results is None or len(results) != len(points):
+            if results is not None:
+                logger.warning("Expected %d forecasts, got %d", len(points), len(results))
+            self.counters["errors"] += 1
+            results = [None] * len(points)
+        for future, data in zip(batch.values(), results):
+            if not future.done():
+                future.set_result(data)
+
+    def stats(self) -> dict:
+        return {**self.counters, "pending": len(self._pending)}
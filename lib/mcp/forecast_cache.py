@@ -0,0 +1,127 @@
+import asyncio
+import contextvars
+import time
+from collections import OrderedDict
+
+class ForecastCache:
+    """
+    Forecast responses keyed on coordinates snapped to a 'grid'-degree grid.
+
+    - Entries younger than 'ttl' are served directly.
+    - Entries younger than 'ttl + stale_ttl' are served immediately while a
+      background refresh runs (stale-while-revalidate).
+    - Concurrent misses for the same key share a single upstream fetch,
+      which is cancelled if every caller waiting on it goes away. The fetch
+      runs in a fresh context, so it is not bound by the deadline of the
+      call that started it; each caller's deadline applies to its own wait.
+    - Older entries are kept (until evicted) so peek_stale() can fall back
+      to them when the upstream is down.
+    """
+
+    def __init__(
+        self,
+        grid: float = 0.01,
+        ttl: float = 900,
+        stale_ttl: float = 3600,
+        max_entries: int = 5_000,
+    ):
+        self.grid = grid
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple, tuple[dict, float]] = OrderedDict()
+        self._inflight: dict[tuple, asyncio.Task] = {}
+        self._waiters: dict[tuple, int] = {}
+        self._background: set[tuple] = set()
+        self.counters = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "refreshes": 0,
+            "fetch_errors": 0,
+            "abandoned": 0,
+        }
+
+    def snap(self, latitude: float, longitude: float) -> tuple[float, float]:
+        """Round coordinates to the cache grid so nearby requests share an entry."""
+        digits = max(0, len(repr(self.grid).split(".")[-1]))
+        return (
+            round(round(float(latitude) / self.grid) * self.grid, digits),
+            round(round(float(longitude) / self.grid) * self.grid, digits),
+        )
+
+    async def get_or_fetch(self, latitude: float, longitude: float, fetch, variant: str = "") -> dict | None:
+        """
+        Return forecast data for the snapped point, calling
+        'await fetch(snapped_lat, snapped_lon)' only when needed.
+        'variant' separates entries requested with different query fields.
+        """
+        lat, lon = self.snap(latitude, longitude)
+        key = (lat, lon, variant)
+        entry = self._entries.get(key)
+        if entry is not None:
+            data, fetched_at = entry
+            age = time.monotonic() - fetched_at
+            if age < self.ttl:
+                self._entries.move_to_end(key)
+                self.counters["hits"] += 1
+                return data
+            if age < self.ttl + self.stale_ttl:
+                self._entries.move_to_end(key)
+                self.counters["stale_hits"] += 1
+                if key not in self._inflight:
+                    self.counters["refreshes"] += 1
+                    self._start_fetch(key, fetch)
+                    self._background.add(key)
+                return data
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.counters["coalesced"] += 1
+        else:
+            self.counters["misses"] += 1
+            task = self._start_fetch(key, fetch)
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            # Shield so one caller's cancellation does not abort the shared fetch.
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # The last waiter is leaving: stop the upstream call, unless it is
+            # a background refresh that should still land in the cache.
+            if self._waiters[key] == 1 and not task.done() and key not in self._background:
+                task.cancel()
+                self.counters["abandoned"] += 1
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+
+    def peek_stale(self, latitude: float, longitude: float, variant: str = "") -> dict | None:
+        """Return any cached entry for the point regardless of age."""
+        entry = self._entries.get((*self.snap(latitude, longitude), variant))
+        return entry[0] if entry is not None else None
+
+    def stats(self) -> dict:
+        return {**self.counters, "size": len(self._entries), "inflight": len(self._inflight)}
+
+    def _start_fetch(self, key: tuple, fetch) -> asyncio.Task:
+        task = asyncio.create_task(self._fetch(key, fetch), context=contextvars.Context())
+        self._inflight[key] = task
+        return task
+
+    async def _fetch(self, key: tuple, fetch) -> dict | None:
+        try:
+            data = await fetch(key[0], key[1])
+            if data is None:
+                self.counters["fetch_errors"] += 1
+                return None
+            self._entries[key] = (data, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return data
+        finally:
+            self._inflight.pop(key, None)
+            self._background.discard(key)
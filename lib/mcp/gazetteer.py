@@ -0,0 +1,283 @@
+import argparse
+from typing import NamedTuple
+
+import numpy as np
+
+from array_store import open_arrays, write_arrays
+from geocache import normalize_city
+
+# Normalised names are stored as fixed-width UTF-8 keys so the sorted key
+# array can be binary-searched directly with np.searchsorted. The few names
+# longer than this are cut to fit and their full keys kept on the side
+# ("long_*" arrays), so candidates can be checked against the whole name.
+KEY_WIDTH = 40
+
+class Place(NamedTuple):
+    name: str
+    latitude: float
+    longitude: float
+    country_code: str
+    admin1: str
+    population: int
+
+def _key(name: str) -> bytes:
+    return normalize_city(name).encode("utf-8")
+
+def parse_query(query: str) -> tuple[str, list[str]]:
+    """
+    Split "Paris, TX" / "Paris, Texas, US" into the city name and its
+    normalised qualifiers (admin1 or country, by code or name).
+    """
+    name, *qualifiers = [part.strip() for part in query.split(",")]
+    return name, [normalize_city(q) for q in qualifiers if q]
+
+def compile_gazetteer(
+    cities_path: str,
+    out_path: str,
+    admin1_path: str | None = None,
+    countries_path: str | None = None,
+    min_population: int = 0,
+    include_alternates: bool = True,
+) -> int:
+    """
+    Build a memory-mappable index from a GeoNames cities dump
+    (cities500.txt, cities15000.txt, ...). admin1CodesASCII.txt and
+    countryInfo.txt are optional and let queries use "Paris, Texas" or
+    "Paris, France" as well as codes. Returns the number of cities indexed.
+    """
+    names, lats, lons, pops, countries, admin1s = [], [], [], [], [], []
+    keys, key_city = [], []
+    with open(cities_path, encoding="utf-8") as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 15:
+                continue
+            population = int(fields[14] or 0)
+            if population < min_population:
+                continue
+            city = len(names)
+            names.append(fields[1])
+            lats.append(float(fields[4]))
+            lons.append(float(fields[5]))
+            pops.append(population)
+            countries.append(fields[8])
+            admin1s.append(fields[10])
+            variants = {fields[1], fields[2]}
+            if include_alternates:
+                variants.update(a for a in fields[3].split(",") if a)
+            for key in {_key(v) for v in variants}:
+                if key:
+                    keys.append(key)
+                    key_city.append(city)
+
+    population = np.array(pops, dtype=np.int64)
+    key_array = np.array(keys, dtype=f"S{KEY_WIDTH}")
+    key_city_array = np.array(key_city, dtype=np.uint32)
+    # Sort by key, then by descending population, so the first entry of an
+    # exact-match run is the most populous city with that name.
+    order = np.lexsort((-population[key_city_array], key_array))
+    long_index = np.array(
+        [i for i, k in enumerate(order) if len(keys[k]) > KEY_WIDTH], dtype=np.uint32
+    )
+    long_keys = [keys[order[i]] for i in long_index]
+    long_offsets = np.zeros(len(long_keys) + 1, dtype=np.int64)
+    long_offsets[1:] = np.cumsum([len(k) for k in long_keys])
+
+    encoded = [n.encode("utf-8") for n in names]
+    name_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    name_offsets[1:] = np.cumsum([len(n) for n in encoded])
+
+    write_arrays(
+        out_path,
+        {
+            "keys": key_array[order],
+            "key_city": key_city_array[order],
+            "long_index": long_index,
+            "long_blob": np.frombuffer(b"".join(long_keys), dtype=np.uint8),
+            "long_offsets": long_offsets,
+            "latitude": np.array(lats, dtype=np.float32),
+            "longitude": np.array(lons, dtype=np.float32),
+            "population": population,
+            "country": np.array(countries, dtype="S2"),
+            "admin1": np.array(admin1s, dtype="S20"),
+            "name_blob": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+            "name_offsets": name_offsets,
+        },
+        meta={
+            "admin1_names": _load_admin1_names(admin1_path) if admin1_path else {},
+            "country_names": _load_country_names(countries_path) if countries_path else {},
+        },
+    )
+    return len(names)
+
+def _load_admin1_names(path: str) -> dict[str, str]:
+    # admin1CodesASCII.txt: "US.TX<TAB>Texas<TAB>Texas<TAB>4736286"
+    names = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) >= 3:
+                names[fields[0]] = normalize_city(fields[2] or fields[1])
+    return names
+
+def _load_country_names(path: str) -> dict[str, str]:
+    # countryInfo.txt: ISO, ISO3, ISO-Numeric, fips, Country, ...; '#' comments
+    names = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) >= 5:
+                names[fields[0]] = normalize_city(fields[4])
+    return names
+
+class Gazetteer:
+    """
+    Offline city resolver over a compiled, memory-mapped GeoNames index.
+    Exact lookups and prefix searches are binary searches over the sorted
+    key array; ties between same-named cities go to the larger population.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        arrays, meta = open_arrays(path)
+        self.keys = arrays["keys"]
+        self.key_city = arrays["key_city"]
+        # Indexes compiled before long keys were kept have none of these;
+        # their long names only match on the first KEY_WIDTH bytes.
+        self.long_index = arrays.get("long_index", np.empty(0, dtype=np.uint32))
+        self.long_blob = arrays.get("long_blob", np.empty(0, dtype=np.uint8))
+        self.long_offsets = arrays.get("long_offsets", np.zeros(1, dtype=np.int64))
+        self.latitude = arrays["latitude"]
+        self.longitude = arrays["longitude"]
+        self.population = arrays["population"]
+        self.country = arrays["country"]
+        self.admin1 = arrays["admin1"]
+        self.name_blob = arrays["name_blob"]
+        self.name_offsets = arrays["name_offsets"]
+        self.admin1_names: dict[str, str] = meta.get("admin1_names", {})
+        self.country_names: dict[str, str] = meta.get("country_names", {})
+        self.counters = {"lookups": 0, "hits": 0}
+
+    def __len__(self) -> int:
+        return len(self.latitude)
+
+    def stats(self) -> dict:
+        return {**self.counters, "cities": len(self), "keys": len(self.keys)}
+
+    def place(self, city: int) -> Place:
+        start, end = self.name_offsets[city], self.name_offsets[city + 1]
+        return Place(
+            name=self.name_blob[start:end].tobytes().decode("utf-8"),
+            latitude=float(self.latitude[city]),
+            longitude=float(self.longitude[city]),
+            country_code=self.country[city].decode(),
+            admin1=self.admin1[city].decode(),
+            population=int(self.population[city]),
+        )
+
+    def _matches(self, city: int, qualifiers: list[str]) -> bool:
+        country = self.country[city].decode()
+        admin1 = self.admin1[city].decode()
+        accepted = {
+            country.lower(),
+            admin1.lower(),
+            self.country_names.get(country, ""),
+            self.admin1_names.get(f"{country}.{admin1}", ""),
+        }
+        return all(q in accepted for q in qualifiers)
+
+    def _full_key(self, i: int) -> bytes:
+        """The whole key at sorted position 'i', including any cut-off tail."""
+        j = int(np.searchsorted(self.long_index, i))
+        if j < len(self.long_index) and self.long_index[j] == i:
+            return self.long_blob[self.long_offsets[j]:self.long_offsets[j + 1]].tobytes()
+        return bytes(self.keys[i])
+
+    def _range(self, key: bytes, prefix: bool) -> tuple[int, int]:
+        # Positions whose stored (possibly cut) key matches; callers check
+        # _full_key() when the match may rest on the first KEY_WIDTH bytes.
+        key = key[:KEY_WIDTH]
+        lo = int(np.searchsorted(self.keys, key, side="left"))
+        if prefix:
+            # No UTF-8 byte is 0xff, so this sorts after every key with the prefix.
+            hi = int(np.searchsorted(self.keys, key + b"\xff", side="left"))
+        else:
+            hi = int(np.searchsorted(self.keys, key, side="right"))
+        return lo, hi
+
+    def resolve(self, query: str) -> Place | None:
+        """
+        Resolve "Berlin", "Paris, TX" or "Springfield, Illinois, US" to the
+        most populous matching city, or None.
+        """
+        self.counters["lookups"] += 1
+        name, qualifiers = parse_query(query)
+        key = _key(name)
+        if not key:
+            return None
+        lo, hi = self._range(key, prefix=False)
+        check = len(key) >= KEY_WIDTH
+        for i in range(lo, hi):
+            if check and self._full_key(i) != key:
+                continue
+            city = int(self.key_city[i])
+            if not qualifiers or self._matches(city, qualifiers):
+                self.counters["hits"] += 1
+                return self.place(city)
+        return None
+
+    def search(self, prefix: str, limit: int = 10) -> list[Place]:
+        """Cities whose name (or alternate name) starts with 'prefix', largest first."""
+        name, qualifiers = parse_query(prefix)
+        key = _key(name)
+        if not key:
+            return []
+        lo, hi = self._range(key, prefix=True)
+        if len(key) > KEY_WIDTH:
+            positions = [i for i in range(lo, hi) if self._full_key(i).startswith(key)]
+            cities = np.unique(self.key_city[positions])
+        else:
+            cities = np.unique(self.key_city[lo:hi])
+        ranked = cities[np.argsort(-self.population[cities], kind="stable")]
+        results = []
+        for city in ranked:
+            if not qualifiers or self._matches(int(city), qualifiers):
+                results.append(self.place(int(city)))
+                if len(results) == limit:
+                    break
+        return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile or query the offline gazetteer")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("compile", help="Compile a GeoNames cities dump")
+    build.add_argument("cities")
+    build.add_argument("output")
+    build.add_argument("--admin1", help="admin1CodesASCII.txt")
+    build.add_argument("--countries", help="countryInfo.txt")
+    build.add_argument("--min-population", type=int, default=0)
+    build.add_argument("--no-alternates", action="store_true")
+    lookup = sub.add_parser("lookup", help="Resolve a name against a compiled index")
+    lookup.add_argument("index")
+    lookup.add_argument("query")
+    lookup.add_argument("--prefix", action="store_true", help="List prefix matches instead")
+    args = parser.parse_args()
+
+    if args.command == "compile":
+        count = compile_gazetteer(
+            args.cities, args.output, args.admin1, args.countries,
+            args.min_population, not args.no_alternates,
+        )
+        print(f"Indexed {count} cities into {args.output}")
+    else:
+        gazetteer = Gazetteer(args.index)
+        if args.prefix:
+            for place in gazetteer.search(args.query):
+                print(place)
+        else:
+            print(gazetteer.resolve(args.query))
+
+if __name__ == "__main__":
+    main()
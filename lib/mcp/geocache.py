@@ -0,0 +1,225 @@
+import asyncio
+import csv
+import json
+import logging
+import sqlite3
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Sentinel distinguishing "not cached" from a cached negative (unknown city).
+MISSING = object()
+
+# Writes to SQLite are buffered and flushed together this many seconds after
+# the first one, or as soon as this many are pending.
+FLUSH_DELAY = 1.0
+FLUSH_MAX = 256
+
+def normalize_city(name: str) -> str:
+    """
+    Canonical cache key for a city name: strips diacritics, case-folds and
+    collapses whitespace, so "  São  Paulo" and "sao paulo" share one entry.
+    """
+    decomposed = unicodedata.normalize("NFKD", name)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(stripped.casefold().split())
+
+class GeocodeCache:
+    """
+    Bounded LRU of city -> (latitude, longitude) with TTLs.
+    Unknown names are cached as None for a shorter negative TTL. When
+    'db_path' is set, entries are written through to SQLite and read back
+    on a memory miss, so a restarted server does not start cold. Writes are
+    batched and committed on a dedicated thread, never on the event loop.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        ttl: float = 30 * 24 * 3600,
+        negative_ttl: float = 3600,
+        db_path: str | None = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries: OrderedDict[str, tuple[tuple[float, float] | None, float]] = OrderedDict()
+        self.db_path = db_path
+        self._db: sqlite3.Connection | None = None
+        # Rows not yet written, keyed so a repeated put replaces its row.
+        self._pending: dict[str, tuple[float | None, float | None, float]] = {}
+        self._flush_timer: asyncio.TimerHandle | None = None
+        self._writer: ThreadPoolExecutor | None = None
+        self._write_db: sqlite3.Connection | None = None
+        self.counters = {
+            "hits": 0,
+            "misses": 0,
+            "negative_hits": 0,
+            "disk_hits": 0,
+            "evictions": 0,
+            "disk_writes": 0,
+            "flushes": 0,
+            "write_errors": 0,
+        }
+        if db_path:
+            self._db = sqlite3.connect(db_path)
+            # WAL lets the loop keep reading while the writer thread commits.
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS geocode ("
+                " key TEXT PRIMARY KEY, latitude REAL, longitude REAL, expires REAL)"
+            )
+            self._db.commit()
+            self._writer = ThreadPoolExecutor(1, thread_name_prefix="geocache-db")
+
+    def get(self, city: str):
+        """
+        Return cached coordinates, None for a cached negative, or MISSING.
+        """
+        key = normalize_city(city)
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            coords, expires = entry
+            if expires > now:
+                self._entries.move_to_end(key)
+                self._count_hit(coords)
+                return coords
+            del self._entries[key]
+
+        pending = self._pending.get(key)
+        if pending is not None and pending[2] > now:
+            coords = None if pending[0] is None else (pending[0], pending[1])
+            self._remember(key, coords, pending[2])
+            self._count_hit(coords)
+            return coords
+
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT latitude, longitude, expires FROM geocode WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and row[2] > now:
+                coords = None if row[0] is None else (row[0], row[1])
+                self._remember(key, coords, row[2])
+                self.counters["disk_hits"] += 1
+                self._count_hit(coords)
+                return coords
+
+        self.counters["misses"] += 1
+        return MISSING
+
+    def put(self, city: str, coords: tuple[float, float] | None, ttl: float | None = None):
+        """Cache a lookup result; pass coords=None to record an unknown city."""
+        key = normalize_city(city)
+        if ttl is None:
+            ttl = self.ttl if coords is not None else self.negative_ttl
+        expires = time.time() + ttl
+        self._remember(key, coords, expires)
+        if self._writer is not None:
+            lat, lon = coords if coords is not None else (None, None)
+            self._pending[key] = (lat, lon, expires)
+            self._schedule_flush()
+
+    def flush(self):
+        """Hand every pending write to the writer thread as one transaction."""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if not self._pending or self._writer is None:
+            return
+        rows = [(key, *row) for key, row in self._pending.items()]
+        self._pending.clear()
+        self.counters["flushes"] += 1
+        self.counters["disk_writes"] += len(rows)
+        self._writer.submit(self._write, rows)
+
+    def seed(self, entries: dict[str, tuple[float, float]], ttl: float = float("inf")):
+        """Pre-populate the memory tier; seeds never expire by default."""
+        for city, coords in entries.items():
+            self._remember(normalize_city(city), (float(coords[0]), float(coords[1])), time.time() + ttl)
+
+    def seed_from_file(self, path: str) -> int:
+        """
+        Load seeds from a JSON object {"city": [lat, lon]} or a CSV file with
+        name,latitude,longitude columns. Returns the number of entries loaded.
+        """
+        if path.endswith(".json"):
+            with open(path, encoding="utf-8") as f:
+                entries = {name: tuple(coords) for name, coords in json.load(f).items()}
+        else:
+            with open(path, encoding="utf-8", newline="") as f:
+                entries = {
+                    row["name"]: (row["latitude"], row["longitude"])
+                    for row in csv.DictReader(f)
+                }
+        self.seed(entries)
+        return len(entries)
+
+    def stats(self) -> dict:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "size": len(self._entries),
+            "hit_ratio": round(self.counters["hits"] / lookups, 4) if lookups else 0.0,
+        }
+
+    def close(self):
+        """Write out anything pending, then close both connections."""
+        self.flush()
+        if self._writer is not None:
+            self._writer.submit(self._close_writer)
+            self._writer.shutdown(wait=True)
+            self._writer = None
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _schedule_flush(self):
+        if len(self._pending) >= FLUSH_MAX:
+            self.flush()
+        elif self._flush_timer is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                # No event loop (scripts, tests): nothing to block, write now.
+                self.flush()
+                return
+            self._flush_timer = loop.call_later(FLUSH_DELAY, self.flush)
+
+    def _write(self, rows):
+        # Runs on the writer thread, which owns its own connection. A failed
+        # batch (locked or read-only database, full disk) is logged, counted
+        # and dropped; its entries stay in the memory tier only.
+        try:
+            if self._write_db is None:
+                self._write_db = sqlite3.connect(self.db_path)
+            self._write_db.executemany(
+                "INSERT OR REPLACE INTO geocode (key, latitude, longitude, expires) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._write_db.commit()
+        except sqlite3.Error:
+            self.counters["write_errors"] += 1
+            logger.exception("Failed to write %d geocoding cache entries to %s", len(rows), self.db_path)
+            if self._write_db is not None:
+                self._write_db.rollback()
+
+    def _close_writer(self):
+        if self._write_db is not None:
+            self._write_db.close()
+            self._write_db = None
+
+    def _count_hit(self, coords):
+        self.counters["hits"] += 1
+        if coords is None:
+            self.counters["negative_hits"] += 1
+
+    def _remember(self, key: str, coords, expires: float):
+        self._entries[key] = (coords, expires)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
@@ -1,66 +1,71 @@
 import asyncio
 import json
-from websockets import serve
+import logging
+import os
 
-class McpServer:
-    def __init__(self):
-        self.tools: dict[str, dict] = {}
-        self.pending_requests: dict = {}
+from ip_geo import UNKNOWN, IpGeo
+from mcp_core import McpServer
+from mcp_logging import setup_logging
+from mcp_metrics import metrics
+from mcp_schema import InvalidParams
 
-    def tool(self, name: str, description: str, input_schema: dict, callback):
-        self.tools[name] = {
-            "description": description,
-            "input_schema": input_schema,
-            "callback": callback,
-        }
+logger = logging.getLogger(__name__)
 
-    async def handle_connection(self, websocket):
-        print(f"New connection from {websocket.remote_address}")
-        async for message in websocket:
-            try:
-                print(f"Received: {message}")
-                data = json.loads(message)
-                request_id = data.get("id")
-                method = data.get("method")
-                params = data.get("params", {})
+# Compiled range database (`python ip_geo.py compile ranges.csv ipgeo.bin`).
+# Replacing the file on disk is picked up without a restart.
+IPGEO_DB = os.environ.get("MCP_IPGEO_DB")
+ip_db = IpGeo(IPGEO_DB) if IPGEO_DB else None
+if ip_db is not None:
+    metrics.add_collector("ipgeo", ip_db.stats)
 
-                if method in self.tools:
-                    result = await self.tools[method]["callback"](params)
-                    response = {
-                        "jsonrpc": "2.0",
-                        "id": request_id,
-                        "result": {"content": [{"text": result}]},
-                    }
-                else:
-                    response = {
-                        "jsonrpc": "2.0",
-                        "id": request_id,
-                        "error": {"code": -32601, "message": f"Method '{method}' not found"},
-                    }
-                print(f"Sending: {json.dumps(response)}")
-                await websocket.send(json.dumps(response))
-            except Exception as e:
-                print(f"Error handling request: {e}")
+MAX_BATCH_IPS = 1000
+
+# Fixed answers consulted before the database.
+STATIC_LOCATIONS = {
+    "127.0.0.1": {"latitude": 37.7749, "longitude": -122.4194, "city": "San Francisco"}
+}
+
+def locate(ips: list[str]) -> list[dict]:
+    found = ip_db.lookup_many(ips) if ip_db is not None else [None] * len(ips)
+    return [STATIC_LOCATIONS.get(ip) or loc or UNKNOWN for ip, loc in zip(ips, found)]
 
 async def get_location(params):
     ip = params.get("ip", "127.0.0.1")
-    mapping = {
-        "127.0.0.1": {"latitude": 37.7749, "longitude": -122.4194, "city": "San Francisco"}
-    }
-    loc = mapping.get(ip, {"latitude": 0.0, "longitude": 0.0, "city": "Unknown"})
-    return json.dumps(loc)
+    return json.dumps(locate([ip])[0])
 
-async def main():
-    server = McpServer()
+async def get_locations(params):
+    ips = params.get("ips", [])
+    if isinstance(ips, str):
+        ips = [ip for ip in ips.replace(",", " ").split() if ip]
+    if not all(isinstance(ip, str) for ip in ips):
+        raise InvalidParams("'ips' must be a list of strings")
+    if len(ips) > MAX_BATCH_IPS:
+        return f"Too many addresses (at most {MAX_BATCH_IPS})."
+    return json.dumps(dict(zip(ips, locate(ips))))
+
+PORT = 8085
+
+def register(server: McpServer):
     server.tool(
         name="get-location",
         description="Lookup approximate location for an IP address",
-        input_schema={"ip": {"type": "string", "description": "IPv4 address"}},
+        input_schema={"ip": {"type": "string", "description": "IPv4 or IPv6 address"}},
         callback=get_location,
     )
+    server.tool(
+        name="get-locations",
+        description="Lookup approximate locations for many IP addresses in one call",
+        input_schema={"ips": {"type": "array", "description": "IPv4/IPv6 addresses (at most 1000)"}},
+        callback=get_locations,
+    )
+
+async def main():
+    setup_logging()
+    server = McpServer()
+    register(server)
 
-    async with serve(server.handle_connection, "0.0.0.0", 8085):
-        print("Geolocation MCP running on ws://0.0.0.0:8085")
+    async with server.serve("0.0.0.0", PORT):
+        logger.info("Geolocation MCP running on ws://0.0.0.0:%d", PORT)
         await asyncio.Future()
 
 if __name__ == "__main__":
@@ -0,0 +1,226 @@
+import argparse
+import csv
+import heapq
+import ipaddress
+import os
+import time
+
+import numpy as np
+
+from array_store import open_arrays, write_arrays
+
+# IP-range geolocation over a compiled, memory-mapped range table.
+#
+# Source CSV rows look like either of:
+#   start_ip,end_ip,country,region,city,latitude,longitude
+#   network_cidr,country,region,city,latitude,longitude
+# IPv4 and IPv6 rows may be mixed; a header row is skipped automatically.
+
+UNKNOWN = {"latitude": 0.0, "longitude": 0.0, "city": "Unknown", "region": "", "country": ""}
+
+def _parse_row(row: list[str]):
+    first = row[0].strip()
+    if "/" in first:
+        network = ipaddress.ip_network(first, strict=False)
+        start, end, rest = network.network_address, network.broadcast_address, row[1:]
+    else:
+        start, end, rest = ipaddress.ip_address(first), ipaddress.ip_address(row[1].strip()), row[2:]
+    country, region, city, latitude, longitude = (rest + [""] * 5)[:5]
+    return start, end, (country.strip(), region.strip(), city.strip(), float(latitude or 0), float(longitude or 0))
+
+def _flatten(ranges: list[tuple[int, int, int]]) -> list[tuple[int, int, int]]:
+    """
+    Turn possibly overlapping (start, end, loc) ranges into sorted, disjoint
+    ones. Where ranges overlap the smallest wins, so a /24 inside a /8 keeps
+    its own location and the rest of the /8 keeps the outer one; between
+    equal sizes the later row wins.
+    """
+    points = sorted({p for start, end, _ in ranges for p in (start, end + 1)})
+    by_start = sorted(range(len(ranges)), key=lambda i: ranges[i][0])
+    active: list[tuple[int, int, int, int]] = []  # (size, -row, end, loc)
+    flat: list[tuple[int, int, int]] = []
+    next_range = 0
+    for point, following in zip(points, points[1:]):
+        while next_range < len(by_start) and ranges[by_start[next_range]][0] == point:
+            row = by_start[next_range]
+            start, end, loc = ranges[row]
+            heapq.heappush(active, (end - start, -row, end, loc))
+            next_range += 1
+        while active and active[0][2] < point:
+            heapq.heappop(active)
+        if not active:
+            continue
+        loc = active[0][3]
+        if flat and flat[-1][1] == point - 1 and flat[-1][2] == loc:
+            flat[-1] = (flat[-1][0], following - 1, loc)
+        else:
+            flat.append((point, following - 1, loc))
+    return flat
+
+def compile_ranges(csv_path: str, out_path: str) -> dict:
+    """
+    Compile a range CSV into a sorted, array-backed file for IpGeo.
+    Overlapping and nested ranges are flattened (the most specific wins),
+    so every address falls in at most one stored range. Identical
+    locations are stored once and referenced by index.
+    """
+    v4: list[tuple[int, int, int]] = []
+    v6: list[tuple[int, int, int]] = []
+    locations: dict[tuple, int] = {}
+    with open(csv_path, encoding="utf-8", newline="") as f:
+        for row in csv.reader(f):
+            if not row:
+                continue
+            try:
+                start, end, location = _parse_row(row)
+            except ValueError:
+                continue  # header or malformed line
+            if start > end:
+                continue
+            loc = locations.setdefault(location, len(locations))
+            (v4 if start.version == 4 else v6).append((int(start), int(end), loc))
+
+    v4 = _flatten(v4)
+    v6 = _flatten(v6)
+
+    ordered = sorted(locations, key=locations.get)
+    labels = [f"{city}\t{region}".encode("utf-8") for _, region, city, _, _ in ordered]
+    label_offsets = np.zeros(len(labels) + 1, dtype=np.int64)
+    label_offsets[1:] = np.cumsum([len(label) for label in labels])
+
+    write_arrays(out_path, {
+        "v4_start": np.array([r[0] for r in v4], dtype=np.uint32),
+        "v4_end": np.array([r[1] for r in v4], dtype=np.uint32),
+        "v4_loc": np.array([r[2] for r in v4], dtype=np.uint32),
+        # Big-endian 16-byte strings sort in numeric order.
+        "v6_start": np.array([r[0].to_bytes(16, "big") for r in v6], dtype="S16"),
+        "v6_end": np.array([r[1].to_bytes(16, "big") for r in v6], dtype="S16"),
+        "v6_loc": np.array([r[2] for r in v6], dtype=np.uint32),
+        "loc_latitude": np.array([loc[3] for loc in ordered], dtype=np.float32),
+        "loc_longitude": np.array([loc[4] for loc in ordered], dtype=np.float32),
+        "loc_country": np.array([loc[0] for loc in ordered], dtype="S2"),
+        "label_blob": np.frombuffer(b"".join(labels), dtype=np.uint8),
+        "label_offsets": label_offsets,
+    })
+    return {"ipv4_ranges": len(v4), "ipv6_ranges": len(v6), "locations": len(ordered)}
+
+class IpGeo:
+    """
+    O(log n) range lookups via np.searchsorted over the memory-mapped start
+    arrays. The file is re-opened when its mtime changes (checked at most
+    every 'reload_interval' seconds), so replacing it hot-swaps the data.
+    """
+
+    def __init__(self, path: str, reload_interval: float = 5.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._checked = 0.0
+        self._mtime = None
+        self.counters = {"lookups": 0, "hits": 0, "reloads": 0}
+        self._load()
+
+    def _load(self):
+        stat = os.stat(self.path)
+        arrays, _ = open_arrays(self.path)
+        # Swap a single attribute so concurrent readers see old or new, never a mix.
+        self._arrays = arrays
+        self._mtime = stat.st_mtime_ns
+
+    def maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked < self.reload_interval:
+            return
+        self._checked = now
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        if mtime != self._mtime:
+            self._load()
+            self.counters["reloads"] += 1
+
+    def _location(self, arrays: dict, loc: int) -> dict:
+        start, end = arrays["label_offsets"][loc], arrays["label_offsets"][loc + 1]
+        city, _, region = arrays["label_blob"][start:end].tobytes().decode("utf-8").partition("\t")
+        return {
+            "latitude": round(float(arrays["loc_latitude"][loc]), 4),
+            "longitude": round(float(arrays["loc_longitude"][loc]), 4),
+            "city": city or "Unknown",
+            "region": region,
+            "country": arrays["loc_country"][loc].decode(),
+        }
+
+    def lookup(self, ip: str) -> dict | None:
+        """Location for one address, or None when it is in no range (or invalid)."""
+        return self.lookup_many([ip])[0]
+
+    def lookup_many(self, ips: list[str]) -> list[dict | None]:
+        """
+        Vectorised lookup: all IPv4 addresses are resolved with one
+        searchsorted call, all IPv6 addresses with another.
+        """
+        self.maybe_reload()
+        arrays = self._arrays
+        results: list[dict | None] = [None] * len(ips)
+        v4_pos, v4_keys, v6_pos, v6_keys = [], [], [], []
+        for i, ip in enumerate(ips):
+            try:
+                address = ipaddress.ip_address(str(ip).strip())
+            except ValueError:
+                continue
+            if address.version == 6 and address.ipv4_mapped is not None:
+                address = address.ipv4_mapped
+            if address.version == 4:
+                v4_pos.append(i)
+                v4_keys.append(int(address))
+            else:
+                v6_pos.append(i)
+                v6_keys.append(address.packed)
+
+        for prefix, positions, keys, dtype in (
+            ("v4", v4_pos, v4_keys, np.uint32),
+            ("v6", v6_pos, v6_keys, "S16"),
+        ):
+            starts = arrays[f"{prefix}_start"]
+            if not positions or not len(starts):
+                continue
+            keys = np.array(keys, dtype=dtype)
+            idx = np.searchsorted(starts, keys, side="right") - 1
+            valid = idx >= 0
+            safe = np.where(valid, idx, 0)
+            hit = valid & (arrays[f"{prefix}_end"][safe] >= keys)
+            for pos, ok, i in zip(positions, hit, safe):
+                if ok:
+                    results[pos] = self._location(arrays, int(arrays[f"{prefix}_loc"][i]))
+
+        self.counters["lookups"] += len(ips)
+        self.counters["hits"] += sum(r is not None for r in results)
+        return results
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "ipv4_ranges": len(self._arrays["v4_start"]),
+            "ipv6_ranges": len(self._arrays["v6_start"]),
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile or query an IP-range geolocation database")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("compile", help="Compile a range CSV")
+    build.add_argument("csv")
+    build.add_argument("output")
+    lookup = sub.add_parser("lookup", help="Look up addresses in a compiled database")
+    lookup.add_argument("database")
+    lookup.add_argument("ips", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "compile":
+        print(compile_ranges(args.csv, args.output))
+    else:
+        db = IpGeo(args.database)
+        for ip, location in zip(args.ips, db.lookup_many(args.ips)):
+            print(ip, location)
+
+if __name__ == "__main__":
+    main()
@@ -1,47 +1,11 @@
 import asyncio
-import json
+import logging
 import random
-from websockets import serve
 
-class McpServer:
-    def __init__(self):
-        self.tools: dict[str, dict] = {}
-        self.pending_requests: dict = {}
+from mcp_core import McpServer
+from mcp_logging import setup_logging
 
-    def tool(self, name: str, description: str, input_schema: dict, callback):
-        self.tools[name] = {
-            "description": description,
-            "input_schema": input_schema,
-            "callback": callback,
-        }
-
-    async def handle_connection(self, websocket):
-        print(f"New connection from {websocket.remote_address}")
-        async for message in websocket:
-            try:
-                print(f"Received: {message}")
-                data = json.loads(message)
-                request_id = data.get("id")
-                method = data.get("method")
-                params = data.get("params", {})
-
-                if method in self.tools:
-                    result = await self.tools[method]["callback"](params)
-                    response = {
-                        "jsonrpc": "2.0",
-                        "id": request_id,
-                        "result": {"content": [{"text": result}]},
-                    }
-                else:
-                    response = {
-                        "jsonrpc": "2.0",
-                        "id": request_id,
-                        "error": {"code": -32601, "message": f"Method '{method}' not found"},
-                    }
-                print(f"Sending: {json.dumps(response)}")
-                await websocket.send(json.dumps(response))
-            except Exception as e:
-                print(f"Error handling request: {e}")
+logger = logging.getLogger(__name__)
 
 async def get_random_joke(params):
     jokes = [
@@ -52,8 +16,9 @@ async def get_random_joke(params):
     ]
     return random.choice(jokes)
 
-async def main():
-    server = McpServer()
+PORT = 8081
+
+def register(server: McpServer):
     server.tool(
         name="get-joke",
         description="Return a random programming joke",
@@ -61,8 +26,13 @@ async def main():
         callback=get_random_joke,
     )
 
-    async with serve(server.handle_connection, "0.0.0.0", 8081):
-        print("Jokes MCP running on ws://0.0.0.0:8081")
+async def main():
+    setup_logging()
+    server = McpServer()
+    register(server)
+
+    async with server.serve("0.0.0.0", PORT):
+        logger.info("Jokes MCP running on ws://0.0.0.0:%d", PORT)
         await asyncio.Future()
 
 if __name__ == "__main__":
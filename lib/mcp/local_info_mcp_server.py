@@ -1,71 +1,99 @@
 import asyncio
-import json
-from websockets import serve
+import logging
+import os
 
-class McpServer:
-    def __init__(self):
-        self.tools: dict[str, dict] = {}
-        self.pending_requests: dict = {}
+from gazetteer import Gazetteer
+from mcp_core import McpServer
+from mcp_logging import setup_logging
+from mcp_metrics import metrics
+from poi_index import PoiIndex
 
-    def tool(self, name: str, description: str, input_schema: dict, callback):
-        self.tools[name] = {
-            "description": description,
-            "input_schema": input_schema,
-            "callback": callback,
-        }
+logger = logging.getLogger(__name__)
 
-    async def handle_connection(self, websocket):
-        print(f"New connection from {websocket.remote_address}")
-        async for message in websocket:
-            try:
-                print(f"Received: {message}")
-                data = json.loads(message)
-                request_id = data.get("id")
-                method = data.get("method")
-                params = data.get("params", {})
+# Compiled POI store (`python poi_index.py compile pois.csv pois.bin`) and
+# the optional offline gazetteer used to turn city names into coordinates.
+POI_DB = os.environ.get("MCP_POI_DB")
+GAZETTEER_PATH = os.environ.get("MCP_GAZETTEER")
+poi_index = PoiIndex(POI_DB) if POI_DB else None
+gazetteer = Gazetteer(GAZETTEER_PATH) if GAZETTEER_PATH else None
+MAX_RESULTS = 50
 
-                if method in self.tools:
-                    result = await self.tools[method]["callback"](params)
-                    response = {
-                        "jsonrpc": "2.0",
-                        "id": request_id,
-                        "result": {"content": [{"text": result}]},
-                    }
-                else:
-                    response = {
-                        "jsonrpc": "2.0",
-                        "id": request_id,
-                        "error": {"code": -32601, "message": f"Method '{method}' not found"},
-                    }
-                print(f"Sending: {json.dumps(response)}")
-                await websocket.send(json.dumps(response))
-            except Exception as e:
-                print(f"Error handling request: {e}")
+def resolve_location(params) -> tuple[float, float] | None:
+    """
+    Coordinates from latitude/longitude params, a "lat,lon" location string,
+    or a city name looked up in the gazetteer.
+    """
+    if params.get("latitude") is not None and params.get("longitude") is not None:
+        return params["latitude"], params["longitude"]
+    location = str(params.get("location") or "").strip()
+    parts = location.split(",")
+    if len(parts) == 2:
+        try:
+            return float(parts[0]), float(parts[1])
+        except ValueError:
+            pass
+    if location and gazetteer is not None:
+        place = gazetteer.resolve(location)
+        if place is not None:
+            return place.latitude, place.longitude
+    return None
 
-async def find_nearby(params):
+def find_nearby(params):
     location = params.get("location", "your area")
     category = params.get("category", "points of interest")
-    suggestions = [
-        f"Sample {category} A near {location}",
-        f"Sample {category} B near {location}",
-    ]
-    return "\n".join(suggestions)
+    if poi_index is None:
+        suggestions = [
+            f"Sample {category} A near {location}",
+            f"Sample {category} B near {location}",
+        ]
+        return "\n".join(suggestions)
 
-async def main():
-    server = McpServer()
+    radius_km = params.get("radius_km", 5.0)
+    if radius_km < 0:
+        return "radius_km must not be negative."
+    limit = min(MAX_RESULTS, max(1, params.get("limit") or 5))
+    with metrics.span("resolve"):
+        coords = resolve_location(params)
+    if coords is None:
+        return f"Could not resolve location: {location}"
+    with metrics.span("search"):
+        results = poi_index.nearest(coords[0], coords[1], radius_km, limit, params.get("category"))
+    if not results:
+        return f"No {category} found within {radius_km:g} km of {location}."
+    return "\n".join(
+        f"{poi['name']} ({poi['category']}) – {poi['distance_km']:.2f} km" for poi in results
+    )
+
+PORT = 8084
+
+def register(server: McpServer):
     server.tool(
         name="find-nearby",
         description="Suggest nearby restaurants, cafés, or landmarks",
         input_schema={
             "location": {"type": "string", "description": "City or coordinates"},
             "category": {"type": "string", "description": "Type of place"},
+            "latitude": {"type": "number", "description": "Latitude (optional)"},
+            "longitude": {"type": "number", "description": "Longitude (optional)"},
+            "radius_km": {"type": "number", "description": "Search radius in km (default 5)"},
+            "limit": {"type": "integer", "description": "Maximum results, 1-50 (default 5)"},
         },
         callback=find_nearby,
+        # NumPy distance filtering runs in the thread pool, off the event loop.
+        mode="thread",
     )
 
-    async with serve(server.handle_connection, "0.0.0.0", 8084):
-        print("Local Info MCP running on ws://0.0.0.0:8084")
-        await asyncio.Future()
+async def main():
+    setup_logging()
+    server = McpServer()
+    register(server)
+
+    try:
+        async with server.serve("0.0.0.0", PORT):
+            logger.info("Local Info MCP running on ws://0.0.0.0:%d", PORT)
+            await asyncio.Future()
+    finally:
+        server.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,415 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import time
+
+import websockets
+
+# Load generator for the MCP WebSocket servers. Spawns the servers (or the
+# supervisor) against fake_open_meteo.py so runs are offline and repeatable,
+# drives a weighted tool mix at a target rate from many concurrent clients,
+# and writes throughput / latency / error / RSS results as JSON.
+#
+#   python lib/mcp/mcp_bench.py --connections 2000 --rate 3000 --duration 30 \
+#       --mix get-forecast=5,find-nearby=2,get-location=2,get-joke=1 --output bench.json
+#
+# With --idle it only opens the connections and holds them, reporting the
+# servers' memory per idle connection instead.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SERVERS = {
+    "weather": ("mcp_server.py", 8080),
+    "jokes": ("jokes_mcp_server.py", 8081),
+    "calendar": ("calendar_mcp_server.py", 8082),
+    "travel": ("travel_mcp_server.py", 8083),
+    "local_info": ("local_info_mcp_server.py", 8084),
+    "geolocation": ("geolocation_mcp_server.py", 8085),
+}
+
+TOOL_SERVER = {
+    "get-forecast": "weather",
+    "get-forecast-batch": "weather",
+    "get-forecast-analytics": "weather",
+    "get-joke": "jokes",
+    "schedule-meeting": "calendar",
+    "plan-trip": "travel",
+    "find-nearby": "local_info",
+    "get-location": "geolocation",
+}
+
+# Loopback clients per source address (127.0.0.x), below the ephemeral range.
+PORTS_PER_ADDRESS = 20000
+
+CITIES = ["Berlin", "Paris", "Rome", "Madrid", "London", "Vienna", "Prague", "Lisbon", "Tokyo", "Chicago"]
+
+def tool_params(tool: str, rng: random.Random) -> dict:
+    if tool == "get-forecast":
+        if rng.random() < 0.7:
+            return {"city": rng.choice(CITIES)}
+        return {"latitude": round(rng.uniform(-60, 70), 3), "longitude": round(rng.uniform(-180, 180), 3)}
+    if tool == "get-forecast-batch":
+        return {"cities": rng.sample(CITIES, rng.randrange(2, 5))}
+    if tool == "get-forecast-analytics":
+        return {"city": rng.choice(CITIES), "days": rng.choice([3, 7, 16])}
+    if tool == "find-nearby":
+        return {"location": rng.choice(CITIES), "category": rng.choice(["restaurant", "cafe", "museum"])}
+    if tool == "get-location":
+        return {"ip": f"{rng.randrange(1, 224)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}"}
+    if tool == "plan-trip":
+        start, destination = rng.sample(CITIES, 2)
+        return {"start": start, "destination": destination}
+    if tool == "schedule-meeting":
+        return {
+            "event": "sync",
+            "user": f"user{rng.randrange(1000)}",
+            "date": f"2025-01-{rng.randrange(1, 29):02d}",
+            "time": f"{rng.randrange(8, 18)}:{rng.choice(['00', '30'])}",
+        }
+    return {}
+
+def parse_mix(spec: str) -> dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        tool, _, weight = part.partition("=")
+        if tool not in TOOL_SERVER:
+            raise SystemExit(f"Unknown tool in --mix: {tool}")
+        mix[tool] = float(weight or 1)
+    return mix
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(q * len(sorted_values)))
+    return sorted_values[index]
+
+def rss_kb(pid: int) -> int | None:
+    """Resident set size of 'pid' plus all its descendants (Linux /proc only)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            rss = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(c) for c in f.read().split()]
+    except (OSError, StopIteration):
+        return None
+    return rss + sum(rss_kb(child) or 0 for child in children)
+
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=HERE, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def wait_for_port(host: str, port: int, timeout: float = 20.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise SystemExit(f"Server on {host}:{port} did not come up")
+
+class Client:
+    """One WebSocket connection with id-matched outstanding requests."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.waiting: dict[int, asyncio.Future] = {}
+        self.reader = asyncio.create_task(self._read())
+
+    async def _read(self):
+        try:
+            async for message in self.websocket:
+                response = json.loads(message)
+                future = self.waiting.pop(response.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        except websockets.ConnectionClosed:
+            pass
+        for future in self.waiting.values():
+            if not future.done():
+                future.set_exception(ConnectionError("connection closed"))
+
+    async def call(self, method: str, params: dict, timeout: float) -> dict:
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[request_id] = future
+        await self.websocket.send(json.dumps({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}))
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.waiting.pop(request_id, None)
+
+class Recorder:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+        self.recording = False
+
+    def record(self, tool: str, seconds: float, ok: bool):
+        if not self.recording:
+            return
+        self.latencies.setdefault(tool, []).append(seconds)
+        if not ok:
+            self.errors[tool] = self.errors.get(tool, 0) + 1
+
+    def summary(self, elapsed: float) -> dict:
+        def stats(values: list[float], errors: int) -> dict:
+            ordered = sorted(values)
+            return {
+                "requests": len(ordered),
+                "errors": errors,
+                "error_rate": round(errors / len(ordered), 5) if ordered else 0.0,
+                "throughput_rps": round(len(ordered) / elapsed, 1),
+                "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+                "p90_ms": round(percentile(ordered, 0.90) * 1000, 3),
+                "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+                "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+            }
+
+        every = [v for values in self.latencies.values() for v in values]
+        return {
+            "overall": stats(every, sum(self.errors.values())),
+            "tools": {tool: stats(values, self.errors.get(tool, 0)) for tool, values in self.latencies.items()},
+        }
+
+def local_address(host: str, n: int) -> tuple[str, int] | None:
+    # One source address has ~28k ephemeral ports; spread loopback clients
+    # over 127.0.0.x so tens of thousands of connections fit.
+    if host.startswith("127."):
+        return (f"127.0.0.{1 + n // PORTS_PER_ADDRESS}", 0)
+    return None
+
+async def open_clients(host: str, ports: dict[str, int], shares: dict[str, int]) -> dict[str, list[Client]]:
+    clients: dict[str, list[Client]] = {}
+    opened = 0
+    for server, count in shares.items():
+        url = f"ws://{host}:{ports[server]}"
+        sockets = []
+        # Open in modest waves so the accept backlog is not overrun.
+        for start in range(0, count, 200):
+            wave = []
+            for _ in range(min(200, count - start)):
+                wave.append(websockets.connect(
+                    url, max_size=None, ping_interval=None, local_addr=local_address(host, opened),
+                ))
+                opened += 1
+            sockets += await asyncio.gather(*wave)
+        clients[server] = [Client(ws) for ws in sockets]
+    return clients
+
+async def drive(args, clients: dict[str, list[Client]], mix: dict[str, float], recorder: Recorder, pids: list[int]) -> dict:
+    rng = random.Random(args.seed)
+    tools = list(mix)
+    weights = [mix[t] for t in tools]
+    tasks: set[asyncio.Task] = set()
+    peak_rss = 0
+
+    async def one(tool: str):
+        client = rng.choice(clients[TOOL_SERVER[tool]])
+        started = time.perf_counter()
+        try:
+            response = await client.call(tool, tool_params(tool, rng), args.timeout)
+            ok = "error" not in response
+        except Exception:
+            ok = False
+        recorder.record(tool, time.perf_counter() - started, ok)
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    measure_from = started + args.warmup
+    end = measure_from + args.duration
+    issued = 0.0
+    last_rss = 0.0
+    while (now := loop.time()) < end:
+        if not recorder.recording and now >= measure_from:
+            recorder.recording = True
+            measured_start = now
+        due = (now - started) * args.rate
+        while issued < due:
+            task = asyncio.create_task(one(rng.choices(tools, weights)[0]))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            issued += 1
+        if now - last_rss >= 1.0:
+            last_rss = now
+            peak_rss = max(peak_rss, sum(rss_kb(pid) or 0 for pid in pids))
+        await asyncio.sleep(0.005)
+    if tasks:
+        await asyncio.wait(tasks, timeout=args.timeout)
+    elapsed = loop.time() - measured_start
+    recorder.recording = False
+    result = recorder.summary(elapsed)
+    result["server_rss_kb"] = {
+        "end": sum(rss_kb(pid) or 0 for pid in pids) if pids else None,
+        "peak": peak_rss if pids else None,
+    }
+    return result
+
+async def hold_idle(args, clients: dict[str, list[Client]], pids: list[int], rss_before: int) -> dict:
+    """
+    Keep every connection open and silent for the run, then check a sample
+    still answers and report the servers' memory per connection.
+    """
+    await asyncio.sleep(args.duration)
+    rss_after = sum(rss_kb(pid) or 0 for pid in pids) if pids else None
+    every = list(itertools.chain.from_iterable(clients.values()))
+    sample = random.Random(args.seed).sample(every, min(100, len(every)))
+    answers = await asyncio.gather(
+        *(client.call("tools/list", {}, args.timeout) for client in sample), return_exceptions=True
+    )
+    alive = sum(1 for answer in answers if isinstance(answer, dict) and "result" in answer)
+    return {
+        "idle_connections": len(every),
+        "alive_sample": f"{alive}/{len(sample)}",
+        "server_rss_kb": {"before": rss_before if pids else None, "after": rss_after},
+        "bytes_per_connection": round((rss_after - rss_before) * 1024 / len(every)) if pids and every else None,
+    }
+
+def spawn_processes(args, servers: list[str]) -> list[subprocess.Popen]:
+    env = dict(
+        os.environ,
+        OPEN_METEO_GEOCODING_URL=f"http://127.0.0.1:{args.fake_port}/v1/search",
+        OPEN_METEO_FORECAST_URL=f"http://127.0.0.1:{args.fake_port}/v1/forecast",
+        MCP_LOG_LEVEL=os.environ.get("MCP_LOG_LEVEL", "WARNING"),
+    )
+    procs = [subprocess.Popen(
+        [sys.executable, os.path.join(HERE, "fake_open_meteo.py"), "--port", str(args.fake_port),
+         "--latency-ms", str(args.fake_latency_ms), "--jitter-ms", str(args.fake_jitter_ms)],
+        env=env, stdout=subprocess.DEVNULL,
+    )]
+    if args.workers:
+        cmd = [sys.executable, os.path.join(HERE, "mcp_supervisor.py"), "--workers", str(args.workers)]
+        for server in servers:
+            cmd += ["--module", SERVERS[server][0][:-3]]
+        procs.append(subprocess.Popen(cmd, env=env, cwd=HERE))
+    else:
+        for server in servers:
+            procs.append(subprocess.Popen([sys.executable, os.path.join(HERE, SERVERS[server][0])], env=env, cwd=HERE))
+    wait_for_port("127.0.0.1", args.fake_port)
+    for server in servers:
+        wait_for_port(args.host, SERVERS[server][1])
+    return procs
+
+def compare(previous: dict, current: dict):
+    """Print throughput and latency deltas against an earlier result file."""
+    print(f"\nCompared with {previous.get('git_revision') or 'previous run'}:")
+    if "overall" not in current["results"]:
+        old, new = previous["results"].get("bytes_per_connection"), current["results"]["bytes_per_connection"]
+        print(f"  bytes_per_connection {old} -> {new}")
+        return
+    rows = [("overall", previous["results"]["overall"], current["results"]["overall"])]
+    for tool, now in current["results"]["tools"].items():
+        if tool in previous["results"]["tools"]:
+            rows.append((tool, previous["results"]["tools"][tool], now))
+    for name, before, after in rows:
+        deltas = []
+        for key in ("throughput_rps", "p50_ms", "p99_ms", "error_rate"):
+            old, new = before[key], after[key]
+            change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+            deltas.append(f"{key} {old} -> {new} ({change})")
+        print(f"  {name:18} " + "; ".join(deltas))
+
+async def run(args):
+    mix = parse_mix(args.mix)
+    servers = sorted({TOOL_SERVER[tool] for tool in mix})
+    ports = {server: SERVERS[server][1] for server in servers}
+    if args.workers:
+        # The supervisor serves every loaded tool on every port; one is enough.
+        ports = {server: SERVERS[servers[0]][1] for server in servers}
+
+    procs = [] if args.no_spawn else spawn_processes(args, servers)
+    pids = [p.pid for p in procs[1:]]
+    try:
+        total_weight = sum(mix.values())
+        shares: dict[str, int] = {}
+        for tool, weight in mix.items():
+            server = TOOL_SERVER[tool]
+            shares[server] = shares.get(server, 0) + max(1, round(args.connections * weight / total_weight))
+        if args.idle:
+            await asyncio.sleep(1.0)  # let the servers finish starting up
+            rss_before = sum(rss_kb(pid) or 0 for pid in pids)
+        clients = await open_clients(args.host, ports, shares)
+        if args.idle:
+            results = await hold_idle(args, clients, pids, rss_before)
+        else:
+            recorder = Recorder()
+            results = await drive(args, clients, mix, recorder, pids)
+        for client in itertools.chain.from_iterable(clients.values()):
+            await client.websocket.close()
+    finally:
+        for proc in reversed(procs):
+            proc.terminate()
+        for proc in procs:
+            try:
+                proc.wait(10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    return {
+        "git_revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "connections": sum(shares.values()),
+            "rate": args.rate,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "mix": mix,
+            "workers": args.workers,
+            "idle": args.idle,
+            "fake_latency_ms": args.fake_latency_ms,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the MCP WebSocket servers")
+    parser.add_argument("--mix", default="get-forecast=5,find-nearby=2,get-location=2,get-joke=1",
+                        help="Weighted tool mix, e.g. get-forecast=5,get-joke=1")
+    parser.add_argument("--connections", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=1000.0, help="Target requests per second")
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Run the tools under mcp_supervisor.py with N workers instead of one process each")
+    parser.add_argument("--idle", action="store_true",
+                        help="Only hold --connections open for --duration and report memory per connection")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--no-spawn", action="store_true", help="Benchmark servers that are already running")
+    parser.add_argument("--fake-port", type=int, default=9100)
+    parser.add_argument("--fake-latency-ms", type=float, default=50.0)
+    parser.add_argument("--fake-jitter-ms", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Earlier --output file to diff against")
+    args = parser.parse_args()
+
+    raise_fd_limit()
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+if __name__ == "__main__":
+    main()
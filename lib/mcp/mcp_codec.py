@@ -0,0 +1,142 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_SUBPROTOCOL = "mcp.msgpack"
+JSON_SUBPROTOCOL = "mcp.json"
+
+if orjson is not None:
+    def json_dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+
+    def json_loads(data: str | bytes):
+        return orjson.loads(data)
+else:
+    def json_dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def json_loads(data: str | bytes):
+        return json.loads(data)
+
+class Preencoded:
+    """
+    A constant result (e.g. a discovery response) encoded at most once per
+    codec; the bytes are spliced into every response that carries it.
+    """
+
+    __slots__ = ("value", "_encoded")
+
+    def __init__(self, value):
+        self.value = value
+        self._encoded: dict[str, bytes] = {}
+
+    def encoded(self, codec) -> bytes:
+        data = self._encoded.get(codec.name)
+        if data is None:
+            data = self._encoded[codec.name] = codec.encode(self.value)
+        return data
+
+class JsonCodec:
+    """
+    JSON over text frames, using orjson when installed. Encoders return
+    UTF-8 bytes, which are sent as text frames without a str round-trip.
+    """
+
+    name = JSON_SUBPROTOCOL
+    binary = False
+
+    # Constant envelope fragments, encoded once.
+    _HEAD = b'{"jsonrpc":"2.0","id":'
+    _RESULT = b',"result":'
+    _ERROR = b',"error":'
+    _TAIL = b"}"
+
+    def decode(self, frame: str | bytes):
+        return json_loads(frame)
+
+    def encode(self, obj) -> bytes:
+        return json_dumps(obj)
+
+    def encode_response(self, response: dict) -> bytes:
+        if "result" in response:
+            result = response["result"]
+            if isinstance(result, Preencoded):
+                body = self._RESULT + result.encoded(self)
+            else:
+                body = self._RESULT + json_dumps(result)
+        else:
+            body = self._ERROR + json_dumps(response["error"])
+        return self._HEAD + json_dumps(response["id"]) + body + self._TAIL
+
+    def encode_batch(self, responses: list[dict]) -> bytes:
+        return b"[" + b",".join(self.encode_response(r) for r in responses) + b"]"
+
+class MsgpackCodec:
+    """
+    MessagePack over binary frames, for clients that negotiate the
+    'mcp.msgpack' WebSocket subprotocol.
+    """
+
+    name = MSGPACK_SUBPROTOCOL
+    binary = True
+
+    if msgpack is not None:
+        # Constant prefix of {"jsonrpc": "2.0", "id": ..., "result": ...}.
+        _HEAD = msgpack.Packer().pack_map_header(3) + msgpack.packb("jsonrpc") + msgpack.packb("2.0") + msgpack.packb("id")
+        _RESULT = msgpack.packb("result")
+
+    def decode(self, frame: str | bytes):
+        if isinstance(frame, str):
+            # Tolerate a JSON text frame on a msgpack connection.
+            return json_loads(frame)
+        return msgpack.unpackb(frame, raw=False)
+
+    def encode(self, obj) -> bytes:
+        return msgpack.packb(obj, use_bin_type=True)
+
+    def encode_response(self, response: dict) -> bytes:
+        result = response.get("result")
+        if isinstance(result, Preencoded):
+            # A msgpack map is its header followed by key/value encodings,
+            # so the cached result bytes can be appended as they are.
+            return (
+                self._HEAD
+                + self.encode(response["id"])
+                + self._RESULT
+                + result.encoded(self)
+            )
+        return self.encode(response)
+
+    def encode_batch(self, responses: list[dict]) -> bytes:
+        return msgpack.Packer().pack_array_header(len(responses)) + b"".join(
+            self.encode_response(r) for r in responses
+        )
+
+JSON_CODEC = JsonCodec()
+CODECS = {JSON_SUBPROTOCOL: JSON_CODEC}
+if msgpack is not None:
+    CODECS[MSGPACK_SUBPROTOCOL] = MsgpackCodec()
+
+# Preference order when a client offers several subprotocols.
+SUBPROTOCOLS = [MSGPACK_SUBPROTOCOL, JSON_SUBPROTOCOL] if msgpack is not None else [JSON_SUBPROTOCOL]
+
+def select_subprotocol(connection, offered):
+    """
+    websockets select_subprotocol hook: pick the best codec the client
+    offers, or continue without a subprotocol (plain JSON) if none match.
+    """
+    for name in SUBPROTOCOLS:
+        if name in offered:
+            return name
+    return None
+
+def codec_for(websocket):
+    return CODECS.get(getattr(websocket, "subprotocol", None), JSON_CODEC)
@@ -0,0 +1,595 @@
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from http import HTTPStatus
+from websockets import serve
+from websockets.protocol import State
+
+from mcp_codec import Preencoded, codec_for, select_subprotocol
+from mcp_executor import TOOL_MODES, ToolExecutor
+from mcp_logging import sample_payload, truncate
+from mcp_metrics import current_method, metrics
+from mcp_schema import InvalidParams, compile_schema, json_schema
+
+logger = logging.getLogger(__name__)
+
+# JSON-RPC server-defined error codes (-32000 to -32099).
+RATE_LIMITED = -32000
+REQUEST_TIMEOUT = -32001
+
+PROTOCOL_VERSION = "2024-11-05"
+SERVER_NAME = "mcp-llm-assistant"
+SERVER_VERSION = "1.0.0"
+
+# Defaults for every server; a tool may set its own timeout at registration
+# and a client may ask for a shorter one via params._meta.timeout_ms.
+# MCP_RATE_LIMIT is requests per second per connection (0 disables it).
+DEFAULT_TOOL_TIMEOUT = float(os.environ.get("MCP_TOOL_TIMEOUT", "30"))
+RATE_LIMIT = float(os.environ.get("MCP_RATE_LIMIT", "50"))
+RATE_BURST = int(os.environ.get("MCP_RATE_BURST", "100"))
+# Pool sizes for "thread" and "process" tools (0 = size to the CPU count).
+THREAD_WORKERS = int(os.environ.get("MCP_THREAD_WORKERS", "0")) or None
+PROCESS_WORKERS = int(os.environ.get("MCP_PROCESS_WORKERS", "0")) or None
+
+# Connection limits. MCP_MAX_CONNECTIONS caps open connections per process
+# (0 = no cap; extra handshakes get HTTP 503). MCP_IDLE_TIMEOUT closes
+# connections that sent nothing for that many seconds (0 = never).
+# Compression is off by default: per-connection zlib state dominates the
+# memory of an idle connection and MCP messages are small.
+MAX_CONNECTIONS = int(os.environ.get("MCP_MAX_CONNECTIONS", "0"))
+IDLE_TIMEOUT = float(os.environ.get("MCP_IDLE_TIMEOUT", "0"))
+WS_MAX_SIZE = int(os.environ.get("MCP_WS_MAX_SIZE", str(1 << 20)))
+WS_MAX_QUEUE = int(os.environ.get("MCP_WS_MAX_QUEUE", "4"))
+WS_WRITE_LIMIT = int(os.environ.get("MCP_WS_WRITE_LIMIT", str(16 << 10)))
+WS_PING_INTERVAL = float(os.environ.get("MCP_WS_PING_INTERVAL", "30")) or None
+WS_PING_TIMEOUT = float(os.environ.get("MCP_WS_PING_TIMEOUT", "30")) or None
+WS_COMPRESSION = os.environ.get("MCP_WS_COMPRESSION", "0") == "1"
+REJECT_RETRY_AFTER = 5
+
+# Event-loop time by which the running tool call must finish; the upstream
+# client shortens its own timeouts to fit.
+request_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+# The connection (websocket, codec) the running request arrived on, and the
+# progress reporter of a tool call whose client sent _meta.progressToken.
+current_connection = contextvars.ContextVar("current_connection", default=None)
+progress_reporter = contextvars.ContextVar("progress_reporter", default=None)
+
+def remaining_time() -> float | None:
+    """Seconds left before the current tool call's deadline, or None."""
+    deadline = request_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - asyncio.get_running_loop().time()
+
+async def report_progress(message: str | None = None, total: float | None = None):
+    """
+    Stream a partial result of the running tool call as an MCP
+    notifications/progress message. Does nothing unless the client asked
+    for progress. Only for async tools; pool workers have no connection.
+    """
+    reporter = progress_reporter.get()
+    if reporter is not None:
+        await reporter.send(message, total)
+
+class DeadlineExceeded(Exception):
+    """A tool call ran past its deadline and was cancelled."""
+
+class ProgressReporter:
+    """Sends the notifications/progress messages of one tool call."""
+
+    __slots__ = ("token", "websocket", "codec", "progress")
+
+    def __init__(self, token, websocket, codec):
+        self.token = token
+        self.websocket = websocket
+        self.codec = codec
+        self.progress = 0
+
+    async def send(self, message: str | None = None, total: float | None = None):
+        self.progress += 1
+        params = {"progressToken": self.token, "progress": self.progress}
+        if total is not None:
+            params["total"] = total
+        if message is not None:
+            params["message"] = message
+        payload = self.codec.encode({"jsonrpc": "2.0", "method": "notifications/progress", "params": params})
+        metrics.event("progress_notifications")
+        try:
+            await self.websocket.send(payload, text=not self.codec.binary)
+        except Exception as e:
+            logger.warning("Error sending progress notification: %s", e)
+
+class TokenBucket:
+    """Refills 'rate' tokens per second up to 'capacity'."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def take(self, count: int = 1) -> bool:
+        # A batch larger than the burst costs the whole burst rather than
+        # being refused forever.
+        count = min(count, self.capacity)
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= count:
+            self.tokens -= count
+            return True
+        return False
+
+    def retry_after(self, count: int = 1) -> float:
+        """Seconds until 'count' tokens will be available."""
+        return max(0.0, (min(count, self.capacity) - self.tokens) / self.rate)
+
+class Session:
+    """
+    Per-connection state, kept small so idle connections stay cheap: the
+    request tasks still running, the inbound rate limiter and the time of
+    the last message.
+    """
+
+    __slots__ = ("websocket", "codec", "bucket", "pending", "last_active", "resume")
+
+    def __init__(self, websocket, codec, bucket: TokenBucket | None):
+        self.websocket = websocket
+        self.codec = codec
+        self.bucket = bucket
+        self.pending: dict = {}
+        self.last_active = time.monotonic()
+        # Set while reading is paused at max_inflight.
+        self.resume: asyncio.Future | None = None
+
+class McpServer:
+    """
+    JSON-RPC over WebSocket dispatcher shared by every *_mcp_server.py.
+
+    Each request on a connection runs as its own task, so a slow tool call
+    does not hold up later requests; responses carry the request id and may
+    be sent out of order. At most 'max_inflight' requests run per connection
+    (reading pauses at the limit) and unfinished tasks are cancelled when
+    the client disconnects.
+
+    A message may also be a JSON-RPC batch (array of requests); its calls
+    run concurrently and one array of responses is sent back.
+
+    Frames are JSON by default; clients that negotiate the 'mcp.msgpack'
+    subprotocol exchange MessagePack over binary frames instead.
+
+    Built-in methods live in 'methods' and return a structured result;
+    'metrics' reports request/latency/connection instrumentation, which is
+    also served as Prometheus text on GET /metrics. The MCP discovery
+    methods 'initialize' and 'tools/list' are built once and served as
+    pre-encoded bytes; 'tools/call' runs a tool by name.
+
+    Each tool's input_schema is compiled at registration; arguments are
+    coerced to the declared types, and calls that do not fit are refused
+    with -32602 before the callback runs.
+
+    A tool registered with mode="thread" or mode="process" is a plain
+    function run in the server's thread or process pool, so CPU-heavy or
+    blocking work does not stall the event loop; pool queue depth is
+    reported under 'executors' in metrics.
+
+    A client that sends params._meta.progressToken with a tool call gets
+    notifications/progress messages carrying that token before the final
+    response; tools emit them with report_progress(), e.g. to stream the
+    first part of a long answer.
+
+    Tool calls are cancelled at their deadline (REQUEST_TIMEOUT), and each
+    connection draws from a token bucket; requests beyond it are answered
+    with RATE_LIMITED and a retry_after_ms hint instead of being run.
+
+    Each connection is a Session. Handshakes beyond 'max_connections' are
+    refused with HTTP 503, and a periodic sweep closes connections idle for
+    'idle_timeout' seconds. serve() applies the websockets buffer, message
+    size, keepalive and compression settings from the MCP_WS_* variables.
+    """
+
+    def __init__(
+        self,
+        max_inflight: int = 16,
+        max_batch_concurrency: int = 8,
+        default_timeout: float = DEFAULT_TOOL_TIMEOUT,
+        rate_limit: float = RATE_LIMIT,
+        rate_burst: int = RATE_BURST,
+        thread_workers: int | None = THREAD_WORKERS,
+        process_workers: int | None = PROCESS_WORKERS,
+        max_connections: int = MAX_CONNECTIONS,
+        idle_timeout: float = IDLE_TIMEOUT,
+    ):
+        self.tools: dict[str, dict] = {}
+        self.sessions: dict = {}  # websocket -> Session
+        # Connections admitted by process_request whose handshake has not yet
+        # reached handle_connection; they count against 'max_connections'.
+        self._admitted: set = set()
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self._sweeper: asyncio.Task | None = None
+        self.max_inflight = max_inflight
+        self.max_batch_concurrency = max_batch_concurrency
+        self.default_timeout = default_timeout
+        self.rate_limit = rate_limit
+        self.rate_burst = rate_burst
+        self.methods = {
+            "metrics": self.get_metrics,
+            "initialize": self.initialize,
+            "tools/list": self.list_tools,
+            "tools/call": self.call_tool_by_name,
+        }
+        self._discovery: dict[str, Preencoded] = {}
+        self.executors = {
+            "thread": ToolExecutor("thread", thread_workers),
+            "process": ToolExecutor("process", process_workers),
+        }
+        metrics.add_collector("executors", self.executor_stats)
+
+    def tool(
+        self,
+        name: str,
+        description: str,
+        input_schema: dict,
+        callback,
+        timeout: float | None = None,
+        mode: str = "async",
+    ):
+        if mode not in TOOL_MODES:
+            raise ValueError(f"Unknown mode {mode!r} for tool '{name}'")
+        if (mode == "async") != asyncio.iscoroutinefunction(callback):
+            raise ValueError(f"Tool '{name}': mode 'async' takes a coroutine function, other modes a plain one")
+        self.tools[name] = {
+            "description": description,
+            "input_schema": input_schema,
+            "validate": compile_schema(input_schema),
+            "callback": callback,
+            "timeout": timeout,
+            "mode": mode,
+        }
+        self._discovery.clear()
+
+    def serve(self, host: str, port: int, **kwargs):
+        """
+        websockets.serve() preconfigured for this server; use with
+        'async with' or await it for the listening Server object.
+        Keyword arguments override the MCP_WS_* connection settings.
+        """
+        options = {
+            "max_size": WS_MAX_SIZE,
+            "max_queue": WS_MAX_QUEUE,
+            "write_limit": WS_WRITE_LIMIT,
+            "ping_interval": WS_PING_INTERVAL,
+            "ping_timeout": WS_PING_TIMEOUT,
+            "compression": "deflate" if WS_COMPRESSION else None,
+            **kwargs,
+        }
+        return serve(
+            self.handle_connection,
+            host,
+            port,
+            select_subprotocol=select_subprotocol,
+            process_request=self.process_request,
+            process_response=self.process_response,
+            **options,
+        )
+
+    def process_request(self, connection, request):
+        """
+        Answer plain HTTP GET /metrics before the WebSocket handshake, and
+        turn away handshakes once the connection cap is reached.
+        """
+        if request.path == "/metrics":
+            return connection.respond(HTTPStatus.OK, metrics.prometheus())
+        if not self.max_connections:
+            return None
+        # Reserve the slot now: concurrent handshakes would otherwise all see
+        # the same session count and overshoot the cap. Reservations whose
+        # handshake died without a response (e.g. open_timeout) are dropped.
+        self._admitted = {c for c in self._admitted if c.protocol.state is not State.CLOSED}
+        if len(self.sessions) + len(self._admitted) >= self.max_connections:
+            metrics.event("connections_rejected")
+            response = connection.respond(HTTPStatus.SERVICE_UNAVAILABLE, "Too many connections\n")
+            response.headers["Retry-After"] = str(REJECT_RETRY_AFTER)
+            return response
+        self._admitted.add(connection)
+        return None
+
+    def process_response(self, connection, request, response):
+        """Release the reserved slot of a handshake that was refused."""
+        if response.status_code != HTTPStatus.SWITCHING_PROTOCOLS:
+            self._admitted.discard(connection)
+        return None
+
+    def inflight(self) -> int:
+        """Number of requests currently running across all connections."""
+        return sum(len(session.pending) for session in self.sessions.values())
+
+    async def handle_connection(self, websocket):
+        logger.debug("New connection from %s", websocket.remote_address)
+        bucket = TokenBucket(self.rate_limit, self.rate_burst) if self.rate_limit > 0 else None
+        session = Session(websocket, codec_for(websocket), bucket)
+        pending = session.pending
+        self._admitted.discard(websocket)
+        self.sessions[websocket] = session
+        if self.idle_timeout > 0 and self._sweeper is None:
+            self._sweeper = asyncio.create_task(self.sweep_idle())
+        metrics.connection_opened()
+
+        def _done(task):
+            pending.pop(id(task), None)
+            if session.resume is not None and len(pending) < self.max_inflight:
+                session.resume.set_result(None)
+                session.resume = None
+
+        try:
+            async for message in websocket:
+                session.last_active = time.monotonic()
+                if len(pending) >= self.max_inflight:
+                    session.resume = asyncio.get_running_loop().create_future()
+                    await session.resume
+                task = asyncio.create_task(self.handle_message(websocket, message, session.codec, bucket))
+                pending[id(task)] = task
+                task.add_done_callback(_done)
+        finally:
+            metrics.connection_closed()
+            del self.sessions[websocket]
+            for task in list(pending.values()):
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending.values(), return_exceptions=True)
+
+    async def sweep_idle(self):
+        """Close connections with no requests running and no message for idle_timeout."""
+        interval = min(60.0, max(1.0, self.idle_timeout / 4))
+        while True:
+            await asyncio.sleep(interval)
+            cutoff = time.monotonic() - self.idle_timeout
+            idle = [s for s in self.sessions.values() if not s.pending and s.last_active < cutoff]
+            if idle:
+                metrics.event("idle_evictions", len(idle))
+                logger.debug("Closing %d idle connections", len(idle))
+                await asyncio.gather(
+                    *(session.websocket.close(1001, "idle timeout") for session in idle),
+                    return_exceptions=True,
+                )
+
+    async def handle_message(self, websocket, message, codec, bucket: TokenBucket | None = None):
+        started = time.perf_counter()
+        current_connection.set((websocket, codec))
+        log_payload = sample_payload(logger)
+        if log_payload:
+            logger.debug("Received: %s", truncate(message))
+        try:
+            data = codec.decode(message)
+        except ValueError as e:
+            logger.warning("Error parsing request: %s", e)
+            response = self.error_response(None, -32700, "Parse error")
+        else:
+            cost = len(data) if isinstance(data, list) else 1
+            if data == []:
+                # Answered before the bucket: a rate-limit reply to an empty
+                # batch would be empty too, leaving the client waiting.
+                response = self.error_response(None, -32600, "Invalid Request")
+            elif bucket is not None and not bucket.take(cost):
+                response = self.rate_limited(data, bucket.retry_after(cost))
+            elif isinstance(data, list):
+                response = await self.dispatch_batch(data)
+            else:
+                response = await self.dispatch(data)
+        if response is None:
+            return
+        # Serialize once; the same bytes are logged and sent.
+        if isinstance(response, list):
+            payload = codec.encode_batch(response)
+        else:
+            payload = codec.encode_response(response)
+        if log_payload:
+            logger.debug("Sending (%.1f ms): %s", (time.perf_counter() - started) * 1000, truncate(payload))
+        try:
+            await websocket.send(payload, text=not codec.binary)
+        except Exception as e:
+            logger.warning("Error sending response: %s", e)
+
+    async def dispatch_batch(self, batch: list) -> list | dict | None:
+        """
+        Run a JSON-RPC batch concurrently, at most 'max_batch_concurrency' calls
+        at a time. Returns the list of responses (notifications contribute
+        none), or None when the batch held only notifications.
+        """
+        if not batch:
+            return self.error_response(None, -32600, "Invalid Request")
+        fan_out = asyncio.Semaphore(self.max_batch_concurrency)
+
+        async def run(item):
+            async with fan_out:
+                return await self.dispatch(item)
+
+        responses = await asyncio.gather(*(run(item) for item in batch))
+        responses = [r for r in responses if r is not None]
+        return responses or None
+
+    async def dispatch(self, data) -> dict | None:
+        """
+        Execute one JSON-RPC request object and build its response.
+        Returns None for notifications (requests without an "id" member).
+        """
+        if not isinstance(data, dict):
+            return self.error_response(None, -32600, "Invalid Request")
+        is_notification = "id" not in data
+        request_id = data.get("id")
+        method = data.get("method")
+        params = data.get("params", {})
+        try:
+            if method in self.tools:
+                result = await self.call_tool(method, params)
+                response = {
+                    "jsonrpc": "2.0",
+                    "id": request_id,
+                    "result": self.tool_result(result),
+                }
+            elif method in self.methods:
+                response = {
+                    "jsonrpc": "2.0",
+                    "id": request_id,
+                    "result": await self.call_method(method, params),
+                }
+            else:
+                response = self.error_response(request_id, -32601, f"Method '{method}' not found")
+        except asyncio.CancelledError:
+            raise
+        except InvalidParams as e:
+            response = self.error_response(request_id, -32602, f"Invalid params: {e}")
+        except DeadlineExceeded as e:
+            response = self.error_response(request_id, REQUEST_TIMEOUT, str(e))
+        except Exception as e:
+            logger.exception("Error handling %s request", method)
+            response = self.error_response(request_id, -32603, str(e))
+        return None if is_notification else response
+
+    async def call_method(self, method: str, params):
+        """
+        Run a built-in method (initialize, tools/list, metrics, ...) with the
+        same per-method request, error and latency accounting as tools.
+        tools/call is left to call_tool, which records it under the tool.
+        """
+        if method == "tools/call":
+            return await self.methods[method](params)
+        metrics.request_started(method)
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = await self.methods[method](params)
+            failed = False
+            return result
+        finally:
+            metrics.request_finished(method, time.perf_counter() - started, failed)
+
+    async def call_tool(self, name: str, params):
+        """
+        Run a tool callback under its deadline, recording its latency,
+        errors and in-flight count. The deadline is the tool's timeout (or
+        the server default), shortened by params._meta.timeout_ms if given.
+        Params are checked against the tool's schema first.
+        """
+        tool = self.tools[name]
+        timeout = tool["timeout"] if tool["timeout"] is not None else self.default_timeout
+        reporter = None
+        if isinstance(params, dict) and "_meta" in params:
+            meta = params["_meta"]
+            params = {k: v for k, v in params.items() if k != "_meta"}
+            if isinstance(meta, dict) and isinstance(meta.get("timeout_ms"), (int, float)):
+                timeout = min(timeout, max(0.0, meta["timeout_ms"] / 1000))
+            connection = current_connection.get()
+            if isinstance(meta, dict) and meta.get("progressToken") is not None and connection is not None:
+                reporter = ProgressReporter(meta["progressToken"], *connection)
+        try:
+            params = tool["validate"](params)
+        except InvalidParams:
+            metrics.event("invalid_params")
+            raise
+        deadline = asyncio.get_running_loop().time() + timeout
+        metrics.request_started(name)
+        token = current_method.set(name)
+        deadline_token = request_deadline.set(deadline)
+        reporter_token = progress_reporter.set(reporter)
+        started = time.perf_counter()
+        failed = True
+        try:
+            async with asyncio.timeout_at(deadline) as scope:
+                if tool["mode"] == "async":
+                    result = await tool["callback"](params)
+                else:
+                    result = await self.executors[tool["mode"]].run(tool["callback"], params)
+            failed = False
+            return result
+        except TimeoutError:
+            if not scope.expired():
+                raise
+            metrics.event("timeouts")
+            raise DeadlineExceeded(f"Tool '{name}' timed out after {timeout:g}s") from None
+        finally:
+            progress_reporter.reset(reporter_token)
+            request_deadline.reset(deadline_token)
+            current_method.reset(token)
+            metrics.request_finished(name, time.perf_counter() - started, failed)
+
+    def rate_limited(self, data, retry_after: float) -> list | dict | None:
+        """RATE_LIMITED errors for every request in 'data' that expects a reply."""
+        items = data if isinstance(data, list) else [data]
+        metrics.event("rate_limited", len(items))
+        hint = {"retry_after_ms": round(retry_after * 1000)}
+        errors = [
+            self.error_response(item.get("id"), RATE_LIMITED, "Rate limit exceeded", hint)
+            for item in items
+            if isinstance(item, dict) and "id" in item
+        ]
+        if isinstance(data, list):
+            return errors or None
+        return errors[0] if errors else None
+
+    async def get_metrics(self, params) -> dict:
+        return metrics.snapshot()
+
+    def executor_stats(self) -> dict:
+        return {kind: executor.stats() for kind, executor in self.executors.items()}
+
+    def close(self):
+        """Stop the idle sweep and shut down the tool pools; queued calls are dropped."""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+        for executor in self.executors.values():
+            executor.close()
+
+    def _discovery_result(self, method: str, build) -> Preencoded:
+        # Rebuilt only after a tool is (re-)registered.
+        result = self._discovery.get(method)
+        if result is None:
+            result = self._discovery[method] = Preencoded(build())
+        return result
+
+    async def initialize(self, params) -> Preencoded:
+        return self._discovery_result("initialize", lambda: {
+            "protocolVersion": PROTOCOL_VERSION,
+            "capabilities": {"tools": {"listChanged": False}},
+            "serverInfo": {"name": SERVER_NAME, "version": SERVER_VERSION},
+        })
+
+    async def list_tools(self, params) -> Preencoded:
+        return self._discovery_result("tools/list", lambda: {
+            "tools": [
+                {
+                    "name": name,
+                    "description": tool["description"],
+                    "inputSchema": json_schema(tool["input_schema"]),
+                }
+                for name, tool in self.tools.items()
+            ],
+        })
+
+    async def call_tool_by_name(self, params) -> dict:
+        """tools/call: {"name": tool, "arguments": {...}, "_meta": {...}}."""
+        name = params.get("name") if isinstance(params, dict) else None
+        if name not in self.tools:
+            raise InvalidParams(f"Unknown tool: {name}")
+        arguments = params.get("arguments") or {}
+        if "_meta" in params and isinstance(arguments, dict):
+            arguments = {**arguments, "_meta": params["_meta"]}
+        return self.tool_result(await self.call_tool(name, arguments))
+
+    @staticmethod
+    def tool_result(text: str) -> dict:
+        return {"content": [{"type": "text", "text": text}]}
+
+    @staticmethod
+    def error_response(request_id, code: int, message: str, data=None) -> dict:
+        error = {"code": code, "message": message}
+        if data is not None:
+            error["data"] = data
+        return {"jsonrpc": "2.0", "id": request_id, "error": error}
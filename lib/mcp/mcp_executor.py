@@ -0,0 +1,118 @@
+import asyncio
+import contextvars
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from mcp_metrics import captured_phases, metrics
+
+logger = logging.getLogger(__name__)
+
+# How a tool callback runs: "async" coroutines are awaited on the event
+# loop; "thread" and "process" callbacks are plain functions run in a pool.
+TOOL_MODES = ("async", "thread", "process")
+
+def _run_in_worker(callback, params):
+    # Process-pool entry point: the worker's metrics are never read, so the
+    # callback's phase spans travel back with its result.
+    phases = []
+    token = captured_phases.set(phases)
+    try:
+        return callback(params), phases
+    finally:
+        captured_phases.reset(token)
+
+class ToolExecutor:
+    """
+    A lazily started pool for tool callbacks that would otherwise block the
+    event loop. Calls are queued FIFO, so 'queued' is whatever is in flight
+    beyond the worker count.
+
+    Cancelling a call that is still queued removes it from the pool; a call
+    that is already running finishes in the background and its result is
+    dropped. Exceptions raised by the callback are re-raised to the caller.
+    Thread calls see the caller's context variables (e.g. the current
+    method for metrics spans). Process calls pickle the callback by
+    reference and 'params' by value, so the callback must be a module-level
+    function whose module loads its own state on import; the metrics spans
+    it records are sent back and recorded in the calling process.
+    """
+
+    def __init__(self, kind: str, max_workers: int | None = None):
+        if kind == "thread":
+            self.workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        elif kind == "process":
+            self.workers = max_workers or os.cpu_count() or 1
+        else:
+            raise ValueError(f"Unknown executor kind {kind!r}")
+        self.kind = kind
+        self.inflight = 0
+        self._pool = None
+        self.counters = {
+            "submitted": 0,
+            "completed": 0,
+            "errors": 0,
+            "cancelled": 0,
+            "restarts": 0,
+        }
+
+    def pool(self):
+        if self._pool is None:
+            if self.kind == "thread":
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="mcp-tool")
+            else:
+                # Spawn, not fork: the server process already runs threads
+                # (logging, thread pool) that a fork would copy mid-flight.
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    async def run(self, callback, params):
+        loop = asyncio.get_running_loop()
+        self.counters["submitted"] += 1
+        self.inflight += 1
+        try:
+            if self.kind == "thread":
+                future = loop.run_in_executor(self.pool(), contextvars.copy_context().run, callback, params)
+                result = await future
+            else:
+                future = loop.run_in_executor(self.pool(), _run_in_worker, callback, params)
+                result, phases = await future
+                for phase, seconds in phases:
+                    metrics.observe_phase(phase, seconds)
+            self.counters["completed"] += 1
+            return result
+        except asyncio.CancelledError:
+            self.counters["cancelled"] += 1
+            raise
+        except BrokenProcessPool:
+            # A worker died (e.g. killed by the OOM killer); start a fresh
+            # pool for the next call.
+            logger.warning("Process pool broken; restarting it")
+            self.counters["errors"] += 1
+            self.counters["restarts"] += 1
+            self._shutdown()
+            raise
+        except Exception:
+            self.counters["errors"] += 1
+            raise
+        finally:
+            self.inflight -= 1
+
+    def _shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "workers": self.workers,
+            "inflight": self.inflight,
+            "running": min(self.inflight, self.workers),
+            "queued": max(0, self.inflight - self.workers),
+        }
+
+    def close(self):
+        self._shutdown()
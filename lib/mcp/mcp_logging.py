@@ -0,0 +1,56 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+
+# Environment knobs:
+#   MCP_LOG_LEVEL          DEBUG / INFO / WARNING ... (default INFO)
+#   MCP_LOG_PAYLOADS       "1" to log request/response bodies at DEBUG (off by default)
+#   MCP_LOG_PAYLOAD_LIMIT  max characters of a body to log (default 512)
+#   MCP_LOG_SAMPLE_RATE    fraction of requests whose bodies are logged (default 1.0)
+LOG_LEVEL = os.environ.get("MCP_LOG_LEVEL", "INFO").upper()
+LOG_PAYLOADS = os.environ.get("MCP_LOG_PAYLOADS", "").lower() in ("1", "true", "yes")
+PAYLOAD_LIMIT = int(os.environ.get("MCP_LOG_PAYLOAD_LIMIT", "512"))
+SAMPLE_RATE = float(os.environ.get("MCP_LOG_SAMPLE_RATE", "1.0"))
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(process)d %(name)s: %(message)s"
+
+_listener: logging.handlers.QueueListener | None = None
+
+def setup_logging(level: str | None = None):
+    """
+    Route all log records through a queue to a background thread, so the
+    event loop never blocks on a slow stdout/stderr pipe. Safe to call twice.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    records = queue.SimpleQueue()
+    stream = logging.StreamHandler()
+    stream.setFormatter(logging.Formatter(LOG_FORMAT))
+    _listener = logging.handlers.QueueListener(records, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger()
+    root.handlers[:] = [logging.handlers.QueueHandler(records)]
+    root.setLevel(level or LOG_LEVEL)
+    # websockets logs every handshake and frame; keep it to problems only.
+    logging.getLogger("websockets").setLevel(logging.WARNING)
+
+def sample_payload(logger: logging.Logger) -> bool:
+    """
+    Decide once per request whether its bodies are logged.
+    """
+    if not LOG_PAYLOADS or not logger.isEnabledFor(logging.DEBUG):
+        return False
+    return SAMPLE_RATE >= 1.0 or random.random() < SAMPLE_RATE
+
+def truncate(payload: str | bytes, limit: int = PAYLOAD_LIMIT) -> str:
+    if isinstance(payload, bytes):
+        payload = payload.decode("utf-8", errors="replace")
+    if len(payload) <= limit:
+        return payload
+    return f"{payload[:limit]}... ({len(payload)} chars)"
@@ -0,0 +1,224 @@
+import contextvars
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets.
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+# Collector groups keyed by a runtime value (e.g. a hostname). In the
+# Prometheus output their keys become a label instead of part of the name.
+LABELLED_GROUPS = {"breakers": "host"}
+
+# Name of the tool whose callback is running; used to label phase spans.
+current_method = contextvars.ContextVar("current_method", default=None)
+# Set while a process-pool worker runs a tool: spans are collected here as
+# (phase, seconds) and returned with the result, for the parent to record.
+captured_phases = contextvars.ContextVar("captured_phases", default=None)
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram with bucket-interpolated quantiles.
+    """
+
+    __slots__ = ("counts", "total", "sum")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += 1
+        self.sum += seconds
+
+    def quantile(self, q: float) -> float:
+        if not self.total:
+            return 0.0
+        rank = q * self.total
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = LATENCY_BUCKETS[i - 1] if i > 0 else 0.0
+                upper = LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else LATENCY_BUCKETS[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return LATENCY_BUCKETS[-1]
+
+    def summary(self) -> dict:
+        return {
+            "count": self.total,
+            "mean_ms": round(self.sum / self.total * 1000, 3) if self.total else 0.0,
+            "p50_ms": round(self.quantile(0.50) * 1000, 3),
+            "p95_ms": round(self.quantile(0.95) * 1000, 3),
+            "p99_ms": round(self.quantile(0.99) * 1000, 3),
+        }
+
+class Metrics:
+    """
+    Process-wide request, connection, upstream and phase instrumentation.
+    Exposed as JSON via the built-in 'metrics' method and as Prometheus
+    text via GET /metrics on every server port.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.requests: dict[str, int] = {}
+        self.errors: dict[str, int] = {}
+        self.latency: dict[str, Histogram] = {}
+        self.inflight: dict[str, int] = {}
+        self.open_connections = 0
+        self.total_connections = 0
+        self.upstream: dict[str, Histogram] = {}
+        self.upstream_status: dict[tuple[str, str], int] = {}
+        self.phases: dict[tuple[str, str], Histogram] = {}
+        self.events: dict[str, int] = {}
+        self.collectors: dict = {}
+
+    def add_collector(self, name: str, collect):
+        """Include 'collect()' (a dict of numbers) in every snapshot, e.g. cache stats."""
+        self.collectors[name] = collect
+
+    def request_started(self, method: str):
+        self.requests[method] = self.requests.get(method, 0) + 1
+        self.inflight[method] = self.inflight.get(method, 0) + 1
+
+    def request_finished(self, method: str, seconds: float, error: bool = False):
+        self.inflight[method] -= 1
+        histogram = self.latency.get(method)
+        if histogram is None:
+            histogram = self.latency[method] = Histogram()
+        histogram.observe(seconds)
+        if error:
+            self.errors[method] = self.errors.get(method, 0) + 1
+
+    def event(self, name: str, count: int = 1):
+        """Count an occurrence such as a rate-limited or timed-out request."""
+        self.events[name] = self.events.get(name, 0) + count
+
+    def connection_opened(self):
+        self.open_connections += 1
+        self.total_connections += 1
+
+    def connection_closed(self):
+        self.open_connections -= 1
+
+    def observe_upstream(self, host: str, seconds: float, status: int | str):
+        histogram = self.upstream.get(host)
+        if histogram is None:
+            histogram = self.upstream[host] = Histogram()
+        histogram.observe(seconds)
+        key = (host, str(status))
+        self.upstream_status[key] = self.upstream_status.get(key, 0) + 1
+
+    @contextmanager
+    def span(self, phase: str):
+        """Time a phase of the running tool callback, e.g. 'geocode'."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_phase(phase, time.perf_counter() - started)
+
+    def observe_phase(self, phase: str, seconds: float):
+        """Record a phase timed elsewhere, e.g. in a process-pool worker."""
+        captured = captured_phases.get()
+        if captured is not None:
+            captured.append((phase, seconds))
+            return
+        key = (current_method.get() or "-", phase)
+        histogram = self.phases.get(key)
+        if histogram is None:
+            histogram = self.phases[key] = Histogram()
+        histogram.observe(seconds)
+
+    def snapshot(self) -> dict:
+        return {
+            "uptime_s": round(time.time() - self.started, 1),
+            "connections": {"open": self.open_connections, "total": self.total_connections},
+            "methods": {
+                method: {
+                    "requests": count,
+                    "errors": self.errors.get(method, 0),
+                    "inflight": self.inflight.get(method, 0),
+                    "latency": self.latency[method].summary() if method in self.latency else None,
+                }
+                for method, count in self.requests.items()
+            },
+            "events": dict(self.events),
+            "phases": {f"{method}.{phase}": h.summary() for (method, phase), h in self.phases.items()},
+            "upstream": {
+                host: {
+                    "latency": h.summary(),
+                    "status": {s: n for (hst, s), n in self.upstream_status.items() if hst == host},
+                }
+                for host, h in self.upstream.items()
+            },
+            **{name: collect() for name, collect in self.collectors.items()},
+        }
+
+    def prometheus(self) -> str:
+        """Render the Prometheus text exposition format."""
+        lines = [
+            "# TYPE mcp_open_connections gauge",
+            f"mcp_open_connections {self.open_connections}",
+            "# TYPE mcp_connections_total counter",
+            f"mcp_connections_total {self.total_connections}",
+            "# TYPE mcp_requests_total counter",
+        ]
+        lines += [f'mcp_requests_total{{method="{m}"}} {n}' for m, n in self.requests.items()]
+        lines.append("# TYPE mcp_request_errors_total counter")
+        lines += [f'mcp_request_errors_total{{method="{m}"}} {n}' for m, n in self.errors.items()]
+        lines.append("# TYPE mcp_events_total counter")
+        lines += [f'mcp_events_total{{event="{e}"}} {n}' for e, n in self.events.items()]
+        lines.append("# TYPE mcp_inflight_requests gauge")
+        lines += [f'mcp_inflight_requests{{method="{m}"}} {n}' for m, n in self.inflight.items()]
+        self._histogram_lines(lines, "mcp_request_duration_seconds",
+                              {f'method="{m}"': h for m, h in self.latency.items()})
+        self._histogram_lines(lines, "mcp_phase_duration_seconds",
+                              {f'method="{m}",phase="{p}"': h for (m, p), h in self.phases.items()})
+        self._histogram_lines(lines, "mcp_upstream_duration_seconds",
+                              {f'host="{host}"': h for host, h in self.upstream.items()})
+        lines.append("# TYPE mcp_upstream_responses_total counter")
+        lines += [
+            f'mcp_upstream_responses_total{{host="{host}",status="{status}"}} {n}'
+            for (host, status), n in self.upstream_status.items()
+        ]
+        for name, collect in self.collectors.items():
+            self._flatten_lines(lines, f"mcp_{name}", collect())
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _histogram_lines(lines: list, name: str, histograms: dict):
+        lines.append(f"# TYPE {name} histogram")
+        for labels, h in histograms.items():
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, h.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {h.total}')
+            lines.append(f"{name}_sum{{{labels}}} {h.sum}")
+            lines.append(f"{name}_count{{{labels}}} {h.total}")
+
+    @classmethod
+    def _flatten_lines(cls, lines: list, prefix: str, values: dict, labels: str = ""):
+        for key, value in values.items():
+            name = f"{prefix}_{key}".replace("-", "_").replace(".", "_").replace("/", "_")
+            if key in LABELLED_GROUPS and isinstance(value, dict):
+                # {"breakers": {"api.open-meteo.com": {...}}} -> one series
+                # per host, e.g. mcp_upstream_pool_breakers_open{host="..."}.
+                label = LABELLED_GROUPS[key]
+                for member, stats in value.items():
+                    escaped = str(member).replace("\\", "\\\\").replace('"', '\\"')
+                    member_labels = f'{labels},{label}="{escaped}"' if labels else f'{label}="{escaped}"'
+                    cls._flatten_lines(lines, name, stats, member_labels)
+            elif isinstance(value, dict):
+                cls._flatten_lines(lines, name, value, labels)
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+
+# Shared by the dispatcher, the upstream client and tool callbacks.
+metrics = Metrics()
@@ -0,0 +1,124 @@
+import math
+
+class InvalidParams(ValueError):
+    """Tool arguments that do not match the tool's input schema."""
+
+_TRUE = {"true", "1", "yes", "on"}
+_FALSE = {"false", "0", "no", "off"}
+
+def _string(name, value):
+    if type(value) is str:
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise InvalidParams(f"'{name}' must be a string")
+
+def _number(name, value):
+    if type(value) is float:
+        number = value
+    elif isinstance(value, int) and not isinstance(value, bool):
+        number = float(value)
+    elif isinstance(value, str):
+        try:
+            number = float(value)
+        except ValueError:
+            raise InvalidParams(f"'{name}' must be a number") from None
+    else:
+        raise InvalidParams(f"'{name}' must be a number")
+    if not math.isfinite(number):
+        raise InvalidParams(f"'{name}' must be a finite number")
+    return number
+
+def _integer(name, value):
+    if type(value) is int:
+        return value
+    if type(value) is float and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    raise InvalidParams(f"'{name}' must be an integer")
+
+def _boolean(name, value):
+    if type(value) is bool:
+        return value
+    if type(value) is int and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.lower() in _TRUE | _FALSE:
+        return value.lower() in _TRUE
+    raise InvalidParams(f"'{name}' must be a boolean")
+
+def _array(name, value):
+    if type(value) is list:
+        return value
+    if isinstance(value, tuple):
+        return list(value)
+    # Several tools also document a delimited string form and split it
+    # themselves, each with its own separators.
+    if isinstance(value, str):
+        return value
+    raise InvalidParams(f"'{name}' must be an array")
+
+def _object(name, value):
+    if isinstance(value, dict):
+        return value
+    raise InvalidParams(f"'{name}' must be an object")
+
+COERCERS = {
+    "string": _string,
+    "number": _number,
+    "integer": _integer,
+    "boolean": _boolean,
+    "array": _array,
+    "object": _object,
+}
+
+def compile_schema(properties: dict):
+    """
+    Turn a tool's input schema ({name: {"type": ..., "description": ...}},
+    with an optional "required": True per property) into a function that
+    validates a params object and returns a copy with values coerced to
+    their declared types. Nulls count as absent and unknown names are
+    passed through untouched. Raises InvalidParams on the first bad value.
+    """
+    coercers = {}
+    for name, spec in properties.items():
+        kind = spec.get("type")
+        if kind not in COERCERS:
+            raise ValueError(f"Unsupported type {kind!r} for parameter '{name}'")
+        coercers[name] = COERCERS[kind]
+    required = [name for name, spec in properties.items() if spec.get("required")]
+
+    def validate(params) -> dict:
+        if params is None:
+            params = {}
+        elif not isinstance(params, dict):
+            raise InvalidParams("params must be an object")
+        result = {}
+        for name, value in params.items():
+            if value is None:
+                continue
+            coerce = coercers.get(name)
+            result[name] = coerce(name, value) if coerce is not None else value
+        for name in required:
+            if name not in result:
+                raise InvalidParams(f"'{name}' is required")
+        return result
+
+    return validate
+
+def json_schema(properties: dict) -> dict:
+    """The JSON Schema object advertised for a tool in tools/list."""
+    schema = {
+        "type": "object",
+        "properties": {
+            name: {k: v for k, v in spec.items() if k != "required"}
+            for name, spec in properties.items()
+        },
+    }
+    required = [name for name, spec in properties.items() if spec.get("required")]
+    if required:
+        schema["required"] = required
+    return schema
@@ -1,80 +1,79 @@
 import asyncio
+import functools
 import json
-import aiohttp
-from websockets import serve
+import logging
+import os
 
-# Base URLs for Open‑Meteo services
-GEOCODING_API = "https://geocoding-api.open-meteo.com/v1/search"
-FORECAST_API = "https://api.open-meteo.com/v1/forecast"
+from forecast_analytics import (
+    MAX_DAYS, SECTIONS, daily_trend, fields_for, outdoor_windows, rain_windows, to_columns,
+)
+from forecast_batcher import ForecastBatcher
+from forecast_cache import ForecastCache
+from gazetteer import Gazetteer
+from geocache import MISSING, GeocodeCache
+from mcp_core import McpServer, report_progress
+from mcp_logging import setup_logging
+from mcp_metrics import metrics
+from upstream import UpstreamClient
 
-USER_AGENT = "weather-app/1.0 (Python)"
+logger = logging.getLogger(__name__)
+
+# Base URLs for Open‑Meteo services (overridable, e.g. to point the
+# benchmark at fake_open_meteo.py)
+GEOCODING_API = os.environ.get("OPEN_METEO_GEOCODING_URL", "https://geocoding-api.open-meteo.com/v1/search")
+FORECAST_API = os.environ.get("OPEN_METEO_FORECAST_URL", "https://api.open-meteo.com/v1/forecast")
+
+# One pooled client per process; connections to Open‑Meteo are kept alive
+# between tool calls instead of being re-established for every request.
+http_client = UpstreamClient()
+
+# Geocoding results rarely change, so repeat cities are served from memory
+# (and optionally from SQLite across restarts) instead of the geocoding API.
+GEOCODE_CACHE_DB = os.environ.get("MCP_GEOCODE_DB")
+GEOCODE_SEED_FILE = os.environ.get("MCP_GEOCODE_SEED")
+KNOWN_CITIES = {
+    "new york": (40.7128, -74.0060),
+    "los angeles": (34.0522, -118.2437),
+    "chicago": (41.8781, -87.6298),
+    "houston": (29.7604, -95.3698),
+}
+geocode_cache = GeocodeCache(db_path=GEOCODE_CACHE_DB)
+geocode_cache.seed(KNOWN_CITIES)
+
+# Optional offline gazetteer (compiled with `python gazetteer.py compile`).
+# When present it resolves most cities locally; Open‑Meteo is the fallback.
+GAZETTEER_PATH = os.environ.get("MCP_GAZETTEER")
+gazetteer = Gazetteer(GAZETTEER_PATH) if GAZETTEER_PATH else None
+
+# Open‑Meteo models refresh roughly hourly, so forecasts for nearby points
+# are shared for FORECAST_TTL seconds and refreshed in the background after.
+FORECAST_GRID = float(os.environ.get("MCP_FORECAST_GRID", "0.01"))
+FORECAST_TTL = float(os.environ.get("MCP_FORECAST_TTL", "900"))
+forecast_cache = ForecastCache(grid=FORECAST_GRID, ttl=FORECAST_TTL)
+
+# Forecast misses arriving within the batching window (from any client) are
+# merged into one multi-coordinate Open‑Meteo request of up to
+# FORECAST_BATCH_MAX points.
+FORECAST_BATCH_WINDOW = float(os.environ.get("MCP_FORECAST_BATCH_WINDOW_MS", "5")) / 1000
+FORECAST_BATCH_MAX = int(os.environ.get("MCP_FORECAST_BATCH_MAX", "50"))
+MAX_BATCH_CITIES = 50
+
+# Appended when Open‑Meteo is unreachable and an expired cache entry is used.
+STALE_NOTE = "(Cached forecast: Open‑Meteo is currently unavailable.)"
+UNEXPECTED_FORMAT = "Unexpected response format from Open-Meteo."
+
+metrics.add_collector("upstream_pool", http_client.stats)
+metrics.add_collector("geocode_cache", geocode_cache.stats)
+metrics.add_collector("forecast_cache", forecast_cache.stats)
+if gazetteer is not None:
+    metrics.add_collector("gazetteer", gazetteer.stats)
 
 async def make_http_request(url: str, params: dict = None) -> dict | None:
     """
     Perform a GET request to 'url' with optional query parameters.
-    Return JSON on success (HTTP 200) or None on error.
+    Return JSON on success (HTTP 200) or None on error.
     """
-    headers = {
-        "User-Agent": USER_AGENT,
-        "Accept": "application/json"
-    }
-    try:
-        async with aiohttp.ClientSession(headers=headers) as session:
-            async with session.get(url, params=params) as response:
-                if response.status != 200:
-                    # Uncomment to debug:
-                    # print(f"HTTP {response.status} for {response.url}")
-                    return None
-                return await response.json()
-    except Exception as e:
-        print(f"Error making HTTP request to {url}: {e}")
-        return None
-
-class McpServer:
-    def __init__(self):
-        self.tools: dict[str, dict] = {}
-        self.pending_requests: dict = {}
-
-    def tool(self, name: str, description: str, input_schema: dict, callback):
-        self.tools[name] = {
-            "description": description,
-            "input_schema": input_schema,
-            "callback": callback
-        }
-
-    async def handle_connection(self, websocket):
-        print(f"New connection from {websocket.remote_address}")
-        async for message in websocket:
-            try:
-                print(f"Received: {message}")
-                data = json.loads(message)
-                request_id = data.get("id")
-                method = data.get("method")
-                params = data.get("params", {})
-
-                if method in self.tools:
-                    result = await self.tools[method]["callback"](params)
-                    response = {
-                        "jsonrpc": "2.0",
-                        "id": request_id,
-                        "result": {
-                            "content": [{"text": result}]
-                        }
-                    }
-                else:
-                    response = {
-                        "jsonrpc": "2.0",
-                        "id": request_id,
-                        "error": {
-                            "code": -32601,
-                            "message": f"Method '{method}' not found"
-                        }
-                    }
-
-                print(f"Sending: {json.dumps(response)}")
-                await websocket.send(json.dumps(response))
-            except Exception as e:
-                print(f"Error handling request: {e}")
+    return await http_client.get_json(url, params=params)
 
 async def get_alerts(params):
     """
@@ -83,24 +82,162 @@ async def get_alerts(params):
     """
     return "Weather alerts are not supported via Open-Meteo."
 
+class GeocodingUnavailable(Exception):
+    """Open‑Meteo geocoding failed or its circuit breaker is open."""
+
+GEOCODING_UNAVAILABLE = "Geocoding service is unavailable; could not look up {city}. Please try again later."
+
 async def geocode_city(city: str) -> tuple[float, float] | None:
     """
-    Use Open‑Meteo’s geocoding endpoint to look up a city name.
+    Resolve a city name via the offline gazetteer when loaded, falling back
+    to the geocoding cache and Open‑Meteo’s geocoding endpoint.
     Returns (latitude, longitude) of the first match, or None if not found.
+    Raises GeocodingUnavailable when Open‑Meteo could not be asked, and
+    DeadlineExceeded when the tool ran out of time waiting for it.
     """
     if not city:
         return None
 
+    if gazetteer is not None:
+        place = gazetteer.resolve(city)
+        if place is not None:
+            return (place.latitude, place.longitude)
+
+    cached = geocode_cache.get(city)
+    if cached is not MISSING:
+        return cached
+
     params = {
         "name": city,
         "count": 1,       # only need the top match
         "language": "en"
     }
     data = await make_http_request(GEOCODING_API, params=params)
-    if data and "results" in data and len(data["results"]) > 0:
+    if data is None:
+        # Upstream failure: not the same as an unknown city, and not cached.
+        raise GeocodingUnavailable(city)
+    if "results" in data and len(data["results"]) > 0:
         top = data["results"][0]
-        return (top["latitude"], top["longitude"])
-    return None
+        coords = (top["latitude"], top["longitude"])
+    else:
+        coords = None
+    geocode_cache.put(city, coords)
+    return coords
+
+# Open-Meteo forecast fields:
+#   - current_weather=true gives the current temperature, windspeed, etc.
+#   - daily=temperature_2m_max,temperature_2m_min gives tomorrow’s highs/lows
+#   - timezone=auto returns times in each location’s timezone.
+FORECAST_PARAMS = {
+    "current_weather": "true",
+    "daily": "temperature_2m_max,temperature_2m_min",
+    "timezone": "auto",
+}
+
+async def fetch_forecasts(points: list[tuple[float, float]]) -> list[dict] | None:
+    """
+    Fetch forecasts for several points in one request; Open‑Meteo takes
+    comma-separated coordinate lists and answers with a list (or a single
+    object for one point). Returns one response per point, or None.
+    """
+    params = {
+        "latitude": ",".join(str(lat) for lat, _ in points),
+        "longitude": ",".join(str(lon) for _, lon in points),
+        **FORECAST_PARAMS,
+    }
+    data = await make_http_request(FORECAST_API, params=params)
+    if data is None:
+        return None
+    return data if isinstance(data, list) else [data]
+
+forecast_batcher = ForecastBatcher(fetch_forecasts, window=FORECAST_BATCH_WINDOW, max_batch=FORECAST_BATCH_MAX)
+metrics.add_collector("forecast_batcher", forecast_batcher.stats)
+
+async def fetch_forecast_fields(latitude: float, longitude: float, hourly: str, daily: str, days: int) -> dict | None:
+    """
+    Fetch only the given hourly/daily variables for one point and return
+    them as NumPy columns (see forecast_analytics.to_columns), or None.
+    """
+    params = {"latitude": latitude, "longitude": longitude, "forecast_days": days, "timezone": "auto"}
+    if hourly:
+        params["hourly"] = hourly
+    if daily:
+        params["daily"] = daily
+    data = await make_http_request(FORECAST_API, params=params)
+    if not isinstance(data, dict):
+        return None
+    with metrics.span("parse"):
+        return to_columns(data)
+
+def _sections(value) -> list[str]:
+    if isinstance(value, list):
+        names = [str(v).strip().lower() for v in value]
+    else:
+        names = [v.strip().lower() for v in str(value or "").replace(";", ",").split(",")]
+    return [name for name in names if name] or list(SECTIONS)
+
+async def get_forecast_analytics(params):
+    """
+    Longer-range forecast summaries computed over NumPy columns:
+      - trend: daily highs/lows, day-over-day deltas, rolling mean of highs
+      - rain: wettest day and hourly wet spells
+      - outdoor: best daylight windows of 'hours' hours to be outside
+    Only the Open‑Meteo variables the chosen sections need are requested,
+    and each combination is cached separately.
+    """
+    latitude = params.get("latitude")
+    longitude = params.get("longitude")
+    city = params.get("city")
+
+    if city and (latitude is None or longitude is None):
+        with metrics.span("geocode"):
+            try:
+                coords = await geocode_city(city)
+            except GeocodingUnavailable:
+                return GEOCODING_UNAVAILABLE.format(city=city)
+        if not coords:
+            return f"Could not find coordinates for city: {city}"
+        latitude, longitude = coords
+
+    if latitude is None or longitude is None:
+        return "Please specify either a city name or both latitude and longitude."
+
+    requested = _sections(params.get("include"))
+    unknown = [name for name in requested if name not in SECTIONS]
+    if unknown:
+        return f"Unknown analysis: {', '.join(unknown)} (choose from {', '.join(SECTIONS)})"
+    sections = [section for section in SECTIONS if section in requested]
+    days = min(MAX_DAYS, max(1, params.get("days") or 7))
+    hours = min(12, max(1, params.get("hours") or 2))
+    hourly, daily = fields_for(sections)
+    variant = f"analytics:{days}:{hourly}:{daily}"
+    fetch = functools.partial(fetch_forecast_fields, hourly=hourly, daily=daily, days=days)
+
+    with metrics.span("fetch"):
+        columns = await forecast_cache.get_or_fetch(latitude, longitude, fetch, variant)
+    stale = False
+    if not columns:
+        columns = forecast_cache.peek_stale(latitude, longitude, variant)
+        stale = columns is not None
+    if not columns:
+        return f"Failed to retrieve weather data for {city or f'{latitude},{longitude}'}."
+
+    lines = [format_location(city, latitude, longitude), f"Next {days} day(s):"]
+    with metrics.span("analyse"):
+        try:
+            for section in sections:
+                if section == "trend":
+                    lines += daily_trend(columns)
+                elif section == "rain":
+                    lines += rain_windows(columns)
+                else:
+                    lines += outdoor_windows(columns, hours)
+        except (KeyError, ValueError) as e:
+            logger.warning("Error analysing Open-Meteo response: %s", e)
+            return UNEXPECTED_FORMAT
+    if stale:
+        lines.append(STALE_NOTE)
+    return "\n".join(lines)
 
 async def get_forecast(params):
     """
@@ -116,7 +253,11 @@ async def get_forecast(params):
     city = params.get("city")
 
     if city and (latitude is None or longitude is None):
-        coords = await geocode_city(city)
+        with metrics.span("geocode"):
+            try:
+                coords = await geocode_city(city)
+            except GeocodingUnavailable:
+                return GEOCODING_UNAVAILABLE.format(city=city)
         if not coords:
             return f"Could not find coordinates for city: {city}"
         latitude, longitude = coords
@@ -124,68 +265,166 @@ async def get_forecast(params):
     if latitude is None or longitude is None:
         return "Please specify either a city name or both latitude and longitude."
 
-    # 2) Call Open-Meteo’s forecast endpoint:
-    #    - current_weather=true gives the current temperature, windspeed, etc.
-    #    - daily=temperature_2m_max,temperature_2m_min gives tomorrow’s highs/lows
-    #    - timezone=auto returns times in the location’s timezone.
-    params_owm = {
-        "latitude": float(latitude),
-        "longitude": float(longitude),
-        "current_weather": "true",  # <-- convert to string
-        "daily": "temperature_2m_max,temperature_2m_min",
-        "timezone": "auto"
-    }
-    data = await make_http_request(FORECAST_API, params=params_owm)
+    # Streaming clients hear where the forecast is for while it is fetched,
+    # then the current conditions, then the full result.
+    location = format_location(city, latitude, longitude)
+    await report_progress(location)
+
+    # 2) Fetch the forecast for the snapped grid point so the cache can
+    #    share it; misses go upstream through the micro-batcher.
+    with metrics.span("fetch"):
+        data = await forecast_cache.get_or_fetch(latitude, longitude, forecast_batcher.fetch)
+    stale = False
+    if not data:
+        # Upstream failed or its circuit breaker is open: use any cached copy.
+        data = forecast_cache.peek_stale(latitude, longitude)
+        stale = data is not None
     if not data:
         return f"Failed to retrieve weather data for {city or f'{latitude},{longitude}'}."
 
     # 3) Parse and format the response
+    with metrics.span("format"):
+        parts = forecast_parts(data)
+    if parts is None:
+        return UNEXPECTED_FORMAT
+    current, daily = parts
+    await report_progress(f"{current}\n{STALE_NOTE}" if stale else current)
+    text = "\n".join((location, current, daily))
+    return f"{text}\n{STALE_NOTE}" if stale else text
+
+def _city_list(value) -> list[str]:
+    # "Paris, TX" contains a comma, so ';' wins when present.
+    if isinstance(value, list):
+        return [str(c).strip() for c in value if str(c).strip()]
+    text = str(value or "")
+    return [c.strip() for c in text.split(";" if ";" in text else ",") if c.strip()]
+
+async def get_forecast_batch(params):
+    """
+    Forecasts for several cities in one call. Cities are geocoded
+    concurrently and cache misses share as few upstream requests as the
+    batcher allows. Accepts {"cities": ["Berlin", "Paris, TX"]} or a
+    "Berlin; Paris; Rome" string.
+    """
+    cities = _city_list(params.get("cities"))
+    if not cities:
+        return "Please specify one or more cities."
+    if len(cities) > MAX_BATCH_CITIES:
+        return f"Too many cities (at most {MAX_BATCH_CITIES})."
+
+    async def locate(city):
+        try:
+            return await geocode_city(city)
+        except GeocodingUnavailable as e:
+            return e
+
+    with metrics.span("geocode"):
+        coords = await asyncio.gather(*(locate(city) for city in cities))
+
+    async def fetch(point):
+        if not point or isinstance(point, GeocodingUnavailable):
+            return None, False
+        lat, lon = float(point[0]), float(point[1])
+        data = await forecast_cache.get_or_fetch(lat, lon, forecast_batcher.fetch)
+        if data:
+            return data, False
+        data = forecast_cache.peek_stale(lat, lon)
+        return data, data is not None
+
+    with metrics.span("fetch"):
+        forecasts = await asyncio.gather(*(fetch(point) for point in coords))
+
+    with metrics.span("format"):
+        blocks = []
+        for city, point, (data, stale) in zip(cities, coords, forecasts):
+            if isinstance(point, GeocodingUnavailable):
+                blocks.append(GEOCODING_UNAVAILABLE.format(city=city))
+            elif not point:
+                blocks.append(f"Could not find coordinates for city: {city}")
+            elif not data:
+                blocks.append(f"Failed to retrieve weather data for {city}.")
+            else:
+                text = format_forecast(data, city, float(point[0]), float(point[1]))
+                blocks.append(f"{text}\n{STALE_NOTE}" if stale else text)
+        return "\n\n".join(blocks)
+
+def format_location(city: str | None, latitude: float, longitude: float) -> str:
+    return f"Location: {city}" if city else f"Location: {latitude:.4f}, {longitude:.4f}"
+
+def format_current(data: dict) -> str:
+    """
+    The current-conditions block of the tool result.
+    """
+    cw = data.get("current_weather", {})
+    temp = cw.get("temperature")
+    windspeed = cw.get("windspeed")
+    winddirection = cw.get("winddirection")
+    weather_time = cw.get("time")  # ISO time
+
+    lines = [
+        f"Current (as of {weather_time}):",
+        f"  • Temperature: {temp}°C",
+        f"  • Wind: {windspeed} m/s (direction {winddirection}°)",
+    ]
+    return "\n".join(lines)
+
+def format_daily(data: dict) -> str:
+    """
+    The daily-forecast block of the tool result: today and tomorrow.
+    """
+    daily = data.get("daily", {})
+    dates = daily.get("time", [])
+    temp_max = daily.get("temperature_2m_max", [])
+    temp_min = daily.get("temperature_2m_min", [])
+
+    lines = ["Daily Forecast:"]
+    for i in range(min(2, len(dates))):
+        lines.append(f"  {dates[i]}  → High {temp_max[i]}°C, Low {temp_min[i]}°C")
+    return "\n".join(lines)
+
+def forecast_parts(data: dict) -> tuple[str, str] | None:
+    """
+    The current-conditions and daily-forecast blocks, or None when 'data'
+    is not a forecast response.
+    """
     try:
-        # Current weather block
-        cw = data.get("current_weather", {})
-        temp = cw.get("temperature")
-        windspeed = cw.get("windspeed")
-        winddirection = cw.get("winddirection")
-        weather_time = cw.get("time")  # ISO time
-
-        # Daily forecast block: get today’s index (0) and tomorrow’s (1)
-        daily = data.get("daily", {})
-        dates = daily.get("time", [])
-        temp_max = daily.get("temperature_2m_max", [])
-        temp_min = daily.get("temperature_2m_min", [])
-
-        # Build lines
-        lines = []
-        location_name = f"{city}" if city else f"{latitude:.4f}, {longitude:.4f}"
-        lines.append(f"Location: {location_name}")
-        lines.append(f"Current (as of {weather_time}):")
-        lines.append(f"  • Temperature: {temp}°C")
-        lines.append(f"  • Wind: {windspeed} m/s (direction {winddirection}°)")
-        lines.append("Daily Forecast:")
-
-        # If have daily arrays, show day 0 and day 1
-        if len(dates) >= 1:
-            lines.append(f"  {dates[0]}  → High {temp_max[0]}°C, Low {temp_min[0]}°C")
-        if len(dates) >= 2:
-            lines.append(f"  {dates[1]}  → High {temp_max[1]}°C, Low {temp_min[1]}°C")
-
-        return "\n".join(lines)
+        return format_current(data), format_daily(data)
     except Exception as e:
-        print(f"Error parsing Open-Meteo response: {e}")
-        return "Unexpected response format from Open-Meteo."
-
-async def get_coordinates_for_city(city):
-    city_coordinates = {
-        "new york": (40.7128, -74.0060),
-        "los angeles": (34.0522, -118.2437),
-        "chicago": (41.8781, -87.6298),
-        "houston": (29.7604, -95.3698),
-    }
-    return city_coordinates.get(city.strip().lower())
+        logger.warning("Error parsing Open-Meteo response: %s", e)
+        return None
+
+def format_forecast(data: dict, city: str | None, latitude: float, longitude: float) -> str:
+    """
+    Render an Open‑Meteo forecast response as the multi-line tool result.
+    """
+    parts = forecast_parts(data)
+    if parts is None:
+        return UNEXPECTED_FORMAT
+    return "\n".join((format_location(city, latitude, longitude), *parts))
 
+async def get_upstream_stats(params):
+    """
+    Report connection-pool usage for the Open‑Meteo client.
+    """
+    return json.dumps(http_client.stats())
 
-async def main():
-    server = McpServer()
+async def get_cache_stats(params):
+    """
+    Report hit/miss counters for the geocoding and forecast caches.
+    """
+    return json.dumps({
+        "geocode": geocode_cache.stats(),
+        "forecast": forecast_cache.stats(),
+        "forecast_batcher": forecast_batcher.stats(),
+    })
+
+
+PORT = 8080
+
+def register(server: McpServer):
+    if GEOCODE_SEED_FILE:
+        count = geocode_cache.seed_from_file(GEOCODE_SEED_FILE)
+        logger.info("Seeded geocoding cache with %d cities from %s", count, GEOCODE_SEED_FILE)
 
     server.tool(
         name="get-alerts",
@@ -205,9 +444,61 @@ async def main():
         callback=get_forecast
     )
 
-    async with serve(server.handle_connection, "0.0.0.0", 8080):
-        print("Weather MCP (Open‑Meteo) running on ws://0.0.0.0:8080")
-        await asyncio.Future()  # run forever
+    server.tool(
+        name="get-forecast-batch",
+        description="Get current weather + short daily forecast for several cities at once",
+        input_schema={
+            "cities": {"type": "array", "description": "City names (or a ';'-separated string)"}
+        },
+        callback=get_forecast_batch
+    )
+
+    server.tool(
+        name="get-forecast-analytics",
+        description="Up to 16-day forecast analysis: temperature trend, rain windows, best hours outdoors",
+        input_schema={
+            "city": {"type": "string", "description": "City name (optional)"},
+            "latitude": {"type": "number", "description": "Latitude (optional)"},
+            "longitude": {"type": "number", "description": "Longitude (optional)"},
+            "days": {"type": "integer", "description": "Days ahead, 1-16 (default 7)"},
+            "include": {"type": "array", "description": "Any of trend, rain, outdoor (default all)"},
+            "hours": {"type": "integer", "description": "Length of the outdoor window in hours (default 2)"}
+        },
+        callback=get_forecast_analytics
+    )
+
+    server.tool(
+        name="get-upstream-stats",
+        description="Connection-pool statistics for the Open-Meteo HTTP client",
+        input_schema={},
+        callback=get_upstream_stats
+    )
+
+    server.tool(
+        name="get-cache-stats",
+        description="Hit/miss counters for the weather server caches",
+        input_schema={},
+        callback=get_cache_stats
+    )
+
+async def shutdown():
+    """
+    Release the pooled HTTP client and the geocoding cache store.
+    """
+    await http_client.close()
+    geocode_cache.close()
+
+async def main():
+    setup_logging()
+    server = McpServer()
+    register(server)
+
+    try:
+        async with server.serve("0.0.0.0", PORT):
+            logger.info("Weather MCP (Open‑Meteo) running on ws://0.0.0.0:%d", PORT)
+            await asyncio.Future()  # run forever
+    finally:
+        await shutdown()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,203 @@
+import argparse
+import asyncio
+import importlib
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+
+from mcp_core import McpServer
+from mcp_logging import setup_logging
+
+logger = logging.getLogger(__name__)
+
+# Tool modules hosted by default; each exposes PORT and register(server),
+# and optionally an async shutdown() hook.
+DEFAULT_MODULES = [
+    "mcp_server",
+    "jokes_mcp_server",
+    "calendar_mcp_server",
+    "travel_mcp_server",
+    "local_info_mcp_server",
+    "geolocation_mcp_server",
+]
+
+# Modules whose state lives in process memory (the calendar store and its
+# log file). Several workers would each hand out their own ids, miss each
+# other's conflicts and overwrite one log, so these run only with one worker.
+SINGLE_WORKER_MODULES = {"calendar_mcp_server"}
+
+DRAIN_TIMEOUT = 30.0
+
+def build_registry(module_names: list[str]) -> tuple[McpServer, list]:
+    """
+    Import every tool module and register its tools on one shared server.
+    """
+    server = McpServer()
+    modules = []
+    for name in module_names:
+        module = importlib.import_module(name)
+        module.register(server)
+        modules.append(module)
+    return server, modules
+
+def run_with_fast_loop(coro):
+    """
+    Run 'coro' on uvloop when it is installed, else on the default loop.
+    """
+    try:
+        import uvloop
+    except ImportError:
+        return asyncio.run(coro)
+    return uvloop.run(coro)
+
+async def serve_worker(module_names: list[str], host: str, ports: list[int], drain_timeout: float):
+    server, modules = build_registry(module_names)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    listeners = [
+        await server.serve(host, port, reuse_port=True)
+        for port in ports
+    ]
+    logger.info("Worker %d serving %d tools on ports %s", os.getpid(), len(server.tools), ports)
+    try:
+        await stop.wait()
+
+        # Graceful drain: stop accepting, let in-flight calls finish, then
+        # close the remaining (idle) connections.
+        logger.info("Worker %d draining", os.getpid())
+        for listener in listeners:
+            listener.close(close_connections=False)
+        deadline = loop.time() + drain_timeout
+        while server.inflight() and loop.time() < deadline:
+            await asyncio.sleep(0.1)
+        for listener in listeners:
+            listener.close()
+        await asyncio.gather(*(listener.wait_closed() for listener in listeners))
+    finally:
+        server.close()
+        for module in modules:
+            shutdown = getattr(module, "shutdown", None)
+            if shutdown is not None:
+                await shutdown()
+        logger.info("Worker %d stopped", os.getpid())
+
+def worker_main(module_names: list[str], host: str, ports: list[int], drain_timeout: float):
+    setup_logging()
+    run_with_fast_loop(serve_worker(module_names, host, ports, drain_timeout))
+
+class Supervisor:
+    """
+    Runs N worker processes that each bind every port with SO_REUSEPORT,
+    letting the kernel spread connections across cores.
+
+    SIGHUP restarts workers one at a time (new worker up before the old one
+    drains); SIGTERM/SIGINT drain and stop all workers. Crashed workers are
+    replaced.
+    """
+
+    def __init__(self, module_names: list[str], host: str, ports: list[int], workers: int, drain_timeout: float):
+        self.module_names = module_names
+        self.host = host
+        self.ports = ports
+        self.workers = workers
+        self.drain_timeout = drain_timeout
+        # Spawn, not fork: each worker opens its own sockets, sessions and DB handles.
+        self.ctx = multiprocessing.get_context("spawn")
+        self.procs: list = []
+        self.running = True
+        self.restart_requested = False
+
+    def spawn(self):
+        proc = self.ctx.Process(
+            target=worker_main,
+            args=(self.module_names, self.host, self.ports, self.drain_timeout),
+            daemon=False,
+        )
+        proc.start()
+        return proc
+
+    def stop_worker(self, proc):
+        if proc.is_alive():
+            proc.terminate()  # SIGTERM -> graceful drain in the worker
+        proc.join(self.drain_timeout + 5)
+        if proc.is_alive():
+            proc.kill()
+            proc.join()
+
+    def rolling_restart(self):
+        logger.info("Rolling restart of workers")
+        for i, old in enumerate(list(self.procs)):
+            self.procs[i] = self.spawn()
+            time.sleep(1.0)  # let the replacement bind before the old one stops accepting
+            self.stop_worker(old)
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, self._on_restart)
+
+        self.procs = [self.spawn() for _ in range(self.workers)]
+        logger.info("Supervisor %d started %d workers on %s ports %s", os.getpid(), self.workers, self.host, self.ports)
+        while self.running:
+            time.sleep(0.5)
+            if self.restart_requested:
+                self.restart_requested = False
+                self.rolling_restart()
+            for i, proc in enumerate(self.procs):
+                if not proc.is_alive() and self.running:
+                    logger.warning("Worker %d exited with %s; replacing", proc.pid, proc.exitcode)
+                    self.procs[i] = self.spawn()
+
+        for proc in self.procs:
+            if proc.is_alive():
+                proc.terminate()
+        for proc in self.procs:
+            self.stop_worker(proc)
+        logger.info("Supervisor stopped")
+
+    def _on_stop(self, signum, frame):
+        self.running = False
+
+    def _on_restart(self, signum, frame):
+        self.restart_requested = True
+
+def main():
+    parser = argparse.ArgumentParser(description="Host all MCP tool servers in a multi-process worker pool")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument(
+        "--port", type=int, action="append", dest="ports",
+        help="Port to listen on (repeatable). Defaults to every module's own PORT.",
+    )
+    parser.add_argument("--module", action="append", dest="modules", help="Tool module to load (repeatable)")
+    parser.add_argument("--drain-timeout", type=float, default=DRAIN_TIMEOUT)
+    args = parser.parse_args()
+    setup_logging()
+
+    workers = args.workers
+    if not hasattr(socket, "SO_REUSEPORT") and workers > 1:
+        logger.warning("SO_REUSEPORT is not available on this platform; running a single worker")
+        workers = 1
+    module_names = args.modules or DEFAULT_MODULES
+    single = SINGLE_WORKER_MODULES.intersection(module_names)
+    if single and workers > 1:
+        if args.modules:
+            parser.error(f"{', '.join(sorted(single))} keeps per-process state; run it with --workers 1")
+        logger.warning("Not hosting %s with %d workers; run it separately", ", ".join(sorted(single)), workers)
+        module_names = [name for name in module_names if name not in single]
+    ports = args.ports or [importlib.import_module(name).PORT for name in module_names]
+    # Every worker has its own process pool for CPU-bound tools; split the
+    # cores between them rather than giving each worker cpu_count processes.
+    os.environ.setdefault("MCP_PROCESS_WORKERS", str(max(1, (os.cpu_count() or 1) // workers)))
+
+    Supervisor(module_names, args.host, ports, workers, args.drain_timeout).run()
+
+if __name__ == "__main__":
+    main()
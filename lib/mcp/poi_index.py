@@ -0,0 +1,212 @@
+import argparse
+import csv
+import json
+import math
+
+import numpy as np
+
+from array_store import open_arrays, write_arrays
+
+# Points of interest stored column-wise and bucketed into a regular
+# lat/lon grid. A query gathers only the grid cells overlapping the search
+# circle's bounding box, then runs a vectorised haversine over those points.
+
+EARTH_RADIUS_KM = 6371.0088
+DEFAULT_CELL_DEG = 0.1
+
+def _read_points(path: str):
+    """Yield (name, category, latitude, longitude) from a CSV or GeoJSON file."""
+    if path.endswith((".json", ".geojson")):
+        with open(path, encoding="utf-8") as f:
+            collection = json.load(f)
+        for feature in collection.get("features", []):
+            geometry = feature.get("geometry") or {}
+            if geometry.get("type") != "Point":
+                continue
+            lon, lat = geometry["coordinates"][:2]
+            props = feature.get("properties") or {}
+            category = props.get("category") or props.get("amenity") or props.get("type") or ""
+            yield props.get("name") or "", category, float(lat), float(lon)
+    else:
+        with open(path, encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                try:
+                    yield row.get("name", ""), row.get("category", ""), float(row["latitude"]), float(row["longitude"])
+                except (KeyError, TypeError, ValueError):
+                    continue
+
+def compile_pois(src_path: str, out_path: str, cell_deg: float = DEFAULT_CELL_DEG) -> int:
+    """
+    Compile a POI CSV (name,category,latitude,longitude) or GeoJSON file.
+    Returns the number of points indexed.
+    """
+    names, categories, lats, lons = [], [], [], []
+    category_ids: dict[str, int] = {}
+    for name, category, lat, lon in _read_points(src_path):
+        names.append(name.encode("utf-8"))
+        categories.append(category_ids.setdefault(category.strip().lower(), len(category_ids)))
+        lats.append(lat)
+        lons.append(lon)
+
+    lat_arr = np.array(lats, dtype=np.float64)
+    lon_arr = np.array(lons, dtype=np.float64)
+    ncols = math.ceil(360 / cell_deg)
+    cells = grid_cells(lat_arr, lon_arr, cell_deg, ncols)
+    order = np.argsort(cells, kind="stable")
+    cells = cells[order]
+    cell_ids, cell_start = np.unique(cells, return_index=True)
+
+    ordered_names = [names[i] for i in order]
+    name_offsets = np.zeros(len(ordered_names) + 1, dtype=np.int64)
+    name_offsets[1:] = np.cumsum([len(n) for n in ordered_names])
+
+    write_arrays(
+        out_path,
+        {
+            "latitude": lat_arr[order].astype(np.float32),
+            "longitude": lon_arr[order].astype(np.float32),
+            "category": np.array(categories, dtype=np.uint16)[order],
+            "cell_ids": cell_ids.astype(np.int64),
+            "cell_start": np.append(cell_start, len(cells)).astype(np.int64),
+            "name_blob": np.frombuffer(b"".join(ordered_names), dtype=np.uint8),
+            "name_offsets": name_offsets,
+        },
+        meta={"cell_deg": cell_deg, "ncols": ncols, "categories": sorted(category_ids, key=category_ids.get)},
+    )
+    return len(names)
+
+def grid_cells(lat, lon, cell_deg: float, ncols: int):
+    """Row-major grid cell id of each coordinate."""
+    rows = np.floor((np.asarray(lat) + 90.0) / cell_deg).astype(np.int64)
+    cols = np.floor((np.asarray(lon) + 180.0) / cell_deg).astype(np.int64) % ncols
+    return rows * ncols + cols
+
+def grid_candidates(cell_ids, cell_start, cell_deg: float, ncols: int, lat: float, lon: float, radius_km: float) -> np.ndarray:
+    """
+    Indices of points in grid cells overlapping the circle's bounding box,
+    for points sorted by cell with CSR offsets 'cell_start'.
+    """
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    cos_lat = math.cos(math.radians(min(89.9, abs(lat) + dlat)))
+    dlon = min(180.0, dlat / max(cos_lat, 1e-6))
+    row_lo = max(0, math.floor((lat - dlat + 90.0) / cell_deg))
+    row_hi = min(math.floor(180 / cell_deg), math.floor((lat + dlat + 90.0) / cell_deg))
+    col_lo = math.floor((lon - dlon + 180.0) / cell_deg)
+    col_hi = math.floor((lon + dlon + 180.0) / cell_deg)
+    ncells = (row_hi - row_lo + 1) * (col_hi - col_lo + 1)
+    if ncells >= len(cell_ids):
+        return np.arange(int(cell_start[-1]))
+
+    rows = np.arange(row_lo, row_hi + 1)
+    cols = np.unique(np.arange(col_lo, col_hi + 1) % ncols)
+    wanted = (rows[:, None] * ncols + cols[None, :]).ravel()
+    pos = np.searchsorted(cell_ids, wanted)
+    found = pos < len(cell_ids)
+    found[found] = cell_ids[pos[found]] == wanted[found]
+    present = pos[found]
+    starts = cell_start[present]
+    lengths = cell_start[present + 1] - starts
+    if not lengths.sum():
+        return np.empty(0, dtype=np.int64)
+    # Concatenate the per-cell ranges without a Python loop.
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(lengths.sum())
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance; vectorised over NumPy arrays."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+class PoiIndex:
+    """Grid-bucketed, memory-mapped POI store with radius / top-k queries."""
+
+    def __init__(self, path: str):
+        self.path = path
+        arrays, meta = open_arrays(path)
+        self.latitude = arrays["latitude"]
+        self.longitude = arrays["longitude"]
+        self.category = arrays["category"]
+        self.cell_ids = arrays["cell_ids"]
+        self.cell_start = arrays["cell_start"]
+        self.name_blob = arrays["name_blob"]
+        self.name_offsets = arrays["name_offsets"]
+        self.cell_deg: float = meta["cell_deg"]
+        self.ncols: int = meta["ncols"]
+        self.categories: list[str] = meta["categories"]
+        self.category_ids = {name: i for i, name in enumerate(self.categories)}
+
+    def __len__(self) -> int:
+        return len(self.latitude)
+
+    def category_id(self, category: str | None) -> int | None:
+        """Map a category name (case-insensitive, simple plurals) to its id; -1 if unknown."""
+        if not category:
+            return None
+        key = category.strip().lower()
+        plurals = [key[:-3] + "y", key[:-2], key[:-1]] if key.endswith("s") else []
+        for candidate in [key, *plurals]:
+            if candidate in self.category_ids:
+                return self.category_ids[candidate]
+        return -1
+
+    def name(self, i: int) -> str:
+        return self.name_blob[self.name_offsets[i]:self.name_offsets[i + 1]].tobytes().decode("utf-8")
+
+    def _candidates(self, lat: float, lon: float, radius_km: float) -> np.ndarray:
+        return grid_candidates(self.cell_ids, self.cell_start, self.cell_deg, self.ncols, lat, lon, radius_km)
+
+    def nearest(self, lat: float, lon: float, radius_km: float = 5.0, k: int = 5, category: str | None = None) -> list[dict]:
+        """The k closest points within radius_km, optionally of one category."""
+        idx = self._candidates(lat, lon, radius_km)
+        category_id = self.category_id(category)
+        if category_id == -1:
+            return []
+        if category_id is not None and len(idx):
+            idx = idx[self.category[idx] == category_id]
+        if not len(idx):
+            return []
+        distances = haversine_km(lat, lon, self.latitude[idx].astype(np.float64), self.longitude[idx].astype(np.float64))
+        inside = distances <= radius_km
+        idx, distances = idx[inside], distances[inside]
+        if len(idx) > k:
+            top = np.argpartition(distances, k)[:k]
+            idx, distances = idx[top], distances[top]
+        order = np.argsort(distances)
+        return [
+            {
+                "name": self.name(int(idx[i])),
+                "category": self.categories[int(self.category[idx[i]])],
+                "latitude": round(float(self.latitude[idx[i]]), 6),
+                "longitude": round(float(self.longitude[idx[i]]), 6),
+                "distance_km": round(float(distances[i]), 3),
+            }
+            for i in order
+        ]
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile or query the POI index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("compile", help="Compile a POI CSV or GeoJSON file")
+    build.add_argument("source")
+    build.add_argument("output")
+    build.add_argument("--cell-deg", type=float, default=DEFAULT_CELL_DEG)
+    query = sub.add_parser("query", help="Nearest points to a coordinate")
+    query.add_argument("index")
+    query.add_argument("latitude", type=float)
+    query.add_argument("longitude", type=float)
+    query.add_argument("--category")
+    query.add_argument("--radius", type=float, default=5.0)
+    query.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == "compile":
+        count = compile_pois(args.source, args.output, args.cell_deg)
+        print(f"Indexed {count} points into {args.output}")
+    else:
+        index = PoiIndex(args.index)
+        for poi in index.nearest(args.latitude, args.longitude, args.radius, args.k, args.category):
+            print(poi)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,422 @@
+import argparse
+import csv
+import heapq
+import itertools
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+from array_store import open_arrays, write_arrays
+from poi_index import EARTH_RADIUS_KM, grid_candidates, grid_cells, haversine_km
+
+# Road/transport graph in CSR form: the outgoing edges of node u are
+# indices[indptr[u]:indptr[u + 1]] with lengths in weights (km). Nodes are
+# renumbered in grid-cell order, so a search touches mostly nearby pages
+# and snapping a coordinate reuses the POI grid lookup.
+
+DEFAULT_CELL_DEG = 0.05
+DEFAULT_LANDMARKS = 8
+EXACT_STOPS = 7
+ONEWAY_VALUES = {"1", "yes", "true", "oneway"}
+
+def _read_nodes(path: str):
+    with open(path, encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            try:
+                yield row["id"], float(row["latitude"]), float(row["longitude"])
+            except (KeyError, TypeError, ValueError):
+                continue
+
+def _read_edges(path: str):
+    with open(path, encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            try:
+                distance = float(row.get("distance_km") or "nan")
+            except ValueError:
+                distance = math.nan
+            oneway = (row.get("oneway") or "").strip().lower() in ONEWAY_VALUES
+            if row.get("source") and row.get("target"):
+                yield row["source"], row["target"], distance, oneway
+
+def _dijkstra(indptr: list, indices: list, weights: list, source: int) -> np.ndarray:
+    """Distances from 'source' to every node (inf when unreachable)."""
+    dist = [math.inf] * (len(indptr) - 1)
+    dist[source] = 0.0
+    heap = [(0.0, source)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if d > dist[u]:
+            continue
+        for e in range(indptr[u], indptr[u + 1]):
+            v = indices[e]
+            nd = d + weights[e]
+            if nd < dist[v]:
+                dist[v] = nd
+                heapq.heappush(heap, (nd, v))
+    return np.array(dist)
+
+def _csr(src: np.ndarray, n: int):
+    """Edge permutation grouping edges by 'src', and the matching indptr."""
+    order = np.argsort(src, kind="stable")
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(src, minlength=n))
+    return order, indptr
+
+def _landmarks(indptr, indices, weights, rev_indptr, rev_indices, rev_weights, count: int):
+    """
+    Pick 'count' landmarks by farthest-point selection and return their
+    distances to and from every node, shaped (count, nodes).
+    """
+    fwd = (indptr.tolist(), indices.tolist(), weights.tolist())
+    rev = (rev_indptr.tolist(), rev_indices.tolist(), rev_weights.tolist())
+    n = len(indptr) - 1
+    dist_from, dist_to = [], []
+    nearest = np.full(n, np.inf)
+    landmark = 0
+    for _ in range(min(count, n)):
+        dist_from.append(_dijkstra(*fwd, landmark))
+        dist_to.append(_dijkstra(*rev, landmark))
+        nearest = np.minimum(nearest, np.where(np.isfinite(dist_from[-1]), dist_from[-1], np.inf))
+        candidates = np.where(np.isfinite(nearest), nearest, -1.0)
+        landmark = int(np.argmax(candidates))
+    return np.array(dist_from, dtype=np.float32), np.array(dist_to, dtype=np.float32)
+
+def compile_graph(
+    nodes_path: str,
+    edges_path: str,
+    out_path: str,
+    cell_deg: float = DEFAULT_CELL_DEG,
+    landmarks: int = DEFAULT_LANDMARKS,
+) -> dict:
+    """
+    Compile a node CSV (id,latitude,longitude) and an edge CSV
+    (source,target[,distance_km][,oneway]) into a memory-mappable graph.
+    Edges are two-way unless 'oneway' is set; a missing distance is the
+    great-circle length. 'landmarks' full shortest-path trees are computed
+    up front to tighten the A* bound (0 disables them).
+    """
+    node_index: dict[str, int] = {}
+    lats, lons = [], []
+    for node_id, lat, lon in _read_nodes(nodes_path):
+        node_index[node_id] = len(lats)
+        lats.append(lat)
+        lons.append(lon)
+    src, dst, dist, oneway = [], [], [], []
+    for source, target, distance, is_oneway in _read_edges(edges_path):
+        if source in node_index and target in node_index:
+            src.append(node_index[source])
+            dst.append(node_index[target])
+            dist.append(distance)
+            oneway.append(is_oneway)
+
+    lat_arr = np.array(lats, dtype=np.float64)
+    lon_arr = np.array(lons, dtype=np.float64)
+    src_arr = np.array(src, dtype=np.int64)
+    dst_arr = np.array(dst, dtype=np.int64)
+    # Never shorter than the straight line, or the heuristic would overestimate.
+    straight = haversine_km(lat_arr[src_arr], lon_arr[src_arr], lat_arr[dst_arr], lon_arr[dst_arr])
+    dist_arr = np.fmax(np.array(dist, dtype=np.float64), straight)
+    twoway = ~np.array(oneway, dtype=bool)
+    src_arr, dst_arr = np.concatenate([src_arr, dst_arr[twoway]]), np.concatenate([dst_arr, src_arr[twoway]])
+    dist_arr = np.concatenate([dist_arr, dist_arr[twoway]])
+
+    n = len(lat_arr)
+    ncols = math.ceil(360 / cell_deg)
+    cells = grid_cells(lat_arr, lon_arr, cell_deg, ncols)
+    order = np.argsort(cells, kind="stable")
+    rank = np.empty(n, dtype=np.int64)
+    rank[order] = np.arange(n)
+    cells = cells[order]
+    cell_ids, cell_start = np.unique(cells, return_index=True)
+    lat_arr, lon_arr = lat_arr[order], lon_arr[order]
+
+    src_arr, dst_arr = rank[src_arr], rank[dst_arr]
+    edge_weights = dist_arr.astype(np.float32)
+    # Round float32 lengths up so they stay admissible for the heuristic.
+    short = edge_weights < dist_arr
+    edge_weights[short] = np.nextafter(edge_weights[short], np.float32(np.inf))
+    edge_order, indptr = _csr(src_arr, n)
+    indices = dst_arr[edge_order].astype(np.int32)
+    weights = edge_weights[edge_order]
+
+    phi, lam = np.radians(lat_arr), np.radians(lon_arr)
+    arrays = {
+        "latitude": lat_arr,
+        "longitude": lon_arr,
+        # Unit vectors: the chord between two of them bounds the great-circle
+        # distance from below without any trigonometry at query time.
+        "x": np.cos(phi) * np.cos(lam),
+        "y": np.cos(phi) * np.sin(lam),
+        "z": np.sin(phi),
+        "indptr": indptr,
+        "indices": indices,
+        "weights": weights,
+        "cell_ids": cell_ids.astype(np.int64),
+        "cell_start": np.append(cell_start, len(cells)).astype(np.int64),
+    }
+    if landmarks and n:
+        rev_order, rev_indptr = _csr(dst_arr, n)
+        arrays["landmark_from"], arrays["landmark_to"] = _landmarks(
+            indptr, indices, weights,
+            rev_indptr, src_arr[rev_order], edge_weights[rev_order],
+            landmarks,
+        )
+    write_arrays(out_path, arrays, meta={"cell_deg": cell_deg, "ncols": ncols})
+    return {"nodes": n, "edges": len(weights), "landmarks": len(arrays.get("landmark_from", []))}
+
+def distance_matrix(lats, lons) -> np.ndarray:
+    """Great-circle distances (km) between every pair of points."""
+    lats, lons = np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64)
+    return haversine_km(lats[:, None], lons[:, None], lats[None, :], lons[None, :])
+
+def order_stops(matrix: np.ndarray) -> list[int]:
+    """
+    Visiting order for the rows of a distance matrix, starting at the first
+    row and finishing at the last. Up to EXACT_STOPS intermediate stops
+    every permutation is scored at once; beyond that, nearest-neighbour
+    construction is refined by 2-opt, each pass scoring every segment
+    reversal at once.
+    """
+    n = len(matrix)
+    if n <= 3:
+        return list(range(n))
+    middle = np.arange(1, n - 1)
+    if len(middle) <= EXACT_STOPS:
+        perms = np.array(list(itertools.permutations(middle)))
+        tours = np.hstack([np.zeros((len(perms), 1), dtype=int), perms, np.full((len(perms), 1), n - 1)])
+        costs = matrix[tours[:, :-1], tours[:, 1:]].sum(axis=1)
+        return tours[int(np.argmin(costs))].tolist()
+
+    tour, remaining = [0], set(middle.tolist())
+    while remaining:
+        nxt = min(remaining, key=lambda j: matrix[tour[-1], j])
+        tour.append(nxt)
+        remaining.remove(nxt)
+    tour.append(n - 1)
+    # Reversing tour[i..j] (0 < i < j < n - 1) replaces the two boundary
+    # edges and flips the direction of the edges in between.
+    i, j = np.triu_indices(n - 1, k=1)
+    keep = i >= 1
+    i, j = i[keep], j[keep]
+    while True:
+        t = np.array(tour)
+        cum_fwd = np.concatenate([[0.0], np.cumsum(matrix[t[:-1], t[1:]])])
+        cum_bwd = np.concatenate([[0.0], np.cumsum(matrix[t[1:], t[:-1]])])
+        delta = (
+            matrix[t[i - 1], t[j]] + matrix[t[i], t[j + 1]]
+            - matrix[t[i - 1], t[i]] - matrix[t[j], t[j + 1]]
+            + (cum_bwd[j] - cum_bwd[i]) - (cum_fwd[j] - cum_fwd[i])
+        )
+        best = int(np.argmin(delta))
+        if not delta[best] < -1e-9:
+            return tour
+        a, b = int(i[best]), int(j[best])
+        tour[a:b + 1] = tour[a:b + 1][::-1]
+
+class RouteGraph:
+    """
+    Shortest paths over a compiled, memory-mapped CSR graph. A* is guided
+    by the straight-line distance to the goal and, when the graph was
+    compiled with landmarks, by the triangle-inequality bounds they give
+    (ALT), which keeps long routes from flooding the graph. Recent routes
+    are kept in an LRU.
+    """
+
+    def __init__(self, path: str, cache_size: int = 1024, snap_km: float = 25.0, active_landmarks: int = 4):
+        self.path = path
+        arrays, meta = open_arrays(path)
+        self.latitude = arrays["latitude"]
+        self.longitude = arrays["longitude"]
+        self.cell_ids = arrays["cell_ids"]
+        self.cell_start = arrays["cell_start"]
+        self.landmark_from = arrays.get("landmark_from")
+        self.landmark_to = arrays.get("landmark_to")
+        self.cell_deg: float = meta["cell_deg"]
+        self.ncols: int = meta["ncols"]
+        # memoryviews hand the search loop plain Python numbers instead of
+        # allocating a NumPy scalar per element access.
+        self._xyz = tuple(memoryview(arrays[axis]) for axis in ("x", "y", "z"))
+        self._indptr = memoryview(arrays["indptr"])
+        self._indices = memoryview(arrays["indices"])
+        self._weights = memoryview(arrays["weights"])
+        self._landmarks = []
+        if self.landmark_from is not None:
+            self._landmarks = [
+                (memoryview(self.landmark_from[i]), memoryview(self.landmark_to[i]))
+                for i in range(len(self.landmark_from))
+            ]
+        self.active_landmarks = active_landmarks
+        self.snap_km = snap_km
+        self.cache_size = cache_size
+        self._cache: OrderedDict[tuple[int, int], tuple[float, np.ndarray]] = OrderedDict()
+        self.counters = {"routes": 0, "cache_hits": 0, "searches": 0, "settled": 0}
+
+    def __len__(self) -> int:
+        return len(self.latitude)
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "nodes": len(self),
+            "edges": len(self._indices),
+            "landmarks": len(self._landmarks),
+            "cached": len(self._cache),
+        }
+
+    def coordinates(self, node: int) -> tuple[float, float]:
+        return float(self.latitude[node]), float(self.longitude[node])
+
+    def nearest_node(self, lat: float, lon: float) -> int | None:
+        """Closest node within 'snap_km', widening the grid search as needed."""
+        radius = min(self.snap_km, self.cell_deg * 111.0)
+        while True:
+            idx = grid_candidates(self.cell_ids, self.cell_start, self.cell_deg, self.ncols, lat, lon, radius)
+            if len(idx):
+                distances = haversine_km(lat, lon, self.latitude[idx], self.longitude[idx])
+                best = int(np.argmin(distances))
+                if distances[best] <= radius:
+                    return int(idx[best])
+            if radius >= self.snap_km:
+                return None
+            radius = min(self.snap_km, radius * 2)
+
+    def _pick_landmarks(self, source: int, target: int) -> list:
+        """The landmarks giving the tightest bound between source and target."""
+        if not self._landmarks:
+            return []
+        with np.errstate(invalid="ignore"):
+            bounds = np.fmax(
+                self.landmark_from[:, target] - self.landmark_from[:, source],
+                self.landmark_to[:, source] - self.landmark_to[:, target],
+            )
+        best = np.argsort(-np.nan_to_num(bounds, nan=-np.inf))[:self.active_landmarks]
+        return [
+            (self._landmarks[i][0], self._landmarks[i][1], self._landmarks[i][0][target], self._landmarks[i][1][target])
+            for i in best
+        ]
+
+    def _search(self, source: int, target: int):
+        """A* from 'source' until 'target' is settled; returns (dist, parent)."""
+        x, y, z = self._xyz
+        indptr, indices, weights = self._indptr, self._indices, self._weights
+        sqrt, inf = math.sqrt, math.inf
+        gx, gy, gz = x[target], y[target], z[target]
+        landmarks = self._pick_landmarks(source, target)
+
+        def estimate(v):
+            dx, dy, dz = x[v] - gx, y[v] - gy, z[v] - gz
+            h = EARTH_RADIUS_KM * sqrt(dx * dx + dy * dy + dz * dz)
+            for dist_from, dist_to, from_goal, to_goal in landmarks:
+                # d(v, t) >= d(L, t) - d(L, v) and d(v, t) >= d(v, L) - d(t, L);
+                # inf - inf is NaN and fails both comparisons.
+                bound = from_goal - dist_from[v]
+                if bound > h:
+                    h = bound
+                bound = dist_to[v] - to_goal
+                if bound > h:
+                    h = bound
+            return h
+
+        dist = {source: 0.0}
+        parent = {source: -1}
+        heap = [(estimate(source), 0.0, source)]
+        settled = 0
+        while heap:
+            _, d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue  # superseded queue entry
+            settled += 1
+            if u == target:
+                break
+            for e in range(indptr[u], indptr[u + 1]):
+                v = indices[e]
+                nd = d + weights[e]
+                if nd < dist.get(v, inf):
+                    h = estimate(v)
+                    if h == inf:
+                        continue  # a landmark proves the target unreachable from v
+                    dist[v] = nd
+                    parent[v] = u
+                    heapq.heappush(heap, (nd + h, nd, v))
+        self.counters["searches"] += 1
+        self.counters["settled"] += settled
+        return dist, parent
+
+    def route(self, source: int, target: int) -> tuple[float, np.ndarray] | None:
+        """(length_km, node path) of the shortest route, or None if unreachable."""
+        self.counters["routes"] += 1
+        key = (source, target)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.counters["cache_hits"] += 1
+            return cached
+        dist, parent = self._search(source, target)
+        if target not in dist:
+            return None
+        path, node = [], target
+        while node != -1:
+            path.append(node)
+            node = parent[node]
+        route = (float(dist[target]), np.array(path[::-1], dtype=np.int32))
+        self._cache[key] = route
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return route
+
+    def trip(self, nodes: list[int], optimize: bool = True) -> tuple[list[int], list[tuple[float, np.ndarray]]] | None:
+        """
+        Visit order (indices into 'nodes') and per-leg routes for a trip from
+        nodes[0] to nodes[-1]. With 'optimize', intermediate stops are
+        ordered on their great-circle distance matrix before routing, so
+        only the chosen legs are searched. None when a leg is unreachable.
+        """
+        if optimize:
+            order = order_stops(distance_matrix(self.latitude[nodes], self.longitude[nodes]))
+        else:
+            order = list(range(len(nodes)))
+        legs = []
+        for a, b in zip(order, order[1:]):
+            leg = self.route(nodes[a], nodes[b])
+            if leg is None:
+                return None
+            legs.append(leg)
+        return order, legs
+
+def _parse_point(text: str) -> tuple[float, float]:
+    lat, lon = text.split(",")
+    return float(lat), float(lon)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile or query the route graph")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("compile", help="Compile node and edge CSV files")
+    build.add_argument("nodes")
+    build.add_argument("edges")
+    build.add_argument("output")
+    build.add_argument("--cell-deg", type=float, default=DEFAULT_CELL_DEG)
+    build.add_argument("--landmarks", type=int, default=DEFAULT_LANDMARKS)
+    query = sub.add_parser("route", help="Route through 'lat,lon' stops")
+    query.add_argument("graph")
+    query.add_argument("stops", nargs="+", type=_parse_point)
+    query.add_argument("--keep-order", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "compile":
+        print(compile_graph(args.nodes, args.edges, args.output, args.cell_deg, args.landmarks))
+    else:
+        graph = RouteGraph(args.graph)
+        nodes = [graph.nearest_node(lat, lon) for lat, lon in args.stops]
+        if None in nodes:
+            raise SystemExit("A stop is too far from the graph")
+        trip = graph.trip(nodes, optimize=not args.keep_order)
+        if trip is None:
+            raise SystemExit("No route")
+        order, legs = trip
+        for (a, b), (length, path) in zip(zip(order, order[1:]), legs):
+            print(f"{args.stops[a]} -> {args.stops[b]}: {length:.2f} km, {len(path)} nodes")
+        print(graph.stats())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+import calendar_mcp_server as server
+from calendar_store import CalendarStore
+
+@pytest.fixture(autouse=True)
+def memory_store(monkeypatch):
+    monkeypatch.setattr(server, "store", CalendarStore())
+
+def call(tool, **params):
+    return asyncio.run(tool(params))
+
+@pytest.mark.parametrize("count", [0, -3])
+def test_schedule_repeat_with_non_positive_count_books_once(count):
+    reply = call(server.schedule_meeting, event="standup", date="2030-01-07", time="09:00",
+                 repeat="daily", count=count)
+    assert reply == "Scheduled standup on 2030-01-07 at 09:00 (#1)."
+    assert len(server.store.calendar(server.DEFAULT_USER)) == 1
+
+def test_schedule_repeat_is_capped():
+    reply = call(server.schedule_meeting, event="standup", date="2030-01-07", time="09:00",
+                 repeat="daily", count=10_000)
+    assert f"x{server.MAX_OCCURRENCES}" in reply
+    assert len(server.store.calendar(server.DEFAULT_USER)) == server.MAX_OCCURRENCES
+
+def test_schedule_conflict_suggests_next_slot():
+    call(server.schedule_meeting, event="a", date="2030-01-07", time="09:00")
+    reply = call(server.schedule_meeting, event="b", date="2030-01-07", time="09:15")
+    assert reply.splitlines() == ["Conflicts with #1 a 2030-01-07 09:00–09:30", "Next free slot: 2030-01-07 09:30"]
+
+def test_reschedule_clamps_negative_duration():
+    call(server.schedule_meeting, event="a", date="2030-01-07", time="09:00")
+    reply = call(server.reschedule_meeting, id=1, time="10:00", duration_minutes=-45)
+    assert reply == "Rescheduled #1 a 2030-01-07 10:00–10:01"
+
+def test_find_free_slot_search_window_is_capped():
+    cal = server.store.calendar(server.DEFAULT_USER)
+    # Busy around the clock for longer than the cap.
+    server.store.add(server.DEFAULT_USER, "away", 0, 10**9)
+    reply = call(server.find_free_slot, date="2030-01-07", within_days=10**9)
+    assert reply == "No free slot found"
+    assert len(cal) == 1
@@ -0,0 +1,102 @@
+import os
+
+import pytest
+
+from calendar_store import CalendarStore, Event, UserCalendar
+
+def busy(cal: UserCalendar) -> list[tuple[int, int]]:
+    return list(zip(cal.busy_starts, cal.busy_ends))
+
+def test_add_merges_overlapping_and_touching_blocks():
+    cal = UserCalendar()
+    cal.add(Event(1, "a", 60, 90))
+    cal.add(Event(2, "b", 120, 150))
+    assert busy(cal) == [(60, 90), (120, 150)]
+    cal.add(Event(3, "c", 90, 120))
+    assert busy(cal) == [(60, 150)]
+    assert [e.id for e in cal.conflicts(100, 130)] == [3, 2]
+    assert cal.is_free(150, 180)
+    assert not cal.is_free(149, 180)
+
+def test_add_rejects_empty_or_inverted_events():
+    cal = UserCalendar()
+    with pytest.raises(ValueError):
+        cal.add(Event(1, "a", 60, 60))
+    with pytest.raises(ValueError):
+        cal.add(Event(2, "b", 60, 30))
+    assert len(cal) == 0 and busy(cal) == []
+
+def test_remove_splits_the_containing_block():
+    cal = UserCalendar()
+    for eid, start in enumerate((0, 30, 60), start=1):
+        cal.add(Event(eid, "x", start, start + 30))
+    cal.add(Event(4, "far", 500, 530))
+    assert busy(cal) == [(0, 90), (500, 530)]
+    assert cal.remove(2).id == 2
+    assert busy(cal) == [(0, 30), (60, 90), (500, 530)]
+    assert cal.remove(2) is None
+    cal.remove(4)
+    assert busy(cal) == [(0, 30), (60, 90)]
+
+def test_next_free_slot():
+    cal = UserCalendar()
+    cal.add(Event(1, "a", 60, 120))
+    cal.add(Event(2, "b", 130, 200))
+    assert cal.next_free_slot(0, 60) == 0
+    assert cal.next_free_slot(30, 30) == 30
+    assert cal.next_free_slot(40, 30) == 200
+    assert cal.next_free_slot(90, 10) == 120
+    assert cal.next_free_slot(90, 11) == 200
+    assert cal.next_free_slot(90, 30, before=220) is None
+
+def test_store_rejects_inverted_events_before_logging(tmp_path):
+    store = CalendarStore(str(tmp_path))
+    with pytest.raises(ValueError):
+        store.add("u", "bad", 100, 90)
+    event = store.add("u", "ok", 100, 130)
+    with pytest.raises(ValueError):
+        store.move("u", event.id, 200, 150)
+    store.close()
+
+    recovered = CalendarStore(str(tmp_path))
+    assert list(recovered.calendar("u").events.values()) == [event]
+    recovered.close()
+
+def test_recovery_replays_snapshot_and_log(tmp_path):
+    store = CalendarStore(str(tmp_path), snapshot_every=3)
+    a = store.add("alice", "standup", 540, 555)
+    b = store.add("alice", "lunch", 720, 780)
+    store.add("bob", "review", 600, 660)  # third entry: snapshot
+    store.move("alice", a.id, 545, 560)
+    store.remove("alice", b.id)
+    c = store.add("alice", "retro", 900, 960)
+    store.close()
+
+    recovered = CalendarStore(str(tmp_path), snapshot_every=3)
+    alice = recovered.calendar("alice")
+    assert sorted(alice.events) == [a.id, c.id]
+    assert alice.events[a.id].start == 545
+    assert busy(alice) == [(545, 560), (900, 960)]
+    assert len(recovered.calendar("bob")) == 1
+    assert recovered.add("bob", "next", 0, 10).id == c.id + 1
+    recovered.close()
+
+def test_recovery_truncates_a_torn_final_line(tmp_path):
+    store = CalendarStore(str(tmp_path))
+    first = store.add("u", "kept", 60, 90)
+    store.close()
+    log_path = os.path.join(tmp_path, "calendar.log")
+    with open(log_path, "a", encoding="utf-8") as f:
+        f.write('{"op":"add","user":"u","event":[2,"torn",1')
+
+    # Appends after recovery must survive another restart.
+    store = CalendarStore(str(tmp_path))
+    assert list(store.calendar("u").events) == [first.id]
+    second = store.add("u", "after", 120, 150)
+    store.close()
+
+    recovered = CalendarStore(str(tmp_path))
+    assert sorted(recovered.calendar("u").events) == [first.id, second.id]
+    recovered.close()
+    with open(log_path, encoding="utf-8") as f:
+        assert "torn" not in f.read()
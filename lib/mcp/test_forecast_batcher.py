@@ -0,0 +1,101 @@
+import asyncio
+
+from forecast_batcher import ForecastBatcher
+
+class FakeUpstream:
+    """Records each batch and answers with one result per point."""
+
+    def __init__(self, fail: bool = False, delay: float = 0.0):
+        self.batches = []
+        self.fail = fail
+        self.delay = delay
+        self.cancelled = 0
+
+    async def __call__(self, points):
+        self.batches.append(points)
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise RuntimeError("upstream down")
+        return [{"point": p} for p in points]
+
+def test_calls_within_the_window_share_one_request():
+    upstream = FakeUpstream()
+    batcher = ForecastBatcher(upstream, window=0.01)
+
+    async def run():
+        return await asyncio.gather(
+            batcher.fetch(1.0, 2.0), batcher.fetch(3.0, 4.0), batcher.fetch(1.0, 2.0),
+        )
+
+    results = asyncio.run(run())
+    assert upstream.batches == [[(1.0, 2.0), (3.0, 4.0)]]
+    assert [r["point"] for r in results] == [(1.0, 2.0), (3.0, 4.0), (1.0, 2.0)]
+    stats = batcher.stats()
+    assert stats["requests"] == 3 and stats["coalesced"] == 1 and stats["pending"] == 0
+
+def test_full_batch_is_sent_without_waiting_for_the_window():
+    upstream = FakeUpstream()
+    batcher = ForecastBatcher(upstream, window=60, max_batch=2)
+
+    async def run():
+        return await asyncio.wait_for(
+            asyncio.gather(*(batcher.fetch(float(i), 0.0) for i in range(4))), timeout=1,
+        )
+
+    assert len(asyncio.run(run())) == 4
+    assert [len(b) for b in upstream.batches] == [2, 2]
+    assert batcher.stats()["largest_batch"] == 2
+
+def test_failed_or_short_batches_yield_none():
+    batcher = ForecastBatcher(FakeUpstream(fail=True), window=0)
+
+    async def run():
+        return await asyncio.gather(batcher.fetch(1.0, 1.0), batcher.fetch(2.0, 2.0))
+
+    assert asyncio.run(run()) == [None, None]
+
+    async def short(points):
+        return [{}]
+
+    batcher = ForecastBatcher(short, window=0)
+    assert asyncio.run(run()) == [None, None]
+    assert batcher.stats()["errors"] == 1
+
+def test_abandoned_points_are_dropped_or_cancelled():
+    upstream = FakeUpstream(delay=10)
+    batcher = ForecastBatcher(upstream, window=0.01)
+
+    async def run():
+        # Gives up before the batch is sent: never requested.
+        early = asyncio.create_task(batcher.fetch(1.0, 1.0))
+        await asyncio.sleep(0)
+        early.cancel()
+        # Gives up after the batch is sent: the request is cancelled.
+        late = asyncio.create_task(batcher.fetch(2.0, 2.0))
+        await asyncio.sleep(0.05)
+        late.cancel()
+        await asyncio.gather(early, late, return_exceptions=True)
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert upstream.batches == [[(2.0, 2.0)]]
+    assert upstream.cancelled == 1
+    assert batcher.stats()["abandoned"] == 2
+
+def test_coalesced_caller_keeps_the_point_alive():
+    upstream = FakeUpstream(delay=0.01)
+    batcher = ForecastBatcher(upstream, window=0.01)
+
+    async def run():
+        first = asyncio.create_task(batcher.fetch(1.0, 1.0))
+        second = asyncio.create_task(batcher.fetch(1.0, 1.0))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == {"point": (1.0, 1.0)}
+    assert batcher.stats()["abandoned"] == 0
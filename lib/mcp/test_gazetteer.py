@@ -0,0 +1,69 @@
+import pytest
+
+from gazetteer import KEY_WIDTH, Gazetteer, compile_gazetteer, parse_query
+
+LONG = "Llanfairpwllgwyngyllgogerychwyrndrobwllllantysiliogogogoch"
+
+CITIES = [
+    # geonameid, name, asciiname, alternates, lat, lon, country, admin1, population
+    (1, LONG, LONG, "", 53.22, -4.21, "GB", "WLS", 3000),
+    (2, LONG + "XX", LONG + "XX", "", 10.0, 10.0, "GB", "ENG", 50000),
+    (3, "Berlin", "Berlin", "Berlino,Berlijn", 52.52, 13.41, "DE", "16", 3426354),
+    (4, "Paris", "Paris", "", 48.85, 2.35, "FR", "11", 2138551),
+    (5, "Paris", "Paris", "", 33.66, -95.56, "US", "TX", 25171),
+    (6, "Parma", "Parma", "", 44.80, 10.33, "IT", "45", 146299),
+    (7, "Bergen", "Bergen", "", 60.39, 5.32, "NO", "46", 213585),
+]
+
+@pytest.fixture(scope="module")
+def gazetteer(tmp_path_factory) -> Gazetteer:
+    root = tmp_path_factory.mktemp("gazetteer")
+    with open(root / "cities.txt", "w", encoding="utf-8") as f:
+        for gid, name, ascii_name, alternates, lat, lon, cc, admin1, pop in CITIES:
+            fields = [str(gid), name, ascii_name, alternates, str(lat), str(lon), "P", "PPL",
+                      cc, "", admin1, "", "", "", str(pop), "", "", "", ""]
+            f.write("\t".join(fields) + "\n")
+    (root / "admin1.txt").write_text("US.TX\tTexas\tTexas\t4736286\n", encoding="utf-8")
+    assert compile_gazetteer(str(root / "cities.txt"), str(root / "gazetteer.bin"),
+                             admin1_path=str(root / "admin1.txt")) == len(CITIES)
+    return Gazetteer(str(root / "gazetteer.bin"))
+
+def test_parse_query():
+    assert parse_query("Paris, TX") == ("Paris", ["tx"])
+    assert parse_query(" Springfield , Illinois, US ,") == ("Springfield", ["illinois", "us"])
+
+def test_resolve_prefers_the_most_populous_match(gazetteer):
+    assert gazetteer.resolve("paris").country_code == "FR"
+    assert gazetteer.resolve("Nowhere") is None
+    assert gazetteer.resolve("  ") is None
+
+def test_resolve_city_with_state_or_country(gazetteer):
+    assert gazetteer.resolve("Paris, TX").country_code == "US"
+    assert gazetteer.resolve("Paris, Texas").country_code == "US"
+    assert gazetteer.resolve("Paris, US").admin1 == "TX"
+    assert gazetteer.resolve("Paris, FR").admin1 == "11"
+    assert gazetteer.resolve("Paris, DE") is None
+
+def test_resolve_alternate_names(gazetteer):
+    assert gazetteer.resolve("Berlino").name == "Berlin"
+    assert gazetteer.resolve("BERLIJN, DE").name == "Berlin"
+
+def test_long_names_are_told_apart_by_the_sidecar(gazetteer):
+    assert len(LONG.encode()) > KEY_WIDTH
+    assert gazetteer.resolve(LONG).population == 3000
+    assert gazetteer.resolve(LONG + "XX").population == 50000
+    # The cut-off stored key alone is not a name.
+    assert gazetteer.resolve(LONG[:KEY_WIDTH]) is None
+    assert gazetteer.resolve(LONG + "X") is None
+
+def test_search_by_prefix_largest_first(gazetteer):
+    assert [p.name for p in gazetteer.search("par")] == ["Paris", "Parma", "Paris"]
+    assert [p.name for p in gazetteer.search("par", limit=1)] == ["Paris"]
+    assert [p.country_code for p in gazetteer.search("Par, TX")] == ["US"]
+    assert [p.name for p in gazetteer.search("ber")] == ["Berlin", "Bergen"]
+    assert gazetteer.search("") == []
+
+def test_search_past_the_key_width(gazetteer):
+    assert [p.population for p in gazetteer.search(LONG[:KEY_WIDTH + 5])] == [50000, 3000]
+    assert [p.population for p in gazetteer.search(LONG + "X")] == [50000]
+    assert gazetteer.search(LONG + "Y") == []
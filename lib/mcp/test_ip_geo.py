@@ -0,0 +1,81 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+import geolocation_mcp_server
+from ip_geo import IpGeo, _flatten, compile_ranges
+from mcp_schema import InvalidParams
+
+RANGES = """\
+network,country,region,city,lat,lon
+10.0.0.0/8,US,CA,Outer,1,1
+10.0.0.0,10.0.0.255,US,NY,Inner,2,2
+10.5.0.0/16,US,TX,Mid,3,3
+10.5.5.0/24,US,TX,Deep,4,4
+192.168.0.0,192.168.0.255,DE,BE,First,5,5
+192.168.0.128,192.168.1.127,FR,IDF,Second,6,6
+2001:db8::/32,JP,13,Outer6,7,7
+2001:db8:1::/48,JP,27,Inner6,8,8
+255.255.255.0/24,ZZ,,Top,9,9
+"""
+
+@pytest.fixture
+def db(tmp_path) -> IpGeo:
+    csv_path = tmp_path / "ranges.csv"
+    csv_path.write_text(RANGES)
+    compile_ranges(str(csv_path), str(tmp_path / "ranges.bin"))
+    return IpGeo(str(tmp_path / "ranges.bin"))
+
+def cities(db: IpGeo, ips: list[str]) -> list[str | None]:
+    return [loc and loc["city"] for loc in db.lookup_many(ips)]
+
+def test_flatten_nested_ranges_most_specific_wins():
+    assert _flatten([(0, 99, 0), (10, 19, 1), (12, 13, 2)]) == [
+        (0, 9, 0), (10, 11, 1), (12, 13, 2), (14, 19, 1), (20, 99, 0),
+    ]
+
+def test_flatten_partial_overlap_goes_to_the_later_of_equal_sizes():
+    assert _flatten([(0, 9, 0), (5, 14, 1)]) == [(0, 4, 0), (5, 14, 1)]
+
+def test_flatten_merges_adjacent_pieces_and_keeps_gaps():
+    assert _flatten([(0, 4, 0), (5, 9, 0), (20, 29, 1)]) == [(0, 9, 0), (20, 29, 1)]
+    assert _flatten([]) == []
+
+def test_nested_ipv4_ranges(db):
+    assert cities(db, ["10.1.0.5", "10.0.0.5", "10.0.1.0", "10.5.5.9", "10.5.6.1", "10.255.255.255"]) == [
+        "Outer", "Inner", "Outer", "Deep", "Mid", "Outer",
+    ]
+
+def test_overlapping_ipv4_ranges_and_edges(db):
+    assert cities(db, ["192.168.0.10", "192.168.0.200", "192.168.1.100", "9.255.255.255", "11.0.0.0"]) == [
+        "First", "Second", "Second", None, None,
+    ]
+    assert cities(db, ["255.255.255.255"]) == ["Top"]
+
+def test_ipv6_and_ipv4_mapped_lookups(db):
+    assert cities(db, ["2001:db8::1", "2001:db8:1::5", "2001:db8:2::", "2001:db9::"]) == [
+        "Outer6", "Inner6", "Outer6", None,
+    ]
+    assert cities(db, ["::ffff:10.0.0.5", "::ffff:10.1.0.5"]) == ["Inner", "Outer"]
+
+def test_invalid_addresses_are_misses(db):
+    assert cities(db, ["not-an-ip", "", "10.0.0.256"]) == [None, None, None]
+    assert db.stats()["lookups"] == 3
+
+def test_replaced_file_is_reloaded(db, tmp_path):
+    (tmp_path / "other.csv").write_text("10.0.0.0/8,US,CA,Replaced,1,1\n")
+    compile_ranges(str(tmp_path / "other.csv"), str(tmp_path / "ranges.bin"))
+    os.utime(tmp_path / "ranges.bin", ns=(0, 0))
+    db._checked = float("-inf")
+    assert cities(db, ["10.0.0.5"]) == ["Replaced"]
+    assert db.stats()["reloads"] == 1
+
+def test_get_locations_rejects_non_string_entries():
+    with pytest.raises(InvalidParams):
+        asyncio.run(geolocation_mcp_server.get_locations({"ips": ["127.0.0.1", {}]}))
+    reply = asyncio.run(geolocation_mcp_server.get_locations({"ips": "127.0.0.1, 10.0.0.1"}))
+    assert json.loads(reply)["127.0.0.1"]["city"] == "San Francisco"
+    too_many = ["127.0.0.1"] * (geolocation_mcp_server.MAX_BATCH_IPS + 1)
+    assert asyncio.run(geolocation_mcp_server.get_locations({"ips": too_many})).startswith("Too many")
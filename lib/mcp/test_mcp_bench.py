@@ -0,0 +1,45 @@
+import random
+
+import pytest
+
+from fake_open_meteo import forecast_result, geocode_result
+from mcp_bench import TOOL_SERVER, Recorder, parse_mix, percentile, tool_params
+
+def test_parse_mix():
+    assert parse_mix("get-forecast=3,get-joke") == {"get-forecast": 3.0, "get-joke": 1.0}
+    with pytest.raises(SystemExit):
+        parse_mix("get-forecast,no-such-tool=2")
+
+def test_percentile():
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 0.5) == 51.0
+    assert percentile(values, 0.99) == 100.0
+    assert percentile(values, 1.0) == 100.0
+    assert percentile([], 0.5) == 0.0
+
+def test_recorder_ignores_warmup_and_counts_errors():
+    recorder = Recorder()
+    recorder.record("get-joke", 5.0, False)
+    recorder.recording = True
+    for ms in (1, 2, 3, 4):
+        recorder.record("get-joke", ms / 1000, ms != 4)
+    recorder.record("get-forecast", 0.010, True)
+    summary = recorder.summary(elapsed=2.0)
+    assert summary["overall"]["requests"] == 5 and summary["overall"]["errors"] == 1
+    joke = summary["tools"]["get-joke"]
+    assert joke["error_rate"] == 0.25 and joke["throughput_rps"] == 2.0
+    assert joke["p50_ms"] == 3.0 and joke["max_ms"] == 4.0
+
+def test_tool_params_are_reproducible_for_a_seed():
+    for tool in TOOL_SERVER:
+        first = [tool_params(tool, random.Random(42)) for _ in range(3)]
+        assert first[0] == first[1] == first[2]
+
+def test_fake_open_meteo_is_deterministic():
+    assert geocode_result("Berlin") == geocode_result("berlin") | {"name": "Berlin"}
+    query = {"forecast_days": "3", "daily": "temperature_2m_max,precipitation_sum", "current_weather": "true"}
+    first = forecast_result(52.52, 13.41, query)
+    assert first == forecast_result(52.52, 13.41, query)
+    assert len(first["daily"]["time"]) == 3 and len(first["daily"]["precipitation_sum"]) == 3
+    assert "hourly" not in first
+    assert first["daily"] != forecast_result(48.85, 2.35, query)["daily"]
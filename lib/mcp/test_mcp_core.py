@@ -0,0 +1,83 @@
+from http import HTTPStatus
+from types import SimpleNamespace
+
+import pytest
+from websockets.protocol import State
+
+import mcp_core
+from mcp_core import RATE_LIMITED, McpServer, TokenBucket
+
+class FakeConnection:
+    """Just enough of a websockets ServerConnection for the handshake hooks."""
+
+    def __init__(self):
+        self.protocol = SimpleNamespace(state=State.CONNECTING)
+
+    def respond(self, status, text):
+        return SimpleNamespace(status_code=status, headers={}, body=text)
+
+def handshake(server: McpServer):
+    return server.process_request(FakeConnection(), SimpleNamespace(path="/"))
+
+def test_connection_cap_counts_handshakes_in_flight():
+    server = McpServer(max_connections=2)
+    # Neither handshake has reached handle_connection yet.
+    assert handshake(server) is None
+    assert handshake(server) is None
+    refused = handshake(server)
+    assert refused.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert "Retry-After" in refused.headers
+
+def test_refused_or_dead_handshakes_release_their_slot():
+    server = McpServer(max_connections=1)
+    first = FakeConnection()
+    assert server.process_request(first, SimpleNamespace(path="/")) is None
+    server.process_response(first, None, SimpleNamespace(status_code=HTTPStatus.BAD_REQUEST))
+    second = FakeConnection()
+    assert server.process_request(second, SimpleNamespace(path="/")) is None
+    # A handshake that died without a response (e.g. open_timeout).
+    second.protocol.state = State.CLOSED
+    assert handshake(server) is None
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(mcp_core.time, "monotonic", lambda: now[0])
+    return now
+
+def test_token_bucket_bursts_then_refills(clock):
+    bucket = TokenBucket(rate=2.0, capacity=4)
+    assert all(bucket.take() for _ in range(4))
+    assert not bucket.take()
+    assert bucket.retry_after() == pytest.approx(0.5)
+    clock[0] += 0.25
+    assert not bucket.take()
+    clock[0] += 0.25
+    assert bucket.take()
+    assert not bucket.take()
+    assert bucket.retry_after(3) == pytest.approx(1.5)
+
+def test_token_bucket_refill_is_capped_at_capacity(clock):
+    bucket = TokenBucket(rate=10.0, capacity=3)
+    bucket.take(3)
+    clock[0] += 3600
+    assert bucket.take(3)
+    assert not bucket.take()
+
+def test_token_bucket_oversized_batch_costs_the_whole_burst(clock):
+    bucket = TokenBucket(rate=1.0, capacity=5)
+    assert bucket.take(50)
+    assert bucket.tokens == 0
+    assert not bucket.take(50)
+    assert bucket.retry_after(50) == pytest.approx(5.0)
+    clock[0] += 5
+    assert bucket.take(50)
+
+def test_rate_limited_replies_only_to_requests_with_ids():
+    server = McpServer()
+    batch = [{"id": 1, "method": "a"}, {"method": "notify"}, {"id": 2, "method": "b"}]
+    errors = server.rate_limited(batch, 0.25)
+    assert [e["id"] for e in errors] == [1, 2]
+    assert errors[0]["error"] == {"code": RATE_LIMITED, "message": "Rate limit exceeded", "data": {"retry_after_ms": 250}}
+    assert server.rate_limited({"method": "notify"}, 1.0) is None
+    assert server.rate_limited([{"method": "notify"}], 1.0) is None
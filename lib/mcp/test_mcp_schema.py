@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from mcp_core import McpServer
+from mcp_schema import InvalidParams, compile_schema, json_schema
+
+SCHEMA = {
+    "city": {"type": "string", "description": "City name", "required": True},
+    "days": {"type": "integer", "description": "Days"},
+    "radius": {"type": "number", "description": "Radius"},
+    "metric": {"type": "boolean", "description": "Metric units"},
+    "stops": {"type": "array", "description": "Stops"},
+    "options": {"type": "object", "description": "Options"},
+}
+
+validate = compile_schema(SCHEMA)
+
+def test_values_are_coerced_to_their_declared_types():
+    params = validate({"city": 10115, "days": "3", "radius": "2.5", "metric": "Yes",
+                       "stops": ("a", "b"), "options": {}, "extra": [1]})
+    assert params == {"city": "10115", "days": 3, "radius": 2.5, "metric": True,
+                      "stops": ["a", "b"], "options": {}, "extra": [1]}
+    assert validate({"city": "Oslo", "days": 2.0, "radius": 1, "metric": 0, "stops": "a;b"}) == {
+        "city": "Oslo", "days": 2, "radius": 1.0, "metric": False, "stops": "a;b",
+    }
+
+def test_nulls_count_as_absent():
+    assert validate({"city": "Oslo", "days": None}) == {"city": "Oslo"}
+    with pytest.raises(InvalidParams, match="'city' is required"):
+        validate({"city": None})
+    assert compile_schema({})(None) == {}
+
+@pytest.mark.parametrize("params, message", [
+    ({"city": True}, "'city' must be a string"),
+    ({"city": "x", "days": "three"}, "'days' must be an integer"),
+    ({"city": "x", "days": 2.5}, "'days' must be an integer"),
+    ({"city": "x", "days": False}, "'days' must be an integer"),
+    ({"city": "x", "radius": "far"}, "'radius' must be a number"),
+    ({"city": "x", "radius": "nan"}, "'radius' must be a finite number"),
+    ({"city": "x", "radius": [1]}, "'radius' must be a number"),
+    ({"city": "x", "metric": 2}, "'metric' must be a boolean"),
+    ({"city": "x", "metric": "maybe"}, "'metric' must be a boolean"),
+    ({"city": "x", "stops": {"a": 1}}, "'stops' must be an array"),
+    ({"city": "x", "options": []}, "'options' must be an object"),
+    ({}, "'city' is required"),
+    (["Oslo"], "params must be an object"),
+])
+def test_bad_params_are_rejected(params, message):
+    with pytest.raises(InvalidParams, match=message):
+        validate(params)
+
+def test_unsupported_types_fail_at_registration():
+    with pytest.raises(ValueError):
+        compile_schema({"when": {"type": "date"}})
+
+def test_json_schema_lists_required_properties():
+    schema = json_schema(SCHEMA)
+    assert schema["required"] == ["city"]
+    assert schema["properties"]["city"] == {"type": "string", "description": "City name"}
+    assert "required" not in json_schema({"days": {"type": "integer"}})
+
+@pytest.fixture
+def server():
+    calls = []
+
+    async def weather(params):
+        calls.append(params)
+        return f"{params['city']} x{params.get('days', 1)}"
+
+    server = McpServer()
+    server.tool("get-weather", "Weather", SCHEMA, weather)
+    server.calls = calls
+    yield server
+    server.close()
+
+def dispatch(server: McpServer, method: str, params, request_id=1) -> dict:
+    return asyncio.run(server.dispatch({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}))
+
+def test_invalid_params_reply_with_32602_before_the_callback_runs(server):
+    response = dispatch(server, "get-weather", {"city": "Oslo", "days": "many"})
+    assert response["error"]["code"] == -32602
+    assert "'days' must be an integer" in response["error"]["message"]
+    response = dispatch(server, "tools/call", {"name": "get-weather", "arguments": {"days": 2}})
+    assert response["error"]["code"] == -32602
+    response = dispatch(server, "tools/call", {"name": "no-such-tool", "arguments": {}})
+    assert response["error"] == {"code": -32602, "message": "Invalid params: Unknown tool: no-such-tool"}
+    assert server.calls == []
+
+def test_valid_params_reach_the_callback_coerced(server):
+    response = dispatch(server, "tools/call", {"name": "get-weather", "arguments": {"city": "Oslo", "days": "2"}})
+    assert response["result"]["content"][0]["text"] == "Oslo x2"
+    assert server.calls == [{"city": "Oslo", "days": 2}]
+
+def test_discovery_is_cached_until_a_tool_is_registered(server):
+    listing = asyncio.run(server.list_tools({}))
+    assert asyncio.run(server.list_tools({})) is listing
+
+    async def echo(params):
+        return ""
+
+    server.tool("echo", "Echo", {}, echo)
+    fresh = asyncio.run(server.list_tools({}))
+    assert fresh is not listing
+    tools = dispatch(server, "tools/list", {})["result"].value["tools"]
+    assert [t["name"] for t in tools] == ["get-weather", "echo"]
+    assert tools[0]["inputSchema"]["required"] == ["city"]
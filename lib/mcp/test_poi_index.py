@@ -0,0 +1,74 @@
+import csv
+import json
+
+import numpy as np
+import pytest
+
+from poi_index import PoiIndex, compile_pois, haversine_km
+
+POIS = [
+    ("Cafe A", "cafe", 52.5200, 13.4050),
+    ("Cafe B", "Cafe", 52.5300, 13.4050),
+    ("Pharmacy", "pharmacy", 52.5210, 13.4060),
+    ("Far Cafe", "cafe", 52.6000, 13.4050),
+    ("Bakery", "bakery", 52.5195, 13.4000),
+    ("Broken", "cafe", "", 13.4),
+]
+
+def write_csv(path, rows):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["name", "category", "latitude", "longitude"])
+        writer.writerows(rows)
+
+@pytest.fixture
+def index(tmp_path) -> PoiIndex:
+    write_csv(tmp_path / "pois.csv", POIS)
+    assert compile_pois(str(tmp_path / "pois.csv"), str(tmp_path / "pois.bin")) == len(POIS) - 1
+    return PoiIndex(str(tmp_path / "pois.bin"))
+
+def names(results: list[dict]) -> list[str]:
+    return [r["name"] for r in results]
+
+def test_nearest_is_sorted_by_distance(index):
+    results = index.nearest(52.52, 13.405, radius_km=20, k=10)
+    assert names(results) == ["Cafe A", "Pharmacy", "Bakery", "Cafe B", "Far Cafe"]
+    distances = [r["distance_km"] for r in results]
+    assert distances == sorted(distances) and distances[0] == 0.0
+
+def test_nearest_radius_and_k(index):
+    assert names(index.nearest(52.52, 13.405, radius_km=1.2)) == ["Cafe A", "Pharmacy", "Bakery", "Cafe B"]
+    assert names(index.nearest(52.52, 13.405, radius_km=20, k=2)) == ["Cafe A", "Pharmacy"]
+    assert index.nearest(0, 0, radius_km=50) == []
+
+def test_nearest_category_filter(index):
+    assert names(index.nearest(52.52, 13.405, radius_km=20, category="Cafes")) == ["Cafe A", "Cafe B", "Far Cafe"]
+    assert names(index.nearest(52.52, 13.405, category="pharmacies")) == ["Pharmacy"]
+    assert index.nearest(52.52, 13.405, category="museum") == []
+
+def test_geojson_input_and_antimeridian(tmp_path):
+    features = [
+        {"type": "Feature", "geometry": {"type": "Point", "coordinates": [179.99, -16.5]},
+         "properties": {"name": "East", "amenity": "hotel"}},
+        {"type": "Feature", "geometry": {"type": "Point", "coordinates": [-179.99, -16.5]},
+         "properties": {"name": "West", "amenity": "hotel"}},
+        {"type": "Feature", "geometry": {"type": "LineString", "coordinates": [[0, 0], [1, 1]]}},
+    ]
+    (tmp_path / "pois.geojson").write_text(json.dumps({"type": "FeatureCollection", "features": features}))
+    assert compile_pois(str(tmp_path / "pois.geojson"), str(tmp_path / "pois.bin")) == 2
+    index = PoiIndex(str(tmp_path / "pois.bin"))
+    assert names(index.nearest(-16.5, 179.999, radius_km=5)) == ["East", "West"]
+
+def test_grid_search_matches_brute_force(tmp_path):
+    rng = np.random.default_rng(7)
+    lats = rng.uniform(40.0, 41.0, 2000)
+    lons = rng.uniform(-74.5, -73.5, 2000)
+    write_csv(tmp_path / "pois.csv", [(f"p{i}", "x", lat, lon) for i, (lat, lon) in enumerate(zip(lats, lons))])
+    compile_pois(str(tmp_path / "pois.csv"), str(tmp_path / "pois.bin"), cell_deg=0.05)
+    index = PoiIndex(str(tmp_path / "pois.bin"))
+    for lat, lon, radius in [(40.5, -74.0, 3.0), (40.02, -74.48, 8.0), (40.7, -73.6, 0.5)]:
+        distances = haversine_km(lat, lon, lats.astype(np.float32).astype(np.float64),
+                                 lons.astype(np.float32).astype(np.float64))
+        expected = np.argsort(distances)[:10]
+        expected = [f"p{i}" for i in expected if distances[i] <= radius]
+        assert names(index.nearest(lat, lon, radius_km=radius, k=10)) == expected
@@ -0,0 +1,116 @@
+import csv
+import itertools
+
+import numpy as np
+import pytest
+
+from route_planner import EXACT_STOPS, RouteGraph, _dijkstra, compile_graph, distance_matrix, order_stops
+
+SIDE = 6
+
+def write_grid(tmp_path, seed: int = 3):
+    """
+    A SIDE x SIDE street grid (~1 km blocks) with detours on random edges,
+    a few one-way streets and one node nothing connects to.
+    """
+    rng = np.random.default_rng(seed)
+    with open(tmp_path / "nodes.csv", "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "latitude", "longitude"])
+        for r, c in itertools.product(range(SIDE), range(SIDE)):
+            writer.writerow([f"n{r}_{c}", 48.0 + r * 0.009, 11.0 + c * 0.0135])
+        writer.writerow(["island", 48.2, 11.2])
+    with open(tmp_path / "edges.csv", "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["source", "target", "distance_km", "oneway"])
+        for r, c in itertools.product(range(SIDE), range(SIDE)):
+            for dr, dc in ((0, 1), (1, 0)):
+                if r + dr < SIDE and c + dc < SIDE:
+                    detour = round(float(rng.uniform(1.0, 3.0)), 3)
+                    oneway = "yes" if rng.random() < 0.15 else ""
+                    writer.writerow([f"n{r}_{c}", f"n{r + dr}_{c + dc}", detour, oneway])
+        # No length given: the great-circle distance is used.
+        writer.writerow(["n0_0", f"n{SIDE - 1}_{SIDE - 1}", "", "yes"])
+
+@pytest.fixture(params=[0, 4], ids=["astar", "alt"])
+def graph(request, tmp_path) -> RouteGraph:
+    write_grid(tmp_path)
+    info = compile_graph(str(tmp_path / "nodes.csv"), str(tmp_path / "edges.csv"), str(tmp_path / "graph.bin"),
+                         landmarks=request.param)
+    assert info["nodes"] == SIDE * SIDE + 1 and info["landmarks"] == request.param
+    return RouteGraph(str(tmp_path / "graph.bin"), cache_size=8)
+
+def path_length(graph: RouteGraph, path) -> float:
+    total = 0.0
+    for u, v in zip(path, path[1:]):
+        edges = range(graph._indptr[u], graph._indptr[u + 1])
+        total += min(graph._weights[e] for e in edges if graph._indices[e] == v)
+    return total
+
+def tour_cost(matrix, tour) -> float:
+    return float(sum(matrix[a, b] for a, b in zip(tour, tour[1:])))
+
+def test_routes_match_dijkstra_on_every_pair(graph):
+    csr = (list(graph._indptr), list(graph._indices), list(graph._weights))
+    for source in range(len(graph)):
+        expected = _dijkstra(*csr, source)
+        for target in range(len(graph)):
+            route = graph.route(source, target)
+            if not np.isfinite(expected[target]):
+                assert route is None
+                continue
+            length, path = route
+            assert length == pytest.approx(expected[target], rel=1e-6)
+            assert path[0] == source and path[-1] == target
+            assert path_length(graph, path) == pytest.approx(length, rel=1e-6)
+
+def test_route_cache_is_bounded(graph):
+    for target in range(20):
+        graph.route(0, target)
+    assert graph.route(0, 19) is graph.route(0, 19)
+    assert graph.stats()["cache_hits"] == 2
+    graph.route(0, 0)  # evicted, searched again
+    stats = graph.stats()
+    assert stats["cached"] == 8 and stats["cache_hits"] == 2 and stats["searches"] == 21
+
+def test_nearest_node_snaps_within_range(graph):
+    node = graph.nearest_node(48.0001, 11.0001)
+    assert graph.coordinates(node) == pytest.approx((48.0, 11.0))
+    assert graph.nearest_node(10.0, 10.0) is None
+
+def test_order_stops_exact_for_few_stops():
+    rng = np.random.default_rng(11)
+    points = rng.uniform(0, 1, (EXACT_STOPS + 2, 2))
+    matrix = distance_matrix(points[:, 0], points[:, 1])
+    order = order_stops(matrix)
+    n = len(points)
+    best = min(tour_cost(matrix, [0, *p, n - 1]) for p in itertools.permutations(range(1, n - 1)))
+    assert order[0] == 0 and order[-1] == n - 1
+    assert tour_cost(matrix, order) == pytest.approx(best)
+    assert order_stops(matrix[:3, :3]) == [0, 1, 2]
+
+def test_order_stops_two_opt_leaves_no_improving_reversal():
+    rng = np.random.default_rng(5)
+    points = rng.uniform(0, 1, (30, 2))
+    matrix = distance_matrix(points[:, 0], points[:, 1])
+    order = order_stops(matrix)
+    n = len(points)
+    assert order[0] == 0 and order[-1] == n - 1 and sorted(order) == list(range(n))
+    cost = tour_cost(matrix, order)
+    for i in range(1, n - 2):
+        for j in range(i + 1, n - 1):
+            reversed_tour = order[:i] + order[i:j + 1][::-1] + order[j + 1:]
+            assert tour_cost(matrix, reversed_tour) >= cost - 1e-9
+    assert cost <= tour_cost(matrix, list(range(n)))
+
+def test_trip_orders_stops_and_chains_legs(graph):
+    corners = [graph.nearest_node(48.0 + r * 0.009, 11.0 + c * 0.0135)
+               for r, c in [(0, 0), (5, 5), (0, 1), (5, 4), (0, 5)]]
+    order, legs = graph.trip(corners)
+    assert order[0] == 0 and order[-1] == len(corners) - 1
+    for (a, b), (_, path) in zip(zip(order, order[1:]), legs):
+        assert path[0] == corners[a] and path[-1] == corners[b]
+    matrix = distance_matrix(graph.latitude[corners], graph.longitude[corners])
+    assert tour_cost(matrix, order) <= tour_cost(matrix, range(len(corners)))
+    assert graph.trip(corners, optimize=False)[0] == list(range(len(corners)))
+    assert graph.trip([corners[0], graph.nearest_node(48.2, 11.2)]) is None
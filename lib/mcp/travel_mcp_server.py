@@ -1,67 +1,116 @@
 import asyncio
-import json
-from websockets import serve
+import logging
+import os
 
-class McpServer:
-    def __init__(self):
-        self.tools: dict[str, dict] = {}
-        self.pending_requests: dict = {}
+from gazetteer import Gazetteer
+from mcp_core import McpServer
+from mcp_logging import setup_logging
+from mcp_metrics import metrics
+from route_planner import RouteGraph
 
-    def tool(self, name: str, description: str, input_schema: dict, callback):
-        self.tools[name] = {
-            "description": description,
-            "input_schema": input_schema,
-            "callback": callback,
-        }
+logger = logging.getLogger(__name__)
 
-    async def handle_connection(self, websocket):
-        print(f"New connection from {websocket.remote_address}")
-        async for message in websocket:
-            try:
-                print(f"Received: {message}")
-                data = json.loads(message)
-                request_id = data.get("id")
-                method = data.get("method")
-                params = data.get("params", {})
+# Compiled road graph (`python route_planner.py compile nodes.csv edges.csv
+# graph.bin`) and the optional gazetteer used to turn city names into
+# coordinates. Stops are snapped to the nearest node within MCP_ROUTE_SNAP_KM.
+ROUTE_GRAPH = os.environ.get("MCP_ROUTE_GRAPH")
+GAZETTEER_PATH = os.environ.get("MCP_GAZETTEER")
+ROUTE_CACHE_SIZE = int(os.environ.get("MCP_ROUTE_CACHE", "1024"))
+SNAP_KM = float(os.environ.get("MCP_ROUTE_SNAP_KM", "25"))
+# Route searches are CPU-bound pure Python, so by default they run in the
+# server's process pool; each pool worker maps the same graph file and keeps
+# its own route cache. "thread" keeps them in this process.
+ROUTE_MODE = os.environ.get("MCP_ROUTE_MODE", "process")
+MAX_STOPS = 12
+route_graph = RouteGraph(ROUTE_GRAPH, cache_size=ROUTE_CACHE_SIZE, snap_km=SNAP_KM) if ROUTE_GRAPH else None
+gazetteer = Gazetteer(GAZETTEER_PATH) if GAZETTEER_PATH else None
+if route_graph is not None:
+    if ROUTE_MODE == "process":
+        # Search and cache counters live in the pool workers; the resolve and
+        # route phase timings of each call come back with its result.
+        metrics.add_collector("routes", lambda: {
+            k: v for k, v in route_graph.stats().items() if k in ("nodes", "edges", "landmarks")
+        })
+    else:
+        metrics.add_collector("routes", route_graph.stats)
 
-                if method in self.tools:
-                    result = await self.tools[method]["callback"](params)
-                    response = {
-                        "jsonrpc": "2.0",
-                        "id": request_id,
-                        "result": {"content": [{"text": result}]},
-                    }
-                else:
-                    response = {
-                        "jsonrpc": "2.0",
-                        "id": request_id,
-                        "error": {"code": -32601, "message": f"Method '{method}' not found"},
-                    }
-                print(f"Sending: {json.dumps(response)}")
-                await websocket.send(json.dumps(response))
-            except Exception as e:
-                print(f"Error handling request: {e}")
+def resolve_stop(stop: str) -> tuple[float, float] | None:
+    """Coordinates for a "lat,lon" string or a city name in the gazetteer."""
+    parts = stop.split(",")
+    if len(parts) == 2:
+        try:
+            return float(parts[0]), float(parts[1])
+        except ValueError:
+            pass
+    if gazetteer is not None:
+        place = gazetteer.resolve(stop)
+        if place is not None:
+            return place.latitude, place.longitude
+    return None
 
-async def plan_trip(params):
+def _stops(value) -> list[str]:
+    # Names like "Paris, TX" contain commas, so strings are split on ';'.
+    if isinstance(value, list):
+        return [str(s).strip() for s in value if str(s).strip()]
+    return [s.strip() for s in str(value or "").split(";") if s.strip()]
+
+def plan_trip(params):
     start = params.get("start", "your location")
     destination = params.get("destination", "unknown destination")
-    return f"Planned itinerary from {start} to {destination}."
+    if route_graph is None:
+        return f"Planned itinerary from {start} to {destination}."
 
-async def main():
-    server = McpServer()
+    names = [start, *_stops(params.get("stops")), destination]
+    if len(names) > MAX_STOPS:
+        return f"Too many stops (at most {MAX_STOPS - 2} between start and destination)"
+    nodes = []
+    with metrics.span("resolve"):
+        for name in names:
+            coords = resolve_stop(name)
+            node = route_graph.nearest_node(*coords) if coords is not None else None
+            if node is None:
+                return f"Could not resolve location: {name}"
+            nodes.append(node)
+    with metrics.span("route"):
+        trip = route_graph.trip(nodes, optimize=params.get("optimize", True))
+    if trip is None:
+        return f"No route found from {start} to {destination}."
+
+    order, legs = trip
+    total = sum(length for length, _ in legs)
+    lines = [f"Planned itinerary from {start} to {destination}: {total:.1f} km."]
+    if len(legs) > 1:
+        for n, ((a, b), (length, _)) in enumerate(zip(zip(order, order[1:]), legs), 1):
+            lines.append(f"{n}. {names[a]} → {names[b]}: {length:.1f} km")
+    return "\n".join(lines)
+
+PORT = 8083
+
+def register(server: McpServer):
     server.tool(
         name="plan-trip",
         description="Plan travel itinerary",
         input_schema={
             "start": {"type": "string", "description": "Start location"},
             "destination": {"type": "string", "description": "Destination"},
+            "stops": {"type": "array", "description": "Intermediate stops (or a ';'-separated string)"},
+            "optimize": {"type": "boolean", "description": "Reorder intermediate stops (default true)"},
         },
         callback=plan_trip,
+        mode=ROUTE_MODE if route_graph is not None else "thread",
     )
 
-    async with serve(server.handle_connection, "0.0.0.0", 8083):
-        print("Travel MCP running on ws://0.0.0.0:8083")
-        await asyncio.Future()
+async def main():
+    setup_logging()
+    server = McpServer()
+    register(server)
+
+    try:
+        async with server.serve("0.0.0.0", PORT):
+            logger.info("Travel MCP running on ws://0.0.0.0:%d", PORT)
+            await asyncio.Future()
+    finally:
+        server.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,257 @@
+import asyncio
+import logging
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from mcp_core import DeadlineExceeded, remaining_time
+from mcp_metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "weather-app/1.0 (Python)"
+
+# Upstream requests give up this long before the tool call's deadline, so
+# the tool still has time to fall back (e.g. to stale cached data).
+DEADLINE_MARGIN = 0.1
+
+class CircuitBreaker:
+    """
+    Trips after 'failure_threshold' consecutive failures and rejects
+    requests for 'reset_timeout' seconds. After that a single trial request
+    is let through: success closes the breaker, failure re-opens it.
+    """
+
+    __slots__ = ("failure_threshold", "reset_timeout", "failures", "opened_at", "trial", "times_opened")
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.trial = False
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if self.trial or time.monotonic() - self.opened_at < self.reset_timeout:
+            return False
+        self.trial = True
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                self.times_opened += 1
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """Give back a trial slot whose request was cancelled or cut short by a caller."""
+        self.trial = False
+
+class UpstreamClient:
+    """
+    Long-lived HTTP client shared by every tool call in a server process.
+    Keeps connections alive, caches DNS and caps connections per host so
+    repeat calls to the same upstream skip the TCP+TLS handshake.
+
+    Each host sits behind a CircuitBreaker, and every request's timeout is
+    cut to fit the calling tool's deadline.
+    """
+
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 20,
+        keepalive_timeout: float = 60.0,
+        dns_ttl: int = 300,
+        connect_timeout: float = 5.0,
+        total_timeout: float = 15.0,
+        user_agent: str = USER_AGENT,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_ttl = dns_ttl
+        self.timeout = aiohttp.ClientTimeout(total=total_timeout, connect=connect_timeout)
+        self.headers = {"User-Agent": user_agent, "Accept": "application/json"}
+        self._session: aiohttp.ClientSession | None = None
+        self._connector: aiohttp.TCPConnector | None = None
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.breakers: dict[str, CircuitBreaker] = {}
+        self.counters = {
+            "requests": 0,
+            "errors": 0,
+            "connections_created": 0,
+            "connections_reused": 0,
+            "dns_cache_hits": 0,
+            "dns_cache_misses": 0,
+            "short_circuited": 0,
+            "deadline_skipped": 0,
+            "deadline_timeouts": 0,
+        }
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig()
+
+        def bump(key):
+            async def _on_signal(session, ctx, params):
+                self.counters[key] += 1
+            return _on_signal
+
+        trace.on_request_start.append(bump("requests"))
+        trace.on_request_exception.append(bump("errors"))
+        trace.on_connection_create_end.append(bump("connections_created"))
+        trace.on_connection_reuseconn.append(bump("connections_reused"))
+        trace.on_dns_cache_hit.append(bump("dns_cache_hits"))
+        trace.on_dns_cache_miss.append(bump("dns_cache_misses"))
+
+        async def on_start(session, ctx, params):
+            ctx.started = asyncio.get_running_loop().time()
+
+        async def on_end(session, ctx, params):
+            elapsed = asyncio.get_running_loop().time() - ctx.started
+            metrics.observe_upstream(params.url.host, elapsed, params.response.status)
+
+        async def on_error(session, ctx, params):
+            elapsed = asyncio.get_running_loop().time() - ctx.started
+            metrics.observe_upstream(params.url.host, elapsed, "error")
+
+        trace.on_request_start.append(on_start)
+        trace.on_request_end.append(on_end)
+        trace.on_request_exception.append(on_error)
+        return trace
+
+    def session(self) -> aiohttp.ClientSession:
+        """Return the shared session, creating it lazily inside the running loop."""
+        if self._session is None or self._session.closed:
+            self._connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_ttl,
+                use_dns_cache=True,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=self._connector,
+                headers=self.headers,
+                timeout=self.timeout,
+                trace_configs=[self._trace_config()],
+            )
+        return self._session
+
+    def breaker(self, host: str) -> CircuitBreaker:
+        breaker = self.breakers.get(host)
+        if breaker is None:
+            breaker = self.breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return breaker
+
+    async def get_json(self, url: str, params: dict = None) -> dict | None:
+        """
+        GET 'url' and return the decoded JSON body on HTTP 200, else None.
+        Network errors are logged and swallowed, matching make_http_request,
+        and None is returned at once while the host's breaker is open.
+        Raises DeadlineExceeded when the calling tool's deadline leaves no
+        time for the request or runs out during it; such a timeout is not
+        the host's fault and does not count against the breaker.
+        """
+        timeout = self.timeout
+        trimmed = False
+        remaining = remaining_time()
+        if remaining is not None:
+            if remaining <= DEADLINE_MARGIN:
+                self.counters["deadline_skipped"] += 1
+                raise DeadlineExceeded(f"No time left for a request to {urlsplit(url).hostname}")
+            if remaining - DEADLINE_MARGIN < self.timeout.total:
+                trimmed = True
+                timeout = aiohttp.ClientTimeout(
+                    total=remaining - DEADLINE_MARGIN,
+                    connect=self.timeout.connect,
+                )
+        breaker = self.breaker(urlsplit(url).hostname or "")
+        if not breaker.allow():
+            self.counters["short_circuited"] += 1
+            return None
+        try:
+            async with self.session().get(url, params=params, timeout=timeout) as response:
+                if response.status >= 500 or response.status == 429:
+                    breaker.record_failure()
+                    return None
+                if response.status != 200:
+                    breaker.record_success()
+                    return None
+                data = await response.json()
+                breaker.record_success()
+                return data
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except TimeoutError as e:
+            # Connect/read timeouts (ServerTimeoutError) are the host's fault
+            # however much time was left; only the total timeout is ours.
+            if trimmed and not isinstance(e, aiohttp.ServerTimeoutError):
+                breaker.release()
+                self.counters["deadline_timeouts"] += 1
+                raise DeadlineExceeded(f"Deadline reached waiting for {urlsplit(url).hostname}") from None
+            breaker.record_failure()
+            logger.warning("HTTP request to %s timed out", url)
+            return None
+        except Exception as e:
+            breaker.record_failure()
+            logger.warning("Error making HTTP request to %s: %s", url, str(e) or type(e).__name__)
+            return None
+
+    def stats(self) -> dict:
+        """Snapshot of pool usage; reuse_ratio close to 1.0 means handshakes are amortised."""
+        idle = 0
+        in_use = 0
+        if self._connector is not None and not self._connector.closed:
+            # aiohttp keeps no public counters for the pool, so read its bookkeeping.
+            idle = sum(len(conns) for conns in getattr(self._connector, "_conns", {}).values())
+            in_use = len(getattr(self._connector, "_acquired", ()))
+        created = self.counters["connections_created"]
+        reused = self.counters["connections_reused"]
+        total = created + reused
+        return {
+            **self.counters,
+            "open_connections": idle + in_use,
+            "idle_connections": idle,
+            "in_use_connections": in_use,
+            "reuse_ratio": round(reused / total, 4) if total else 0.0,
+            "limit": self.limit,
+            "limit_per_host": self.limit_per_host,
+            "breakers": {
+                host: {
+                    "open": int(breaker.state != "closed"),
+                    "failures": breaker.failures,
+                    "times_opened": breaker.times_opened,
+                }
+                for host, breaker in self.breakers.items()
+            },
+        }
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._connector = None